@@ -415,6 +415,10 @@ setup(
         ("share/bash-completion/completions", [os.path.join("src", "buildstream", "data", "bst")]),
     ],
     install_requires=install_requires,
+    extras_require={
+        # Zstandard compression of blob transfers with cache servers
+        "zstd": ["zstandard"],
+    },
     entry_points={"console_scripts": ["bst = buildstream._frontend:cli"]},
     ext_modules=cythonize(
         BUILD_EXTENSIONS,
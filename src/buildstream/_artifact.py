@@ -57,7 +57,6 @@ class Artifact:
         self._cache_key = strong_key
         self._strict_key = strict_key
         self._weak_cache_key = weak_key
-        self._artifactdir = context.artifactdir
         self._cas = context.get_cascache()
         self._tmpdir = context.tmpdir
         self._proto = None
@@ -176,6 +175,22 @@ class Artifact:
 
         return logfile_paths
 
+    # fetch_files():
+    #
+    # Fetch the files of a directory tree of the artifact which are missing
+    # in the local cache, which is the case if the artifact was pulled lazily.
+    #
+    # Args:
+    #    field (str): The directory tree to fetch the files of
+    #    filter_callback (callable): Optional filter called with the relative path
+    #                                of each file, returning whether it is needed
+    #
+    def fetch_files(self, field="files", *, filter_callback=None):
+        digest = self._get_field_digest(field)
+        if digest:
+            project = self._element._get_project()
+            self._context.artifactcache.fetch_missing_files(project, digest, filter_callback=filter_callback)
+
     # get_extract_key():
     #
     # Get the key used to extract the artifact
@@ -317,12 +332,8 @@ class Artifact:
             rootvdir._import_files_internal(buildrootvdir, properties=properties, collect_result=False)
             artifact.buildroot.CopyFrom(rootvdir._get_digest())
 
-        os.makedirs(os.path.dirname(os.path.join(self._artifactdir, element.get_artifact_name())), exist_ok=True)
         keys = utils._deduplicate([self._cache_key, self._weak_cache_key])
-        for key in keys:
-            path = os.path.join(self._artifactdir, element.get_artifact_name(key=key))
-            with utils.save_file_atomic(path, mode="wb") as f:
-                f.write(artifact.SerializeToString())
+        context.artifactcache.store_proto([element.get_artifact_name(key=key) for key in keys], artifact)
 
     # cached_buildroot()
     #
@@ -339,7 +350,7 @@ class Artifact:
 
         buildroot_digest = self._get_field_digest("buildroot")
         if buildroot_digest:
-            return self._cas.contains_directory(buildroot_digest, with_files=True)
+            return self._cas.contains_directory(buildroot_digest, with_files=not self._context.cache_lazy_pull)
         else:
             return False
 
@@ -371,7 +382,7 @@ class Artifact:
 
         buildtree_digest = self._get_field_digest("buildtree")
         if buildtree_digest:
-            return self._cas.contains_directory(buildtree_digest, with_files=True)
+            return self._cas.contains_directory(buildtree_digest, with_files=not self._context.cache_lazy_pull)
         else:
             return False
 
@@ -601,15 +612,27 @@ class Artifact:
             self._cached = False
             return False
 
-        # Check whether 'files' subdirectory is available, with or without file contents
-        if str(artifact.files) and not self._cas.contains_directory(artifact.files, with_files=True):
-            self._cached = False
-            return False
-
-        # Check whether public data and logs are available
-        logfile_digests = [logfile.digest for logfile in artifact.logs]
-        digests = [artifact.low_diversity_meta, artifact.high_diversity_meta, artifact.public_data] + logfile_digests
-        if not self._cas.contains_files(digests):
+        # Use the result of a preceding batch query if available
+        artifact_name = self._element.get_artifact_name(key=self.get_extract_key())
+        available = self._context.artifactcache.pop_batch_query_result(artifact_name)
+
+        if available is None:
+            # Check whether 'files' subdirectory is available, without file contents
+            # for artifacts which were pulled lazily
+            with_files = not self._context.cache_lazy_pull
+            available = not str(artifact.files) or self._cas.contains_directory(artifact.files, with_files=with_files)
+
+            # Check whether public data and logs are available
+            if available:
+                logfile_digests = [logfile.digest for logfile in artifact.logs]
+                digests = [
+                    artifact.low_diversity_meta,
+                    artifact.high_diversity_meta,
+                    artifact.public_data,
+                ] + logfile_digests
+                available = self._cas.contains_files(digests)
+
+        if not available:
             self._cached = False
             return False
 
@@ -689,17 +712,7 @@ class Artifact:
     def _load_proto(self):
         key = self.get_extract_key()
 
-        proto_path = os.path.join(self._artifactdir, self._element.get_artifact_name(key=key))
-        artifact = ArtifactProto()
-        try:
-            with open(proto_path, mode="r+b") as f:
-                artifact.ParseFromString(f.read())
-        except FileNotFoundError:
-            return None
-
-        os.utime(proto_path)
-
-        return artifact
+        return self._context.artifactcache.load_proto(self._element.get_artifact_name(key=key))
 
     # _get_proto()
     #
@@ -14,17 +14,28 @@
 #  Authors:
 #        Tristan Maat <tristan.maat@codethink.co.uk>
 
-import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
 
 from ._assetcache import AssetCache
 from ._cas.casremote import BlobNotFound
-from ._exceptions import ArtifactError, AssetCacheError, CASError, CASRemoteError
+from ._exceptions import ArtifactError, AssetCacheError, CASError, CASRemoteError, RemoteError
 from ._protos.buildstream.v2 import artifact_pb2
+from ._remotespec import RemoteSpec
 
 from . import utils
 
 REMOTE_ASSET_ARTIFACT_URN_TEMPLATE = "urn:fdc:buildstream.build:2020:artifact:{}"
 
+# Maximum number of artifact names resolved concurrently on an index remote
+_PULL_BATCH_CONCURRENCY = 16
+
+# The weight of a new latency measurement relative to the previous ones
+_LATENCY_SMOOTHING = 0.3
+
 
 # An ArtifactCache manages artifacts.
 #
@@ -35,9 +46,20 @@ class ArtifactCache(AssetCache):
     def __init__(self, context):
         super().__init__(context)
 
-        # create artifact directory
-        self._basedir = context.artifactdir
-        os.makedirs(self._basedir, exist_ok=True)
+        self._open_refs(context.artifactdir)
+
+        # Results of query_cache_batch() which were not yet consumed
+        # by Artifact.query_cache(), indexed by artifact name
+        self._batch_query_results: Dict[str, bool] = {}
+
+        # Results of pull_batch() which were not yet consumed by pull(),
+        # indexed by artifact name
+        self._batch_pull_results: Dict[str, Optional[str]] = {}
+
+        # Latencies of the remotes measured while racing them, in seconds,
+        # indexed by remote spec
+        self._remote_latencies: Dict[RemoteSpec, float] = {}
+        self._remote_latencies_lock: threading.Lock = threading.Lock()
 
     # preflight():
     #
@@ -60,7 +82,169 @@ class ArtifactCache(AssetCache):
     def contains(self, element, key):
         ref = element.get_artifact_name(key)
 
-        return os.path.exists(os.path.join(self._basedir, ref))
+        return self._refs.contains(ref)
+
+    # load_proto():
+    #
+    # Load an artifact proto from the local cache, marking the
+    # artifact as recently used.
+    #
+    # Args:
+    #     artifact_name (str): The name of the artifact
+    #
+    # Returns:
+    #     (Artifact): The artifact proto, or None if the artifact is not in the cache
+    #
+    def load_proto(self, artifact_name):
+        data = self._refs.load(artifact_name, touch=True)
+        if data is None:
+            return None
+
+        artifact = artifact_pb2.Artifact()
+        artifact.ParseFromString(data)
+        return artifact
+
+    # store_proto():
+    #
+    # Store an artifact proto in the local cache under one or
+    # more artifact names at once.
+    #
+    # Args:
+    #     artifact_names (list): The names of the artifact
+    #     artifact (Artifact): The artifact proto
+    #
+    def store_proto(self, artifact_names, artifact):
+        self._refs.store(artifact_names, artifact.SerializeToString())
+
+    # query_cache_batch():
+    #
+    # Query the local cache for the artifacts of many elements at once.
+    #
+    # Instead of checking the blobs of each artifact with separate requests
+    # to buildbox-casd, the blobs required by all artifacts are collected and
+    # checked together. The result for each artifact is recorded and consumed
+    # by the subsequent `Artifact.query_cache()` call for the same artifact.
+    #
+    # Args:
+    #     elements (list): The Elements whose artifacts should be queried
+    #
+    def query_cache_batch(self, elements):
+        entries = {}
+        for element in elements:
+            for key in element._get_artifact_query_keys():
+                artifact_name = element.get_artifact_name(key=key)
+                if artifact_name in entries:
+                    continue
+
+                data = self._refs.load(artifact_name)
+                if data is None:
+                    continue
+
+                artifact = artifact_pb2.Artifact()
+                artifact.ParseFromString(data)
+
+                directories = [artifact.files] if str(artifact.files) else []
+                files = [artifact.low_diversity_meta, artifact.high_diversity_meta, artifact.public_data]
+                files.extend(logfile.digest for logfile in artifact.logs)
+                entries[artifact_name] = (directories, files)
+
+        available = self.cas.contains_batch(entries, with_files=not self.context.cache_lazy_pull)
+        for artifact_name in entries:
+            self._batch_query_results[artifact_name] = artifact_name in available
+
+    # pop_batch_query_result():
+    #
+    # Consume the result recorded by `query_cache_batch()` for an artifact.
+    #
+    # Args:
+    #     artifact_name (str): The name of the artifact
+    #
+    # Returns:
+    #     (bool): Whether all blobs of the artifact are available, or None
+    #             if the artifact was not part of a batch query
+    #
+    def pop_batch_query_result(self, artifact_name: str) -> Optional[bool]:
+        return self._batch_query_results.pop(artifact_name, None)
+
+    # clear_batch_query_results():
+    #
+    # Discard any results of `query_cache_batch()` which were not consumed,
+    # such that they cannot go stale.
+    #
+    def clear_batch_query_results(self):
+        self._batch_query_results.clear()
+
+    # pull_batch():
+    #
+    # Pull the artifacts of many elements at once.
+    #
+    # The artifact names of all elements are resolved concurrently on the
+    # index remotes, and the directory trees and blobs of all artifacts found
+    # are deduplicated and fetched together from each storage remote, rather
+    # than pulling each artifact with its own sequence of requests.
+    #
+    # The result for each artifact is recorded and consumed by the subsequent
+    # `pull()` call for the same artifact. Artifacts which could not be pulled
+    # because of an error or missing blobs are left to `pull()`, which reports
+    # the reason.
+    #
+    # Args:
+    #     elements (list): The Elements whose artifacts should be pulled
+    #     pull_buildtrees (bool): Whether to pull buildtrees or not
+    #     task (Task): Optional task to report the progress of the transfers to
+    #
+    def pull_batch(self, elements, *, pull_buildtrees=False, task=None):
+        projects = {}
+        for element in elements:
+            artifact_names = [element.get_artifact_name(key=key) for key in element._get_artifact_query_keys()]
+            if artifact_names:
+                projects.setdefault(element._get_project().name, []).append(
+                    (artifact_names, element._get_workspace() is None)
+                )
+
+        for project_name, project_elements in projects.items():
+            index_remotes, storage_remotes = self.get_remotes(project_name, False)
+            if not index_remotes or not storage_remotes:
+                continue
+
+            artifact_names = list(utils._deduplicate(name for names, _ in project_elements for name in names))
+            artifact_digests, failed = self._resolve_artifacts_batch(artifact_names, index_remotes)
+
+            # Only pull the first artifact found for each element, in
+            # the order in which `Element._load_artifact()` pulls them
+            wanted = {}
+            for names, buildtrees in project_elements:
+                for name in names:
+                    if name in artifact_digests:
+                        wanted[name] = pull_buildtrees and buildtrees
+                        break
+                    if name in failed:
+                        break
+                    self._batch_pull_results[name] = None
+
+            for remote in storage_remotes:
+                if not wanted:
+                    break
+
+                try:
+                    pulled = self._pull_artifacts_storage_batch(
+                        {name: artifact_digests[name] for name in wanted}, wanted, remote, task=task
+                    )
+                except (CASError, RemoteError):
+                    # Leave the artifacts to pull(), which reports errors
+                    continue
+
+                for name in pulled:
+                    self._batch_pull_results[name] = str(remote)
+                    del wanted[name]
+
+    # clear_batch_pull_results():
+    #
+    # Discard any results of `pull_batch()` which were not consumed,
+    # such that they cannot go stale.
+    #
+    def clear_batch_pull_results(self):
+        self._batch_pull_results.clear()
 
     # list_artifacts():
     #
@@ -73,7 +257,7 @@ class ArtifactCache(AssetCache):
     #     ([str]) - A list of artifact names as generated in LRU order
     #
     def list_artifacts(self, *, glob=None):
-        return [ref for _, ref in sorted(list(self.list_refs_mtimes(self._basedir, glob_expr=glob)))]
+        return [ref for _, ref in sorted(list(self.list_refs_mtimes(glob_expr=glob)))]
 
     # remove():
     #
@@ -159,24 +343,40 @@ class ArtifactCache(AssetCache):
         artifact_name = element.get_artifact_name(key=key)
         uri = REMOTE_ASSET_ARTIFACT_URN_TEMPLATE.format(artifact_name)
 
+        if artifact_name in self._batch_pull_results:
+            remote = self._batch_pull_results.pop(artifact_name)
+            if remote is None:
+                element.info("Remotes do not have artifact {} cached".format(display_key))
+                return False
+
+            element.info("Pulled artifact {} <- {}".format(display_key, remote))
+            return True
+
         index_remotes, storage_remotes = self.get_remotes(project.name, False)
 
         errors = []
         # Start by pulling our artifact proto, so that we know which
         # blobs to pull
-        for remote in index_remotes:
-            remote.init()
-            try:
-                element.status("Pulling artifact {} <- {}".format(display_key, remote))
-                response = remote.fetch_blob([uri])
-                if response:
-                    artifact_digest = response.blob_digest
-                    break
-
-                element.info("Remote ({}) does not have artifact {} cached".format(remote, display_key))
-            except AssetCacheError as e:
-                element.warn("Could not pull from remote {}: {}".format(remote, e))
-                errors.append(e)
+        if self.context.cache_race_remotes and len(index_remotes) > 1:
+            artifact_digest = self._race_index_remotes(element, display_key, artifact_name, index_remotes, errors)
+
+            # Pull the data from the fastest remotes first
+            storage_remotes = self._sort_by_latency(storage_remotes)
+        else:
+            for remote in index_remotes:
+                remote.init()
+                try:
+                    element.status("Pulling artifact {} <- {}".format(display_key, remote))
+                    response = remote.fetch_blob([uri])
+                    self.context.remotequerycache.record(remote, artifact_name, bool(response))
+                    if response:
+                        artifact_digest = response.blob_digest
+                        break
+
+                    element.info("Remote ({}) does not have artifact {} cached".format(remote, display_key))
+                except AssetCacheError as e:
+                    element.warn("Could not pull from remote {}: {}".format(remote, e))
+                    errors.append(e)
 
         if errors and not artifact_digest:
             raise ArtifactError(
@@ -236,35 +436,122 @@ class ArtifactCache(AssetCache):
             # The two refs are identical, nothing to do
             return
 
-        utils.safe_link(os.path.join(self._basedir, oldref), os.path.join(self._basedir, newref))
+        self._refs.link(oldref, newref)
 
-    # fetch_missing_blobs():
+    # fetch_missing_blobs_batch():
+    #
+    # Fetch the missing blobs of many elements, possibly of different projects,
+    # from configured remote repositories at once.
     #
-    # Fetch missing blobs from configured remote repositories.
+    # The blobs are deduplicated and fetched from each storage remote with a
+    # single batch transfer, trying the fastest remotes first. The blobs which
+    # a remote does not have are remembered for the rest of the session, such
+    # that they are not requested from that remote again.
     #
     # Args:
-    #     project (Project): The current project
-    #     missing_blobs (list): The Digests of the blobs to fetch
+    #     missing_blobs (dict): A dictionary mapping Projects to the Digests
+    #                           of the blobs to fetch for their elements
     #
-    def fetch_missing_blobs(self, project, missing_blobs):
+    def fetch_missing_blobs_batch(self, missing_blobs):
+        # The blobs to fetch and the names of the projects needing them, by hash
+        pending = {}
+        for project, digests in missing_blobs.items():
+            for digest in digests:
+                pending.setdefault(digest.hash, (digest, set()))[1].add(project.name)
+
+        if not pending:
+            return
 
-        index_remotes, _ = self.get_remotes(project.name, False)
-        for remote in index_remotes:
-            if not missing_blobs:
-                break
+        remotes, remote_projects = self._get_storage_remotes({project.name for project in missing_blobs})
+        for remote in self._sort_by_latency(remotes):
+            project_names = remote_projects[remote.spec]
+            digests = [digest for digest, names in pending.values() if names & project_names]
+            digests = remote.filter_missing_blobs(digests)
+            if not digests:
+                continue
 
             remote.init()
 
             # fetch_blobs() will return the blobs that are still missing
-            missing_blobs = self.cas.fetch_blobs(remote, missing_blobs, allow_partial=True)
+            remote_missing_blobs = self.cas.fetch_blobs(remote, digests, allow_partial=True)
+            remote.add_missing_blobs(remote_missing_blobs)
+
+            remote_missing_hashes = {digest.hash for digest in remote_missing_blobs}
+            for digest in digests:
+                if digest.hash not in remote_missing_hashes:
+                    del pending[digest.hash]
+
+            if not pending:
+                break
 
-        if missing_blobs:
+        if pending:
             raise ArtifactError("Blobs not found on configured artifact servers")
 
+    # fetch_missing_files():
+    #
+    # Fetch the file blobs of a directory tree of an artifact which are missing
+    # in the local cache. This is only the case for artifacts pulled in lazy
+    # mode, whose files are fetched once they are needed.
+    #
+    # Args:
+    #     project (Project): The project of the artifact
+    #     directory_digest (Digest): The digest of the directory tree
+    #     filter_callback (callable): Optional filter called with the relative path
+    #                                 of each file, returning whether it is needed
+    #
+    def fetch_missing_files(self, project, directory_digest, *, filter_callback=None):
+        self.fetch_missing_files_batch([(project, directory_digest, filter_callback)])
+
+    # fetch_missing_files_batch():
+    #
+    # Fetch the missing file blobs of the directory trees of many artifacts
+    # at once, see fetch_missing_files().
+    #
+    # The required blobs of all trees are deduplicated and checked in the
+    # local cache together, then fetched with fetch_missing_blobs_batch().
+    #
+    # Args:
+    #     entries (list): A list of tuples of the Project, the directory Digest
+    #                     and the optional filter callback of each tree
+    #
+    def fetch_missing_files_batch(self, entries):
+        if not self.context.cache_lazy_pull:
+            return
+
+        required_blobs = {}
+        for project, directory_digest, filter_callback in entries:
+            if not str(directory_digest):
+                continue
+
+            blobs = required_blobs.setdefault(project, {})
+            for digest in self.cas.required_file_blobs_for_directory(
+                directory_digest, filter_callback=filter_callback
+            ):
+                blobs[digest.hash] = digest
+
+        unique_blobs = {}
+        for blobs in required_blobs.values():
+            unique_blobs.update(blobs)
+
+        local_missing_blobs = self.cas.missing_blobs(unique_blobs.values())
+        if not local_missing_blobs:
+            return
+
+        local_missing_hashes = {digest.hash for digest in local_missing_blobs}
+        self.fetch_missing_blobs_batch(
+            {
+                project: [digest for blob_hash, digest in blobs.items() if blob_hash in local_missing_hashes]
+                for project, blobs in required_blobs.items()
+            }
+        )
+
     # find_missing_blobs():
     #
     # Find missing blobs from configured push remote repositories.
     #
+    # Blobs which a remote is known to have from earlier in the session
+    # are not looked up again.
+    #
     # Args:
     #     project (Project): The current project
     #     missing_blobs (list): The Digests of the blobs to check
@@ -280,9 +567,15 @@ class ArtifactCache(AssetCache):
         remote_missing_blobs_list = []
 
         for remote in push_remotes:
+            unknown_blobs = remote.filter_present_blobs(missing_blobs)
+            if not unknown_blobs:
+                continue
+
             remote.init()
 
-            remote_missing_blobs = self.cas.missing_blobs(missing_blobs, remote=remote)
+            remote_missing_blobs = self.cas.missing_blobs(unknown_blobs, remote=remote)
+            remote_missing_hashes = {blob.hash for blob in remote_missing_blobs}
+            remote.add_present_blobs(blob for blob in unknown_blobs if blob.hash not in remote_missing_hashes)
 
             for blob in remote_missing_blobs:
                 if blob not in remote_missing_blobs_list:
@@ -310,8 +603,6 @@ class ArtifactCache(AssetCache):
 
         ref = element.get_artifact_name()
         for remote in index_remotes:
-            remote.init()
-
             if self._query_remote(ref, remote):
                 return True
 
@@ -338,19 +629,25 @@ class ArtifactCache(AssetCache):
     #
     def _push_artifact_blobs(self, artifact, artifact_digest, remote):
         artifact_proto = artifact._get_proto()
+        task = self.context.messenger.get_action_task()
 
         try:
+            # Lazily pulled artifacts may lack files which we need to push
+            artifact.fetch_files()
+
             if str(artifact_proto.files):
-                self.cas._send_directory(remote, artifact_proto.files)
+                self.cas._send_directory(remote, artifact_proto.files, task=task)
 
             if str(artifact_proto.buildtree):
                 try:
+                    artifact.fetch_files("buildtree")
                     self.cas._send_directory(remote, artifact_proto.buildtree)
                 except FileNotFoundError:
                     pass
 
             if str(artifact_proto.buildroot):
                 try:
+                    artifact.fetch_files("buildroot")
                     self.cas._send_directory(remote, artifact_proto.buildroot)
                 except FileNotFoundError:
                     pass
@@ -400,6 +697,7 @@ class ArtifactCache(AssetCache):
             response = remote.fetch_blob(uris)
             # Skip push if artifact is already on the server
             if response and response.blob_digest == artifact_digest:
+                self._record_remote_artifacts(remote, artifact_names)
                 return False
         except AssetCacheError as e:
             raise ArtifactError("{}".format(e), temporary=True) from e
@@ -428,8 +726,22 @@ class ArtifactCache(AssetCache):
         except AssetCacheError as e:
             raise ArtifactError("{}".format(e), temporary=True) from e
 
+        self._record_remote_artifacts(remote, artifact_names)
         return True
 
+    # _record_remote_artifacts():
+    #
+    # Record that a remote has artifacts, replacing any answers of the
+    # remote recorded before they were pushed.
+    #
+    # Args:
+    #    remote (AssetRemote): The remote
+    #    artifact_names (list): The names of the artifacts
+    #
+    def _record_remote_artifacts(self, remote, artifact_names):
+        for artifact_name in artifact_names:
+            self.context.remotequerycache.record(remote, artifact_name, True)
+
     # _pull_artifact_storage():
     #
     # Pull artifact blobs from the given remote.
@@ -458,19 +770,21 @@ class ArtifactCache(AssetCache):
                 artifact.ParseFromString(f.read())
 
             # Write the artifact proto to cache
-            artifact_path = os.path.join(self._basedir, artifact_name)
-            os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
-            with utils.save_file_atomic(artifact_path, mode="wb") as f:
-                f.write(artifact.SerializeToString())
+            self.store_proto([artifact_name], artifact)
+
+            # Only fetch the Directory protos in lazy mode, the files are
+            # fetched with fetch_missing_files() when they are needed
+            with_files = not self.context.cache_lazy_pull
 
             if str(artifact.files):
-                self.cas._fetch_directory(remote, artifact.files)
+                task = self.context.messenger.get_action_task()
+                self.cas._fetch_directory(remote, artifact.files, with_files=with_files, task=task)
 
             if pull_buildtrees:
                 if str(artifact.buildtree):
-                    self.cas._fetch_directory(remote, artifact.buildtree)
+                    self.cas._fetch_directory(remote, artifact.buildtree, with_files=with_files)
                 if str(artifact.buildroot):
-                    self.cas._fetch_directory(remote, artifact.buildroot)
+                    self.cas._fetch_directory(remote, artifact.buildroot, with_files=with_files)
 
             digests = [artifact.low_diversity_meta, artifact.high_diversity_meta]
             if str(artifact.public_data):
@@ -487,8 +801,230 @@ class ArtifactCache(AssetCache):
 
         return True
 
+    # _race_index_remotes()
+    #
+    # Query all index remotes for an artifact concurrently, using the
+    # answer of the first remote which has the artifact and cancelling
+    # the queries of the other remotes.
+    #
+    # The latency of each remote is recorded, to prefer the fastest
+    # remotes when pulling the data of artifacts.
+    #
+    # Args:
+    #    element (Element): The element whose artifact is pulled
+    #    display_key (str): The key of the artifact to display
+    #    artifact_name (str): The name of the artifact
+    #    index_remotes (list): The index remotes to query
+    #    errors (list): The list to add errors of the remotes to
+    #
+    # Returns:
+    #    (Digest): The digest of the artifact proto, or None if no remote has the artifact
+    #
+    def _race_index_remotes(self, element, display_key, artifact_name, index_remotes, errors):
+        uri = REMOTE_ASSET_ARTIFACT_URN_TEMPLATE.format(artifact_name)
+
+        for remote in index_remotes:
+            remote.init()
+
+        element.status(
+            "Pulling artifact {} <- {}".format(display_key, ", ".join(str(remote) for remote in index_remotes))
+        )
+
+        completed = queue.Queue()
+        futures = {}
+        start_time = time.monotonic()
+        try:
+            for remote in index_remotes:
+                future = remote.fetch_blob_future([uri])
+                futures[future] = remote
+                future.add_done_callback(completed.put)
+
+            for _ in range(len(futures)):
+                future = completed.get()
+                remote = futures[future]
+
+                try:
+                    response = remote.fetch_blob_result(future)
+                except AssetCacheError as e:
+                    element.warn("Could not pull from remote {}: {}".format(remote, e))
+                    errors.append(e)
+                    continue
+
+                self._record_latency(remote, time.monotonic() - start_time)
+                self.context.remotequerycache.record(remote, artifact_name, bool(response))
+                if response:
+                    return response.blob_digest
+
+                element.info("Remote ({}) does not have artifact {} cached".format(remote, display_key))
+        finally:
+            elapsed = time.monotonic() - start_time
+            for future, remote in futures.items():
+                # The remotes which did not answer yet are at least this slow
+                if future.cancel():
+                    self._record_latency(remote, elapsed)
+
+        return None
+
+    # _record_latency()
+    #
+    # Record the latency of a remote.
+    #
+    # Args:
+    #    remote (BaseRemote): The remote
+    #    latency (float): The time the remote took to answer, in seconds
+    #
+    def _record_latency(self, remote, latency):
+        with self._remote_latencies_lock:
+            previous = self._remote_latencies.get(remote.spec)
+            if previous is not None:
+                latency = previous + _LATENCY_SMOOTHING * (latency - previous)
+            self._remote_latencies[remote.spec] = latency
+
+    # _sort_by_latency()
+    #
+    # Sort remotes by their latency, keeping the configured order of
+    # remotes whose latency was not measured, which come last.
+    #
+    # Args:
+    #    remotes (list): The remotes
+    #
+    # Returns:
+    #    (list): The sorted remotes
+    #
+    def _sort_by_latency(self, remotes):
+        with self._remote_latencies_lock:
+            return sorted(remotes, key=lambda remote: self._remote_latencies.get(remote.spec, float("inf")))
+
+    # _get_storage_remotes()
+    #
+    # Get the storage remotes of several projects, each remote only
+    # once even if it is used by several of the projects.
+    #
+    # Args:
+    #    project_names (iterable): The names of the projects
+    #    push (bool): Whether to only get the remotes to push to
+    #
+    # Returns:
+    #    (list): The storage remotes
+    #    (dict): The names of the projects using each remote, by remote spec
+    #
+    def _get_storage_remotes(self, project_names, *, push=False):
+        remotes = {}
+        remote_projects = {}
+        for project_name in project_names:
+            _, storage_remotes = self.get_remotes(project_name, push)
+            for remote in storage_remotes:
+                remotes.setdefault(remote.spec, remote)
+                remote_projects.setdefault(remote.spec, set()).add(project_name)
+
+        return list(remotes.values()), remote_projects
+
+    # _resolve_artifacts_batch()
+    #
+    # Resolve the artifact proto digests of many artifacts concurrently,
+    # trying each index remote in turn for the artifacts not found yet.
+    #
+    # Args:
+    #    artifact_names (list): The names of the artifacts
+    #    index_remotes (list): The index remotes to query
+    #
+    # Returns:
+    #    (dict): The artifact proto digests, indexed by artifact name
+    #    (set): The names of the artifacts which could not be resolved because of an error
+    #
+    def _resolve_artifacts_batch(self, artifact_names, index_remotes):
+        artifact_digests = {}
+        failed = set()
+
+        for remote in index_remotes:
+            pending = [name for name in artifact_names if name not in artifact_digests]
+            if not pending:
+                break
+
+            try:
+                remote.init()
+            except (AssetCacheError, RemoteError):
+                failed.update(pending)
+                continue
+
+            def resolve(name, remote=remote):
+                try:
+                    return True, remote.fetch_blob([REMOTE_ASSET_ARTIFACT_URN_TEMPLATE.format(name)])
+                except AssetCacheError:
+                    return False, None
+
+            with ThreadPoolExecutor(max_workers=_PULL_BATCH_CONCURRENCY) as executor:
+                for name, (answered, response) in zip(pending, executor.map(resolve, pending)):
+                    if not answered:
+                        failed.add(name)
+                        continue
+                    if response:
+                        artifact_digests[name] = response.blob_digest
+                    self.context.remotequerycache.record(remote, name, bool(response))
+
+        failed.difference_update(artifact_digests)
+        return artifact_digests, failed
+
+    # _pull_artifacts_storage_batch()
+    #
+    # Pull the artifact protos and the data of many artifacts together
+    # from a storage remote, storing the artifacts which were completely
+    # pulled in the local cache.
+    #
+    # Args:
+    #    artifact_digests (dict): The artifact proto digests, indexed by artifact name
+    #    buildtrees (dict): Whether to pull the buildtree, indexed by artifact name
+    #    remote (CASRemote): The remote to pull from
+    #    task (Task): Optional task to report the progress of the transfers to
+    #
+    # Returns:
+    #    (list): The names of the artifacts which were pulled
+    #
+    def _pull_artifacts_storage_batch(self, artifact_digests, buildtrees, remote, *, task=None):
+        remote.init()
+
+        missing_blobs = self.cas.fetch_blobs(remote, artifact_digests.values(), allow_partial=True)
+        missing_hashes = {digest.hash for digest in missing_blobs}
+
+        artifacts = {}
+        entries = {}
+        for name, artifact_digest in artifact_digests.items():
+            if artifact_digest.hash in missing_hashes:
+                continue
+
+            artifact = artifact_pb2.Artifact()
+            with self.cas.open(artifact_digest, "rb") as f:
+                artifact.ParseFromString(f.read())
+
+            directories = [artifact.files] if str(artifact.files) else []
+            if buildtrees[name]:
+                if str(artifact.buildtree):
+                    directories.append(artifact.buildtree)
+                if str(artifact.buildroot):
+                    directories.append(artifact.buildroot)
+
+            files = [artifact.low_diversity_meta, artifact.high_diversity_meta]
+            if str(artifact.public_data):
+                files.append(artifact.public_data)
+            files.extend(logfile.digest for logfile in artifact.logs)
+
+            artifacts[name] = artifact
+            entries[name] = (directories, files)
+
+        pulled = self.cas.fetch_batch(remote, entries, with_files=not self.context.cache_lazy_pull, task=task)
+
+        # Only store the protos once all of their data is available, such
+        # that partially pulled artifacts are never considered cached
+        for name in pulled:
+            self.store_proto([name], artifacts[name])
+
+        return pulled
+
     # _query_remote()
     #
+    # The remote is only queried if it was not recently queried
+    # for the same ref.
+    #
     # Args:
     #    ref (str): The artifact ref
     #    remote (AssetRemote): The remote we want to check
@@ -497,10 +1033,20 @@ class ArtifactCache(AssetCache):
     #    (bool): True if the ref exists in the remote, False otherwise.
     #
     def _query_remote(self, ref, remote):
+        remotequerycache = self.context.remotequerycache
+
+        cached = remotequerycache.lookup(remote, ref)
+        if cached is not None:
+            return cached
+
         uri = REMOTE_ASSET_ARTIFACT_URN_TEMPLATE.format(ref)
 
+        remote.init()
         try:
             response = remote.fetch_blob([uri])
-            return bool(response)
         except AssetCacheError as e:
             raise ArtifactError("{}".format(e), temporary=True) from e
+
+        cached = bool(response)
+        remotequerycache.record(remote, ref, cached)
+        return cached
@@ -14,15 +14,13 @@
 #  Authors:
 #        Raoul Hidalgo Charman <raoul.hidalgocharman@codethink.co.uk>
 #
-import os
-import re
 from typing import List, Dict, Tuple, Iterable, Optional
 import grpc
 
-from . import utils
 from ._cas import CASRemote, CASCache, CASDProcessManager
 from ._exceptions import AssetCacheError, RemoteError
 from ._remotespec import RemoteSpec, RemoteType
+from ._refstore import RefStore, open_ref_store
 from ._remote import BaseRemote
 from ._protos.build.bazel.remote.asset.v1 import remote_asset_pb2, remote_asset_pb2_grpc
 from ._protos.build.buildgrid import local_cas_pb2
@@ -129,6 +127,23 @@ class AssetRemote(BaseRemote):
     #     AssetCacheError: If the upstream has a problem
     #
     def fetch_blob(self, uris, *, qualifiers=None):
+        return self.fetch_blob_result(self.fetch_blob_future(uris, qualifiers=qualifiers))
+
+    # fetch_blob_future():
+    #
+    # Start resolving URIs to a CAS blob digest, without waiting for
+    # the response.
+    #
+    # Args:
+    #    uris (list of str): The URIs to resolve
+    #    qualifiers (list of Qualifier): Optional qualifiers sub-specifying the
+    #                                    content to fetch.
+    #
+    # Returns
+    #    (grpc.Future): The pending request, which can be cancelled and whose
+    #                   result is obtained with fetch_blob_result()
+    #
+    def fetch_blob_future(self, uris, *, qualifiers=None):
         request = remote_asset_pb2.FetchBlobRequest()
         if self.instance_name:
             request.instance_name = self.instance_name
@@ -136,8 +151,25 @@ class AssetRemote(BaseRemote):
         if qualifiers:
             request.qualifiers.extend(qualifiers)
 
+        return self.fetch_service.FetchBlob.future(request)
+
+    # fetch_blob_result():
+    #
+    # Wait for the result of a request started with fetch_blob_future().
+    #
+    # Args:
+    #    future (grpc.Future): The pending request
+    #
+    # Returns
+    #    (FetchBlobResponse): The asset server response or None if the resource
+    #                         is not available.
+    #
+    # Raises:
+    #     AssetCacheError: If the upstream has a problem
+    #
+    def fetch_blob_result(self, future):
         try:
-            response = self.fetch_service.FetchBlob(request)
+            response = future.result()
         except grpc.RpcError as e:
             if e.code() == grpc.StatusCode.NOT_FOUND:
                 return None
@@ -314,7 +346,7 @@ class AssetCache:
         self._has_fetch_remotes: bool = False
         self._has_push_remotes: bool = False
 
-        self._basedir = None
+        self._refs: Optional[RefStore] = None  # The store of the refs of this cache
 
     # release_resources():
     #
@@ -322,6 +354,10 @@ class AssetCache:
     #
     def release_resources(self):
 
+        # Close the ref store
+        if self._refs:
+            self._refs.close()
+
         # Close all remotes and their gRPC channels
         for remote in self._remotes.values():
             if remote.index:
@@ -447,45 +483,21 @@ class AssetCache:
 
     # list_refs_mtimes()
     #
-    # List refs in a directory, given a base path. Also returns the
-    # associated mtimes
+    # List refs in the cache. Also returns the associated mtimes
     #
     # Args:
-    #    base_path (str): Base path to traverse over
-    #    glob_expr (str|None): Optional glob expression to match against files
+    #    glob_expr (str|None): Optional glob expression to match against refs
     #
     # Returns:
     #     (iter (mtime, filename)]): iterator of tuples of mtime and refs
     #
-    def list_refs_mtimes(self, base_path, *, glob_expr=None):
-        path = base_path
-        if glob_expr is not None:
-            globdir = os.path.dirname(glob_expr)
-            if not any(c in "*?[" for c in globdir):
-                # path prefix contains no globbing characters so
-                # append the glob to optimise the os.walk()
-                path = os.path.join(base_path, globdir)
-
-        regexer = None
-        if glob_expr:
-            expression = utils._glob2re(glob_expr)
-            regexer = re.compile(expression)
-
-        for root, _, files in os.walk(path):
-            for filename in files:
-                ref_path = os.path.join(root, filename)
-                relative_path = os.path.relpath(ref_path, base_path)  # Relative to refs head
-                if regexer is None or regexer.match(relative_path):
-                    # Obtain the mtime (the time a file was last modified)
-                    yield (os.path.getmtime(ref_path), relative_path)
+    def list_refs_mtimes(self, *, glob_expr=None):
+        return self._refs.list_refs_mtimes(glob_expr)
 
     # remove_ref()
     #
     # Removes a ref.
     #
-    # This also takes care of pruning away directories which can
-    # be removed after having removed the given ref.
-    #
     # Args:
     #    ref (str): The ref to remove
     #
@@ -495,8 +507,19 @@ class AssetCache:
     #
     def remove_ref(self, ref):
         try:
-            utils._remove_path_with_parents(self._basedir, ref)
+            self._refs.remove(ref)
         except FileNotFoundError as e:
             raise AssetCacheError("Could not find ref '{}'".format(ref)) from e
         except OSError as e:
             raise AssetCacheError("System error while removing ref '{}': {}".format(ref, e)) from e
+
+    # _open_refs()
+    #
+    # Open the store of the refs of this cache, subclasses must call this
+    # in their constructor.
+    #
+    # Args:
+    #    basedir (str): The directory of the refs, when they are stored in files
+    #
+    def _open_refs(self, basedir: str):
+        self._refs = open_ref_store(basedir, indexed=self.context.cache_indexed_refs)
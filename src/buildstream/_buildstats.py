@@ -0,0 +1,83 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+from typing import TYPE_CHECKING, Optional
+
+from ._persistentstore import PersistentStore
+
+if TYPE_CHECKING:
+    from .element import Element
+
+
+# Version of the statistics format, bump this whenever it changes so
+# that existing statistics are discarded.
+_STATS_VERSION = 1
+
+# The weight of a new build duration relative to the recorded history
+_SMOOTHING = 0.5
+
+
+# BuildStats()
+#
+# Persistent statistics about past builds, used to estimate how long
+# elements take to build.
+#
+# Durations are recorded per element name rather than per cache key, as
+# successive builds of the same element usually take similar amounts of time.
+#
+# Args:
+#    path (str): The path of the statistics file
+#
+class BuildStats(PersistentStore):
+    def __init__(self, path: str):
+        super().__init__(path, _STATS_VERSION)
+
+    # get_duration()
+    #
+    # Get the estimated build duration of an element.
+    #
+    # Args:
+    #    element (Element): The element
+    #
+    # Returns:
+    #    (float): The estimated duration in seconds, or None if the element was never built
+    #
+    def get_duration(self, element: "Element") -> Optional[float]:
+        with self._lock:
+            return self._get_entry(self._key(element))
+
+    # record()
+    #
+    # Record the duration of a successful build, the statistics are
+    # written to disk with save().
+    #
+    # Args:
+    #    element (Element): The element which was built
+    #    duration (float): The duration of the build in seconds
+    #
+    def record(self, element: "Element", duration: float) -> None:
+        key = self._key(element)
+        with self._lock:
+            previous = self._get_entry(key)
+            if previous is not None:
+                duration = previous + _SMOOTHING * (duration - previous)
+
+            self._set_entry(key, duration)
+
+    # _key()
+    #
+    # Compute the key of an element in the statistics.
+    #
+    def _key(self, element: "Element") -> str:
+        return "{}/{}".format(element._get_project().name, element.name)
@@ -0,0 +1,134 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import hashlib
+import os
+import stat
+import time
+from typing import Optional, Tuple
+
+import ujson
+
+from ._persistentstore import PersistentStore
+from ._protos.build.bazel.remote.execution.v2 import remote_execution_pb2
+
+
+# Version of the index format and of the fingerprint computation, bump this
+# whenever either of them changes so that existing indexes are discarded.
+_INDEX_VERSION = 1
+
+# Files which were modified less than this many seconds before the fingerprint
+# was taken could still be modified without changing their timestamps, such
+# fingerprints are not recorded.
+_RACY_INTERVAL = 2
+
+
+# CacheKeyIndex()
+#
+# A persistent index of the cache key inputs which can only be computed by
+# staging local files into CAS, such as the unique keys of local and workspace
+# sources.
+#
+# Each entry is indexed by the identity of the staged path, and records a
+# fingerprint of the `lstat()` results of all files below that path along
+# with the digest of the resulting directory. As long as the fingerprint
+# matches, the digest is reused and the files do not have to be hashed again.
+#
+# Args:
+#    path (str): The path of the index file
+#
+class CacheKeyIndex(PersistentStore):
+    def __init__(self, path: str):
+        super().__init__(path, _INDEX_VERSION)
+
+    # lookup()
+    #
+    # Look up the digest recorded for a path.
+    #
+    # Args:
+    #    identity (str): A string identifying the staged path and how it is staged
+    #    fingerprint (str): The current fingerprint of the path
+    #
+    # Returns:
+    #    (Digest): The recorded digest, or None if the fingerprint changed
+    #
+    def lookup(self, identity: str, fingerprint: str) -> Optional[remote_execution_pb2.Digest]:
+        with self._lock:
+            entry = self._get_entry(identity)
+
+        if entry is None or entry[0] != fingerprint:
+            return None
+
+        return remote_execution_pb2.Digest(hash=entry[1], size_bytes=entry[2])
+
+    # record()
+    #
+    # Record the digest of a path, the index is written to disk with save().
+    #
+    # Args:
+    #    identity (str): A string identifying the staged path and how it is staged
+    #    fingerprint (str): The fingerprint of the path at the time it was staged
+    #    digest (Digest): The digest of the staged directory
+    #
+    def record(self, identity: str, fingerprint: str, digest: remote_execution_pb2.Digest) -> None:
+        entry = [fingerprint, digest.hash, digest.size_bytes]
+        with self._lock:
+            self._set_entry(identity, entry)
+
+    # fingerprint()
+    #
+    # Compute the fingerprint of a local file or directory tree.
+    #
+    # The fingerprint covers the `lstat()` results of every file, directory and
+    # symlink below the path, it changes whenever any of them are modified,
+    # created, removed or replaced.
+    #
+    # Args:
+    #    path (str): The path to fingerprint
+    #
+    # Returns:
+    #    (str): The fingerprint, or None if the path cannot be fingerprinted
+    #           reliably at this time
+    #
+    @staticmethod
+    def fingerprint(path: str) -> Optional[str]:
+        hasher = hashlib.sha256()
+        newest = 0
+
+        def add(relpath: str, fullpath: str) -> Tuple[bool, int]:
+            st = os.lstat(fullpath)
+            fields = [relpath, st.st_mode, st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino, st.st_dev]
+            if stat.S_ISLNK(st.st_mode):
+                fields.append(os.readlink(fullpath))
+            hasher.update(ujson.dumps(fields).encode("utf-8"))
+            return stat.S_ISDIR(st.st_mode), max(st.st_mtime_ns, st.st_ctime_ns)
+
+        try:
+            is_dir, newest = add(".", path)
+            if is_dir:
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    for name in dirs + sorted(files):
+                        fullpath = os.path.join(root, name)
+                        _, timestamp = add(os.path.relpath(fullpath, path), fullpath)
+                        newest = max(newest, timestamp)
+        except OSError:
+            return None
+
+        if newest >= (time.time() - _RACY_INTERVAL) * 1e9:
+            # Recently modified files could change again within the timestamp
+            # granularity of the filesystem without changing the fingerprint.
+            return None
+
+        return hasher.hexdigest()
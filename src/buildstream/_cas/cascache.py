@@ -14,6 +14,8 @@
 #  Authors:
 #        Jürg Billeter <juerg.billeter@codethink.co.uk>
 
+import collections
+import hashlib
 import itertools
 import os
 import stat
@@ -21,6 +23,7 @@ import contextlib
 import time
 from typing import Optional, List
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import grpc
 
@@ -32,14 +35,25 @@ from .. import utils
 from ..types import FastEnum, SourceRef
 from .._exceptions import CASCacheError
 
-from .casremote import CASRemote, _CASBatchRead, _CASBatchUpdate, BlobNotFound
+from .casremote import CASRemote, _CASBatchRead, _CASBatchUpdate, _CASStream, BlobNotFound
+from .casremote import _MAX_PAYLOAD_BYTES
 
 _BUFFER_SIZE = 65536
 
+# Maximum number of concurrent FetchTree requests for batch queries
+_FETCH_TREE_CONCURRENCY = 16
+
+
+# Maximum number of blob digests of flattened directory trees to keep in memory,
+# each Digest takes up around 200 bytes which bounds the cache to about 10 MB
+_TREE_BLOBS_CACHE_SIZE = 50000
 
 # Refresh interval for disk usage of local cache in seconds
 _CACHE_USAGE_REFRESH = 5
 
+# The unit in which the progress of blob transfers is reported
+_PROGRESS_UNIT_BYTES = 1024 * 1024
+
 
 class CASLogLevel(FastEnum):
     WARNING = "warning"
@@ -65,6 +79,11 @@ class CASCache:
 
         self._remote_cache = remote_cache
 
+        # The blobs of flattened directory trees, by root digest
+        self._tree_blobs = collections.OrderedDict()
+        self._tree_blobs_count = 0
+        self._tree_blobs_lock = threading.Lock()
+
         self._casd = casd
         if casd:
             self._cache_usage_monitor = _CASCacheUsageMonitor(self._casd)
@@ -91,6 +110,14 @@ class CASCache:
         assert self._casd, "CASCache was created without buildbox-casd"
         return self._casd.get_local_cas()
 
+    # get_bytestream():
+    #
+    # Return ByteStream stub for buildbox-casd channel.
+    #
+    def get_bytestream(self):
+        assert self._casd, "CASCache was created without buildbox-casd"
+        return self._casd.get_bytestream()
+
     # preflight():
     #
     # Preflight check.
@@ -159,6 +186,68 @@ class CASCache:
         missing_blobs = self.missing_blobs_for_directory(digest, remote=self._default_remote)
         return not missing_blobs
 
+    # contains_batch():
+    #
+    # Check whether many sets of directory trees and files are in the cache.
+    #
+    # This is equivalent to calling `contains_directory()` and `contains_files()`
+    # for every entry, however the required blobs of all entries are deduplicated
+    # and checked together, using a minimal number of FindMissingBlobs requests.
+    #
+    # Args:
+    #     entries (dict): A dictionary mapping arbitrary hashable keys to a tuple
+    #                     of a list of directory digests and a list of file digests
+    #     with_files (bool): Whether to check the file blobs of the directory trees,
+    #                        or only their Directory protos
+    #
+    # Returns:
+    #     (set): The keys of the entries which are completely available
+    #
+    def contains_batch(self, entries, *, with_files=True):
+        def collect_blobs(entry):
+            directories, files = entry
+            blobs = list(files)
+            try:
+                for directory_digest in directories:
+                    if with_files:
+                        blobs.extend(self.required_blobs_for_directory(directory_digest))
+                    else:
+                        blobs.extend(self._get_tree_directories(directory_digest))
+            except FileNotFoundError:
+                # A Directory proto of the tree is missing in the local cache
+                return None
+            except grpc.RpcError as e:
+                if e.code() == grpc.StatusCode.NOT_FOUND:
+                    return None
+                raise
+            return blobs
+
+        if self._remote_cache:
+            # Directory protos are fetched from the remote cache with one FetchTree
+            # request per tree, issue these requests concurrently.
+            with ThreadPoolExecutor(max_workers=_FETCH_TREE_CONCURRENCY) as executor:
+                collected = dict(zip(entries.keys(), executor.map(collect_blobs, entries.values())))
+        else:
+            collected = {key: collect_blobs(entry) for key, entry in entries.items()}
+
+        required_blobs = {key: blobs for key, blobs in collected.items() if blobs is not None}
+        available = set(required_blobs.keys())
+
+        unique_blobs = {}
+        for blobs in required_blobs.values():
+            for digest in blobs:
+                unique_blobs[digest.hash] = digest
+
+        # Without a remote cache the default remote refers to the local cache
+        missing_blobs = self.missing_blobs(unique_blobs.values(), remote=self._default_remote)
+        if missing_blobs:
+            missing_hashes = {digest.hash for digest in missing_blobs}
+            for key, blobs in required_blobs.items():
+                if any(digest.hash in missing_hashes for digest in blobs):
+                    available.discard(key)
+
+        return available
+
     # checkout():
     #
     # Checkout the specified directory digest.
@@ -334,44 +423,77 @@ class CASCache:
         # Exactly one of the two parameters has to be specified
         assert (paths is None) != (buffers is None)
 
-        digests = []
+        if paths is not None:
+            return self._capture_files(paths, instance_name=instance_name)
 
-        with contextlib.ExitStack() as stack:
-            if paths is None:
+        digests = [None] * len(buffers)
+        captured = []  # The indices of the buffers to capture from temporary files
+
+        if instance_name:
+            # Objects for remote CAS are captured by casd, which also uploads them
+            captured = list(range(len(buffers)))
+        else:
+            # Send small buffers to casd in batches, avoiding temporary files
+            batch = []
+            batch_size = 0
+            for index, buffer in enumerate(buffers):
+                if len(buffer) > _MAX_PAYLOAD_BYTES:
+                    captured.append(index)
+                    continue
+
+                if batch and batch_size + len(buffer) > _MAX_PAYLOAD_BYTES:
+                    self._update_blobs(batch, digests)
+                    batch = []
+                    batch_size = 0
+
+                batch.append((index, buffer))
+                batch_size += len(buffer)
+
+            if batch:
+                self._update_blobs(batch, digests)
+
+        if captured:
+            with contextlib.ExitStack() as stack:
                 paths = []
-                for buffer in buffers:
+                for index in captured:
                     tmp = stack.enter_context(self._temporary_object())
-                    tmp.write(buffer)
+                    tmp.write(buffers[index])
                     tmp.flush()
                     paths.append(tmp.name)
 
-            request = local_cas_pb2.CaptureFilesRequest()
-            if instance_name:
-                request.instance_name = instance_name
+                for index, digest in zip(captured, self._capture_files(paths, instance_name=instance_name)):
+                    digests[index] = digest
 
-            for path in paths:
-                request.path.append(path)
-
-            local_cas = self.get_local_cas()
-
-            response = local_cas.CaptureFiles(request)
-
-            if len(response.responses) != len(paths):
-                raise CASCacheError(
-                    "Expected {} responses from CaptureFiles, got {}".format(len(paths), len(response.responses))
-                )
+        return digests
 
-            for path, blob_response in zip(paths, response.responses):
-                if blob_response.status.code == code_pb2.RESOURCE_EXHAUSTED:
-                    raise CASCacheError("Cache too full", reason="cache-too-full")
-                if blob_response.status.code != code_pb2.OK:
-                    raise CASCacheError("Failed to capture blob {}: {}".format(path, blob_response.status.code))
+    # add_object_stream():
+    #
+    # Hash and write an object to CAS, reading it once from a file object.
+    #
+    # The data is hashed while it is spooled to a temporary file, which is
+    # only captured by buildbox-casd if the object is not in CAS already.
+    #
+    # Args:
+    #     fileobj (file): The binary file object to read the object from
+    #
+    # Returns:
+    #     (Digest): The digest of the added object
+    #
+    def add_object_stream(self, fileobj):
+        h = hashlib.sha256()
+        size = 0
+        with self._temporary_object() as tmp:
+            for chunk in iter(lambda: fileobj.read(_BUFFER_SIZE), b""):
+                h.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+            tmp.flush()
 
-                digest = remote_execution_pb2.Digest()
-                digest.CopyFrom(blob_response.digest)
-                digests.append(digest)
+            digest = remote_execution_pb2.Digest(hash=h.hexdigest(), size_bytes=size)
+            if self.contains_files([digest]):
+                return digest
 
-        return digests
+            return self._capture_files([tmp.name])[0]
 
     # import_directory():
     #
@@ -523,21 +645,18 @@ class CASCache:
     # Generator that returns the Digests of all blobs in the tree specified by
     # the Digest of the toplevel Directory object.
     #
+    # Each digest is returned only once. The blobs of complete trees are
+    # computed from the flattened tree and cached by root digest, so that
+    # walking the same tree again does not require reading any Directory
+    # protos.
+    #
     def required_blobs_for_directory(self, directory_digest, *, excluded_subdirs=None, _fetch_tree=True):
         if not excluded_subdirs:
-            excluded_subdirs = []
+            yield from self._get_tree_blobs(directory_digest, fetch_tree=_fetch_tree)
+            return
 
         if self._remote_cache and _fetch_tree:
-            # Ensure we have the directory protos in the local cache
-            local_cas = self.get_local_cas()
-
-            request = local_cas_pb2.FetchTreeRequest()
-            request.root_digest.CopyFrom(directory_digest)
-            request.fetch_file_blobs = False
-
-            local_cas.FetchTree(request)
-
-        # parse directory, and recursively add blobs
+            self._fetch_tree_protos(directory_digest)
 
         yield directory_digest
 
@@ -546,12 +665,55 @@ class CASCache:
         with open(self.objpath(directory_digest), "rb") as f:
             directory.ParseFromString(f.read())
 
+        seen = set()
         for filenode in directory.files:
-            yield filenode.digest
+            if filenode.digest.hash not in seen:
+                seen.add(filenode.digest.hash)
+                yield filenode.digest
 
         for dirnode in directory.directories:
             if dirnode.name not in excluded_subdirs:
-                yield from self.required_blobs_for_directory(dirnode.digest, _fetch_tree=False)
+                for digest in self._get_tree_blobs(dirnode.digest, fetch_tree=False):
+                    if digest.hash not in seen:
+                        seen.add(digest.hash)
+                        yield digest
+
+    # required_file_blobs_for_directory():
+    #
+    # Generator that returns the Digests of the file blobs of a directory tree,
+    # optionally only of the files selected by a filter. Only the Directory
+    # protos of the tree are required to be available.
+    #
+    # Args:
+    #     directory_digest (Digest): The directory digest
+    #     filter_callback (callable): Optional filter called with the path of each
+    #                                 file relative to the directory, which returns
+    #                                 whether to include the file
+    #
+    def required_file_blobs_for_directory(self, directory_digest, *, filter_callback=None):
+        if self._remote_cache:
+            self._fetch_tree_protos(directory_digest)
+
+        seen = set()
+        pending = [("", directory_digest)]
+        while pending:
+            prefix, digest = pending.pop()
+
+            directory = remote_execution_pb2.Directory()
+            with open(self.objpath(digest), "rb") as f:
+                directory.ParseFromString(f.read())
+
+            for filenode in directory.files:
+                if filenode.digest.hash in seen:
+                    continue
+                if filter_callback and not filter_callback(os.path.join(prefix, filenode.name)):
+                    continue
+
+                seen.add(filenode.digest.hash)
+                yield filenode.digest
+
+            for dirnode in directory.directories:
+                pending.append((os.path.join(prefix, dirnode.name), dirnode.digest))
 
     ################################################
     #             Local Private Methods            #
@@ -569,6 +731,222 @@ class CASCache:
             os.chmod(f.name, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
             yield f
 
+    # _capture_files():
+    #
+    # Capture files into CAS.
+    #
+    # Args:
+    #     paths (List[str]): Paths to files to add
+    #     instance_name (str): casd instance_name for remote CAS
+    #     move_files (bool): Whether buildbox-casd may move the files into CAS
+    #                        rather than copying them
+    #
+    # Returns:
+    #     (List[Digest]): The digests of the added files
+    #
+    def _capture_files(self, paths, *, instance_name=None, move_files=False):
+        request = local_cas_pb2.CaptureFilesRequest()
+        request.move_files = move_files
+        if instance_name:
+            request.instance_name = instance_name
+
+        for path in paths:
+            request.path.append(path)
+
+        local_cas = self.get_local_cas()
+
+        response = local_cas.CaptureFiles(request)
+
+        if len(response.responses) != len(paths):
+            raise CASCacheError(
+                "Expected {} responses from CaptureFiles, got {}".format(len(paths), len(response.responses))
+            )
+
+        digests = []
+        for path, blob_response in zip(paths, response.responses):
+            if blob_response.status.code == code_pb2.RESOURCE_EXHAUSTED:
+                raise CASCacheError("Cache too full", reason="cache-too-full")
+            if blob_response.status.code != code_pb2.OK:
+                raise CASCacheError("Failed to capture blob {}: {}".format(path, blob_response.status.code))
+
+            digest = remote_execution_pb2.Digest()
+            digest.CopyFrom(blob_response.digest)
+            digests.append(digest)
+
+        return digests
+
+    # _update_blobs():
+    #
+    # Write a batch of in-memory blobs to the local CAS with a single request.
+    #
+    # Args:
+    #     batch (List[Tuple[int, bytes]]): The blobs to write, along with their index in `digests`
+    #     digests (List[Digest]): The list in which to store the digests of the blobs
+    #
+    def _update_blobs(self, batch, digests):
+        request = remote_execution_pb2.BatchUpdateBlobsRequest()
+
+        for index, buffer in batch:
+            digest = utils._message_digest(buffer)
+            blob_request = request.requests.add()
+            blob_request.digest.CopyFrom(digest)
+            blob_request.data = buffer
+            digests[index] = digest
+
+        cas = self.get_cas()
+
+        response = cas.BatchUpdateBlobs(request)
+
+        if len(response.responses) != len(batch):
+            raise CASCacheError(
+                "Expected {} responses from BatchUpdateBlobs, got {}".format(len(batch), len(response.responses))
+            )
+
+        for blob_response in response.responses:
+            if blob_response.status.code == code_pb2.RESOURCE_EXHAUSTED:
+                raise CASCacheError("Cache too full", reason="cache-too-full")
+            if blob_response.status.code != code_pb2.OK:
+                raise CASCacheError(
+                    "Failed to write blob {}: {}".format(blob_response.digest.hash, blob_response.status.code)
+                )
+
+    # _fetch_tree_protos():
+    #
+    # Ensure that the Directory protos of a tree are in the local cache,
+    # fetching them from the remote cache or from the given remote.
+    #
+    # Args:
+    #     directory_digest (Digest): The digest of the root directory
+    #     remote (CASRemote): The remote to fetch from, or None for the remote cache
+    #
+    def _fetch_tree_protos(self, directory_digest, *, remote=None):
+        local_cas = self.get_local_cas()
+
+        request = local_cas_pb2.FetchTreeRequest()
+        if remote:
+            request.instance_name = remote.local_cas_instance_name
+        request.root_digest.CopyFrom(directory_digest)
+        request.fetch_file_blobs = False
+
+        local_cas.FetchTree(request)
+
+    # _get_tree_blobs():
+    #
+    # Get the Digests of all blobs in a directory tree.
+    #
+    # Args:
+    #     directory_digest (Digest): The digest of the root directory
+    #     fetch_tree (bool): Whether to fetch the Directory protos from the remote cache
+    #
+    # Returns:
+    #     (tuple): The deduplicated Digests of all blobs in the tree, starting with the root directory
+    #
+    def _get_tree_blobs(self, directory_digest, *, fetch_tree=True):
+        blobs, _ = self._get_tree(directory_digest, fetch_tree=fetch_tree)
+        return blobs
+
+    # _get_tree_directories():
+    #
+    # Get the Digests of the Directory protos of a directory tree.
+    #
+    # Args:
+    #     directory_digest (Digest): The digest of the root directory
+    #     fetch_tree (bool): Whether to fetch the Directory protos from the remote cache
+    #
+    # Returns:
+    #     (tuple): The deduplicated Digests of all Directory protos in the tree, starting with the root directory
+    #
+    def _get_tree_directories(self, directory_digest, *, fetch_tree=True):
+        blobs, directory_count = self._get_tree(directory_digest, fetch_tree=fetch_tree)
+        return blobs[:directory_count]
+
+    # _get_tree():
+    #
+    # Get the flattened directory tree.
+    #
+    # The Directory protos of the tree are read from the local cache and the
+    # resulting list of blobs is cached by root digest.
+    #
+    # Args:
+    #     directory_digest (Digest): The digest of the root directory
+    #     fetch_tree (bool): Whether to fetch the Directory protos from the remote cache
+    #
+    # Returns:
+    #     (tuple): The flattened tree, see _cache_tree_blobs()
+    #
+    def _get_tree(self, directory_digest, *, fetch_tree=True):
+        with self._tree_blobs_lock:
+            tree = self._tree_blobs.get(directory_digest.hash)
+            if tree is not None:
+                self._tree_blobs.move_to_end(directory_digest.hash)
+                return tree
+
+        if self._remote_cache and fetch_tree:
+            # Ensure we have the directory protos in the local cache
+            self._fetch_tree_protos(directory_digest)
+
+        # Read all the Directory protos of the tree, each of them only once
+        directories = {}
+        pending = [directory_digest]
+        while pending:
+            digest = pending.pop()
+            if digest.hash in directories:
+                continue
+
+            directory = remote_execution_pb2.Directory()
+            with open(self.objpath(digest), "rb") as f:
+                directory.ParseFromString(f.read())
+
+            directories[digest.hash] = directory
+            pending.extend(dirnode.digest for dirnode in directory.directories)
+
+        return self._cache_tree_blobs(directory_digest, directories)
+
+    # _cache_tree_blobs():
+    #
+    # Flatten a directory tree into the list of its blobs, and cache
+    # the result by root digest.
+    #
+    # Args:
+    #     directory_digest (Digest): The digest of the root directory
+    #     directories (dict): All Directory protos of the tree, by hash
+    #
+    # Returns:
+    #     (tuple): The deduplicated Digests of all blobs in the tree, starting with
+    #              its Directory protos, and the number of Directory protos
+    #
+    def _cache_tree_blobs(self, directory_digest, directories):
+        dirdigests = {directory_digest.hash: directory_digest}
+        filedigests = {}
+        pending = [directory_digest.hash]
+        while pending:
+            directory = directories[pending.pop()]
+
+            for filenode in directory.files:
+                filedigests[filenode.digest.hash] = filenode.digest
+
+            for dirnode in directory.directories:
+                if dirnode.digest.hash not in dirdigests:
+                    dirdigests[dirnode.digest.hash] = dirnode.digest
+                    pending.append(dirnode.digest.hash)
+
+        blobs = tuple(dirdigests.values()) + tuple(
+            digest for digest_hash, digest in filedigests.items() if digest_hash not in dirdigests
+        )
+        tree = (blobs, len(dirdigests))
+
+        with self._tree_blobs_lock:
+            if directory_digest.hash not in self._tree_blobs:
+                self._tree_blobs[directory_digest.hash] = tree
+                self._tree_blobs_count += len(blobs)
+
+                # Drop the least recently used trees when the cache grows too large
+                while self._tree_blobs_count > _TREE_BLOBS_CACHE_SIZE and len(self._tree_blobs) > 1:
+                    _, (evicted, _) = self._tree_blobs.popitem(last=False)
+                    self._tree_blobs_count -= len(evicted)
+
+        return tree
+
     # _fetch_directory():
     #
     # Fetches remote directory and adds it to content addressable store.
@@ -578,8 +956,10 @@ class CASCache:
     # Args:
     #     remote (Remote): The remote to use.
     #     dir_digest (Digest): Digest object for the directory to fetch.
+    #     with_files (bool): Whether to fetch the file blobs, or only the Directory protos
+    #     task (Task): Optional task to report the progress of the transfer of the files to
     #
-    def _fetch_directory(self, remote, dir_digest):
+    def _fetch_directory(self, remote, dir_digest, *, with_files=True, task=None):
         local_cas = self.get_local_cas()
 
         request = local_cas_pb2.FetchTreeRequest()
@@ -599,8 +979,9 @@ class CASCache:
                 "Failed to fetch directory tree {}: {}: {}".format(dir_digest.hash, e.code().name, e.details())
             ) from e
 
-        required_blobs = self.required_blobs_for_directory(dir_digest)
-        self.fetch_blobs(remote, required_blobs)
+        if with_files:
+            required_blobs = self.required_blobs_for_directory(dir_digest)
+            self.fetch_blobs(remote, required_blobs, task=task)
 
     def _fetch_tree(self, remote, digest):
         self.fetch_blobs(remote, [digest])
@@ -616,9 +997,77 @@ class CASCache:
 
         dirdigests = self.add_objects(buffers=dirbuffers)
 
+        # Remember the blobs of the tree while its Directory protos are at hand
+        directories = {dirdigests[0].hash: tree.root}
+        for dirdigest, directory in zip(dirdigests[1:], tree.children):
+            directories[dirdigest.hash] = directory
+        try:
+            self._cache_tree_blobs(dirdigests[0], directories)
+        except KeyError:
+            # The tree is incomplete, its blobs will be computed when needed
+            pass
+
         # The digest of the root directory
         return dirdigests[0]
 
+    # fetch_batch():
+    #
+    # Fetch many sets of directory trees and files from remote CAS together.
+    #
+    # The Directory protos of all trees are fetched concurrently, then the
+    # required blobs of all entries are deduplicated and fetched together,
+    # using a minimal number of requests.
+    #
+    # Args:
+    #    remote (CASRemote): The remote repository to fetch from
+    #    entries (dict): A dictionary mapping arbitrary hashable keys to a tuple
+    #                    of a list of directory digests and a list of file digests
+    #    with_files (bool): Whether to fetch the file blobs of the directory trees,
+    #                       or only their Directory protos
+    #    task (Task): Optional task to report the progress of the transfer to
+    #
+    # Returns:
+    #    (set): The keys of the entries which were completely fetched
+    #
+    def fetch_batch(self, remote, entries, *, with_files=True, task=None):
+        def collect_blobs(entry):
+            directories, files = entry
+            blobs = [digest for digest in files if digest.hash]
+            try:
+                for directory_digest in directories:
+                    self._fetch_tree_protos(directory_digest, remote=remote)
+                    if with_files:
+                        blobs.extend(self.required_blobs_for_directory(directory_digest))
+            except FileNotFoundError:
+                return None
+            except grpc.RpcError as e:
+                if e.code() == grpc.StatusCode.NOT_FOUND:
+                    return None
+                raise CASCacheError("Failed to fetch directory tree: {}: {}".format(e.code().name, e.details())) from e
+            return blobs
+
+        remote.init()
+
+        with ThreadPoolExecutor(max_workers=_FETCH_TREE_CONCURRENCY) as executor:
+            collected = dict(zip(entries.keys(), executor.map(collect_blobs, entries.values())))
+
+        required_blobs = {key: blobs for key, blobs in collected.items() if blobs is not None}
+        fetched = set(required_blobs.keys())
+
+        unique_blobs = {}
+        for blobs in required_blobs.values():
+            for digest in blobs:
+                unique_blobs[digest.hash] = digest
+
+        missing_blobs = self.fetch_blobs(remote, unique_blobs.values(), allow_partial=True, task=task)
+        if missing_blobs:
+            missing_hashes = {digest.hash for digest in missing_blobs}
+            for key, blobs in required_blobs.items():
+                if any(digest.hash in missing_hashes for digest in blobs):
+                    fetched.discard(key)
+
+        return fetched
+
     # fetch_blobs():
     #
     # Fetch blobs from remote CAS. Optionally returns missing blobs that could
@@ -629,26 +1078,47 @@ class CASCache:
     #    digests (list): The Digests of blobs to fetch
     #    allow_partial (bool): True to return missing blobs, False to raise a
     #                          BlobNotFound error if a blob is missing
+    #    task (Task): Optional task to report the progress of the transfer to
     #
     # Returns: The Digests of the blobs that were not available on the remote CAS
     #
-    def fetch_blobs(self, remote, digests, *, allow_partial=False):
+    # Blobs larger than the stream threshold of the remote are read with
+    # ByteStream, such that an interrupted transfer of such a blob does not
+    # start over, and compressed if compression is enabled for the remote.
+    #
+    def fetch_blobs(self, remote, digests, *, allow_partial=False, task=None):
         if self._remote_cache:
             # Determine blobs missing in the remote cache and only fetch those
             digests = self.missing_blobs(digests)
 
+        digests = [digest for digest in digests if digest.hash]
         missing_blobs = [] if allow_partial else None
+        progress = _TransferProgress(task, digests) if task else None
 
         remote.init()
 
         batch = _CASBatchRead(remote)
+        streamed_digests = []
+        batch_bytes = 0
+        stream_threshold = remote.stream_threshold()
 
         for digest in digests:
-            if digest.hash:
+            if digest.size_bytes > stream_threshold:
+                streamed_digests.append(digest)
+            else:
                 batch.add(digest)
+                batch_bytes += digest.size_bytes
 
         batch.send(missing_blobs=missing_blobs)
 
+        if progress:
+            progress.add(batch_bytes)
+
+        if streamed_digests:
+            # Like FetchMissingBlobs, skip the blobs which are available already
+            for digest in self.missing_blobs(streamed_digests):
+                self._fetch_blob_stream(remote, digest, missing_blobs, progress)
+
         if self._remote_cache:
             # Upload fetched blobs to the remote cache as we can't transfer
             # blobs directly from another remote to the remote cache
@@ -660,40 +1130,108 @@ class CASCache:
 
         return missing_blobs
 
+    # _fetch_blob_stream():
+    #
+    # Fetch a single blob with ByteStream.
+    #
+    # Args:
+    #    remote (CASRemote): The remote repository to fetch from
+    #    digest (Digest): The Digest of the blob to fetch
+    #    missing_blobs (list): The list to add the blob to if it is missing,
+    #                          or None to raise a BlobNotFound error
+    #    progress (_TransferProgress): Optional progress of the transfer
+    #
+    # The blob is read into a file in the temporary directory of the local
+    # CAS, which buildbox-casd then moves into the local CAS rather than
+    # copying it.
+    #
+    def _fetch_blob_stream(self, remote, digest, missing_blobs, progress):
+        stream = _CASStream(remote, progress=progress.add if progress else None)
+
+        with utils._tempdir(dir=self.tmpdir) as tmpdir:
+            path = os.path.join(tmpdir, digest.hash)
+            try:
+                stream.read(digest, path)
+            except BlobNotFound:
+                if missing_blobs is None:
+                    raise
+                missing_blobs.append(digest)
+                return
+
+            os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+            added_digest = self._capture_files([path], move_files=True)[0]
+
+        if added_digest.hash != digest.hash:
+            raise CASCacheError("Failed to download blob {}: received corrupted data".format(digest.hash))
+
     # send_blobs():
     #
     # Upload blobs to remote CAS.
     #
+    # Blobs which are known to be present on the remote are skipped, and
+    # the uploaded blobs are recorded as present on the remote.
+    #
     # Args:
     #    remote (CASRemote): The remote repository to upload to
     #    digests (list): The Digests of Blobs to upload
+    #    task (Task): Optional task to report the progress of the transfer to
     #
-    def send_blobs(self, remote, digests):
+    def send_blobs(self, remote, digests, *, task=None):
+        digests = remote.filter_present_blobs(digests)
+        if not digests:
+            return
+
         if self._remote_cache:
             # First fetch missing blobs from the remote cache as we can't
             # transfer blobs directly from the remote cache to another remote.
 
-            remote_missing_blobs = self.missing_blobs(digests, remote=remote)
+            remote_missing_blobs = list(self.missing_blobs(digests, remote=remote))
+
+            missing_hashes = {digest.hash for digest in remote_missing_blobs}
+            remote.add_present_blobs(digest for digest in digests if digest.hash not in missing_hashes)
+            digests = remote_missing_blobs
 
             batch = _CASBatchRead(self._default_remote)
             for digest in remote_missing_blobs:
                 batch.add(digest)
             batch.send()
 
+        remote.init()
+
+        progress = _TransferProgress(task, digests) if task else None
         batch = _CASBatchUpdate(remote)
+        streamed_digests = []
+        batch_bytes = 0
+        stream_threshold = remote.stream_threshold()
 
         for digest in digests:
-            batch.add(digest)
+            if digest.size_bytes > stream_threshold:
+                streamed_digests.append(digest)
+            else:
+                batch.add(digest)
+                batch_bytes += digest.size_bytes
 
         batch.send()
 
-    def _send_directory(self, remote, digest):
+        if progress:
+            progress.add(batch_bytes)
+
+        if streamed_digests:
+            # Like UploadMissingBlobs, skip the blobs which the remote has already
+            stream = _CASStream(remote, progress=progress.add if progress else None)
+            for digest in self.missing_blobs(streamed_digests, remote=remote):
+                stream.write(digest, self.objpath(digest))
+
+        remote.add_present_blobs(digests)
+
+    def _send_directory(self, remote, digest, *, task=None):
         required_blobs = self.required_blobs_for_directory(digest)
 
         # Upload any blobs missing on the server.
         # buildbox-casd will call FindMissingBlobs before the actual upload
-        # and skip blobs that already exist on the server.
-        self.send_blobs(remote, required_blobs)
+        # and skip blobs that already exist on the server, blobs which were
+        # already pushed in this session are skipped without asking.
+        self.send_blobs(remote, required_blobs, task=task)
 
     # get_cache_usage():
     #
@@ -803,3 +1341,38 @@ def _grouper(iterable, n):
         except StopIteration:
             return
         yield itertools.chain([current], itertools.islice(iterable, n - 1))
+
+
+# _TransferProgress()
+#
+# Reports the progress of a transfer of blobs to a task, in units
+# of _PROGRESS_UNIT_BYTES.
+#
+# Args:
+#    task (Task): The task to report progress to
+#    digests (list): The Digests of the blobs to transfer
+#
+class _TransferProgress:
+    def __init__(self, task, digests):
+        self._task = task
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        total_bytes = sum(digest.size_bytes for digest in digests)
+        self._task.set_maximum_progress(total_bytes // _PROGRESS_UNIT_BYTES)
+        self._task.set_current_progress(0)
+
+    # add():
+    #
+    # Add to the number of bytes transferred, this may be called
+    # from several threads at once.
+    #
+    # Args:
+    #    nbytes (int): The number of bytes transferred
+    #
+    def add(self, nbytes):
+        with self._lock:
+            self._bytes += nbytes
+            progress = self._bytes // _PROGRESS_UNIT_BYTES
+            if progress != self._task.current_progress:
+                self._task.set_current_progress(progress)
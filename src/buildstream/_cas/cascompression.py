@@ -0,0 +1,140 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from .._protos.build.bazel.remote.execution.v2 import remote_execution_pb2
+
+
+# The compressors of the Remote Execution API
+Compressor = remote_execution_pb2.Compressor
+
+# The window size of raw RFC 1951 deflate streams, without zlib headers
+_DEFLATE_WBITS = -15
+
+
+# supported_compressors():
+#
+# Get the compressors which are available, besides identity.
+#
+# Zstandard compression requires the optional `zstandard` module.
+#
+# Returns:
+#    (list): The supported Compressor values
+#
+def supported_compressors():
+    compressors = [Compressor.DEFLATE]
+    if zstandard is not None:
+        compressors.append(Compressor.ZSTD)
+    return compressors
+
+
+# compressor_name():
+#
+# Get the name of a compressor as used in ByteStream resource names.
+#
+# Args:
+#    compressor (Compressor): The compressor
+#
+# Returns:
+#    (str): The lowercase name of the compressor
+#
+def compressor_name(compressor):
+    return Compressor.Value.Name(compressor).lower()
+
+
+# compressor_from_name():
+#
+# Get a compressor from its name in ByteStream resource names.
+#
+# Args:
+#    name (str): The lowercase name of the compressor
+#
+# Returns:
+#    (Compressor): The compressor, or None if it is not supported
+#
+def compressor_from_name(name):
+    for compressor in supported_compressors():
+        if compressor_name(compressor) == name:
+            return compressor
+    return None
+
+
+# compressobj():
+#
+# Create an object compressing a stream of data, with `compress()`
+# and `flush()` methods like zlib compression objects.
+#
+# Args:
+#    compressor (Compressor): The compressor to use
+#
+def compressobj(compressor):
+    if compressor == Compressor.ZSTD:
+        return zstandard.ZstdCompressor().compressobj()
+
+    assert compressor == Compressor.DEFLATE
+    return zlib.compressobj(wbits=_DEFLATE_WBITS)
+
+
+# decompressobj():
+#
+# Create an object decompressing a stream of data, with `decompress()`
+# and `flush()` methods like zlib decompression objects.
+#
+# Args:
+#    compressor (Compressor): The compressor the data was compressed with
+#
+def decompressobj(compressor):
+    if compressor == Compressor.ZSTD:
+        return zstandard.ZstdDecompressor().decompressobj()
+
+    assert compressor == Compressor.DEFLATE
+    return zlib.decompressobj(wbits=_DEFLATE_WBITS)
+
+
+# compress():
+#
+# Compress a buffer.
+#
+# Args:
+#    compressor (Compressor): The compressor to use
+#    data (bytes): The data to compress
+#
+# Returns:
+#    (bytes): The compressed data
+#
+def compress(compressor, data):
+    obj = compressobj(compressor)
+    return obj.compress(data) + obj.flush()
+
+
+# decompress():
+#
+# Decompress a buffer.
+#
+# Args:
+#    compressor (Compressor): The compressor the data was compressed with
+#    data (bytes): The compressed data
+#
+# Returns:
+#    (bytes): The decompressed data
+#
+def decompress(compressor, data):
+    obj = decompressobj(compressor)
+    return obj.decompress(data) + obj.flush()
@@ -12,13 +12,24 @@
 #  limitations under the License.
 #
 
+import collections
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import grpc
 
+from .._protos.google.bytestream import bytestream_pb2, bytestream_pb2_grpc
 from .._protos.google.rpc import code_pb2
+from .._protos.build.bazel.remote.execution.v2 import remote_execution_pb2, remote_execution_pb2_grpc
 from .._protos.build.buildgrid import local_cas_pb2
 
 from .._remote import BaseRemote
-from .._exceptions import CASRemoteError
+from .._remotespec import RemoteCompression
+from .._exceptions import CASRemoteError, RemoteError
+from . import cascompression
+from .cascompression import Compressor
 
 # The default limit for gRPC messages is 4 MiB.
 # Limit payload to 1 MiB to leave sufficient headroom for metadata.
@@ -29,6 +40,49 @@ _MAX_PAYLOAD_BYTES = 1024 * 1024
 # 80 bytes provide sufficient space for hash, size, and protobuf overhead.
 _MAX_DIGESTS = _MAX_PAYLOAD_BYTES / 80
 
+# How many bytes of blobs to transfer with a single request to buildbox-casd.
+# buildbox-casd splits the transfer into requests to the remote on its own,
+# this only balances the work between the requests kept in flight.
+_MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+# How many requests to buildbox-casd to keep in flight at once
+_MAX_REQUESTS_IN_FLIGHT = 4
+
+# Blobs larger than this are transferred with ByteStream rather than in
+# batches, such that interrupted transfers can be resumed.
+_STREAM_THRESHOLD_BYTES = 64 * 1024 * 1024
+
+# Blobs larger than this are transferred compressed with ByteStream when
+# compression is enabled, as buildbox-casd only transfers uncompressed
+# blobs in batches.
+_COMPRESSED_STREAM_THRESHOLD_BYTES = 1024 * 1024
+
+# The compressors of the compression configured for remotes
+_COMPRESSORS = {
+    RemoteCompression.DEFLATE: Compressor.DEFLATE,
+    RemoteCompression.ZSTD: Compressor.ZSTD,
+}
+
+# Size of the ranges of a blob which are read concurrently
+_STREAM_RANGE_BYTES = 16 * 1024 * 1024
+
+# How many ranges of a blob to read concurrently
+_STREAM_CONCURRENCY = 4
+
+# How many times to resume a transfer which is interrupted without progress
+_STREAM_RETRIES = 3
+
+# The errors after which an interrupted transfer is resumed
+_STREAM_RETRY_CODES = frozenset(
+    [
+        grpc.StatusCode.UNAVAILABLE,
+        grpc.StatusCode.DEADLINE_EXCEEDED,
+        grpc.StatusCode.ABORTED,
+        grpc.StatusCode.INTERNAL,
+        grpc.StatusCode.UNKNOWN,
+    ]
+)
+
 
 class BlobNotFound(CASRemoteError):
     def __init__(self, blob, msg):
@@ -45,6 +99,19 @@ class CASRemote(BaseRemote):
         self.cascache = cascache
         self.local_cas_instance_name = None
 
+        # The ByteStream service on a direct connection to the remote used
+        # for streamed transfers, the metadata of its calls and the compressor
+        # negotiated with the remote
+        self.bytestream = None
+        self.call_metadata = ()
+        self.compressor = Compressor.IDENTITY
+
+        # The hashes of the blobs known to be present on, or missing from
+        # the remote, shared by all jobs of the session
+        self._present_blobs = set()
+        self._missing_blobs = set()
+        self._present_blobs_lock = threading.Lock()
+
     # check_remote
     # _configure_protocols():
     #
@@ -70,6 +137,140 @@ class CASRemote(BaseRemote):
             raise
         self.local_cas_instance_name = response.instance_name
 
+        self._configure_bytestream()
+
+    # _check():
+    #
+    # Check that the remote supports the configured compression.
+    #
+    # Raises:
+    #     RemoteError: If the remote does not support the compression
+    #
+    def _check(self):
+        if self.spec and self.spec.compression != RemoteCompression.NONE and self.compressor == Compressor.IDENTITY:
+            raise RemoteError(
+                "Configured remote does not support {} compression. Please check remote configuration.".format(
+                    self.spec.compression.value
+                )
+            )
+
+    # _configure_bytestream():
+    #
+    # Open a direct connection to the remote for streamed transfers, and
+    # negotiate the configured compression with the capabilities of the remote.
+    #
+    # Large blobs are streamed directly with the remote rather than through
+    # buildbox-casd, such that interrupted transfers are resumed on the link
+    # to the remote, and such that they can be compressed, which buildbox-casd
+    # does not support. The compression is left disabled if the remote does
+    # not support it.
+    #
+    def _configure_bytestream(self):
+        if self.spec.access_token_file:
+            with open(self.spec.access_token_file, "r", encoding="utf-8") as f:
+                self.call_metadata = (("authorization", "Bearer {}".format(f.read().strip())),)
+
+        self.channel = self.spec.open_channel()
+        self.bytestream = bytestream_pb2_grpc.ByteStreamStub(self.channel)
+
+        if self.spec.compression == RemoteCompression.NONE:
+            return
+
+        capabilities = remote_execution_pb2_grpc.CapabilitiesStub(self.channel)
+        request = remote_execution_pb2.GetCapabilitiesRequest(instance_name=self.spec.instance_name or "")
+        try:
+            response = capabilities.GetCapabilities(request, metadata=self.call_metadata)
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                return
+            raise
+
+        compressor = _COMPRESSORS[self.spec.compression]
+        if compressor in response.cache_capabilities.supported_compressors:
+            self.compressor = compressor
+
+    # close():
+    #
+    # Close the connection to the remote, the ByteStream connection is
+    # opened and the compression negotiated again when the remote is
+    # initialized again.
+    #
+    def close(self):
+        self.compressor = Compressor.IDENTITY
+        self.bytestream = None
+        super().close()
+
+    # stream_threshold():
+    #
+    # Get the size above which blobs are transferred with ByteStream.
+    #
+    # Returns:
+    #     (int): The size in bytes
+    #
+    def stream_threshold(self):
+        if self.compressor != Compressor.IDENTITY:
+            return _COMPRESSED_STREAM_THRESHOLD_BYTES
+        return _STREAM_THRESHOLD_BYTES
+
+    # filter_present_blobs():
+    #
+    # Filter out the blobs which are known to be present on the remote,
+    # because they were found there or uploaded earlier in the session.
+    #
+    # Args:
+    #     digests (iterable): The Digests of the blobs
+    #
+    # Returns:
+    #     (list): The Digests of the blobs which may be missing on the remote
+    #
+    def filter_present_blobs(self, digests):
+        digests = list(digests)
+        with self._present_blobs_lock:
+            return [digest for digest in digests if digest.hash not in self._present_blobs]
+
+    # add_present_blobs():
+    #
+    # Record that blobs are present on the remote.
+    #
+    # Args:
+    #     digests (iterable): The Digests of the blobs
+    #
+    def add_present_blobs(self, digests):
+        hashes = {digest.hash for digest in digests}
+        with self._present_blobs_lock:
+            self._present_blobs.update(hashes)
+            self._missing_blobs.difference_update(hashes)
+
+    # filter_missing_blobs():
+    #
+    # Filter out the blobs which are known to be missing on the remote,
+    # because they were not found there earlier in the session.
+    #
+    # Args:
+    #     digests (iterable): The Digests of the blobs
+    #
+    # Returns:
+    #     (list): The Digests of the blobs which may be present on the remote
+    #
+    def filter_missing_blobs(self, digests):
+        digests = list(digests)
+        with self._present_blobs_lock:
+            return [digest for digest in digests if digest.hash not in self._missing_blobs]
+
+    # add_missing_blobs():
+    #
+    # Record that blobs are missing on the remote, until they
+    # are recorded as present with add_present_blobs().
+    #
+    # Args:
+    #     digests (iterable): The Digests of the blobs
+    #
+    def add_missing_blobs(self, digests):
+        hashes = {digest.hash for digest in digests}
+        with self._present_blobs_lock:
+            self._missing_blobs.update(hashes)
+            self._present_blobs.difference_update(hashes)
+
     # push_message():
     #
     # Push the given protobuf message to a remote.
@@ -89,38 +290,88 @@ class CASRemote(BaseRemote):
         return self.cascache.add_object(buffer=message_buffer, instance_name=self.local_cas_instance_name)
 
 
-# Represents a batch of blobs queued for fetching.
+# Base class of batches of blobs queued for transfer.
+#
+# The blobs are transferred by buildbox-casd, with requests holding at
+# most _MAX_DIGESTS digests and, unless a single blob exceeds it, at most
+# _MAX_REQUEST_BYTES bytes of blobs. Several requests are kept in flight
+# at once, such that transfers from or to a remote with a high latency
+# are not serialized.
+#
+# Args:
+#    remote (CASRemote): The remote to transfer blobs from or to
+#    max_in_flight (int): The maximum number of requests in flight at once
 #
-class _CASBatchRead:
-    def __init__(self, remote):
+class _CASBatch:
+    def __init__(self, remote, *, max_in_flight=_MAX_REQUESTS_IN_FLIGHT):
         self._remote = remote
+        self._max_in_flight = max_in_flight
         self._requests = []
         self._request = None
+        self._request_bytes = 0
         self._sent = False
 
     def add(self, digest):
         assert not self._sent
 
-        if not self._request or len(self._request.blob_digests) >= _MAX_DIGESTS:
-            self._request = local_cas_pb2.FetchMissingBlobsRequest()
+        if (
+            not self._request
+            or len(self._request.blob_digests) >= _MAX_DIGESTS
+            or self._request_bytes + digest.size_bytes > _MAX_REQUEST_BYTES
+        ):
+            self._request = self._create_request()
             self._request.instance_name = self._remote.local_cas_instance_name
             self._requests.append(self._request)
+            self._request_bytes = 0
 
         request_digest = self._request.blob_digests.add()
         request_digest.CopyFrom(digest)
+        self._request_bytes += digest.size_bytes
 
-    def send(self, *, missing_blobs=None):
+    # _create_request()
+    #
+    # Create an empty request to buildbox-casd.
+    #
+    def _create_request(self):
+        raise NotImplementedError()
+
+    # _send_requests()
+    #
+    # Send the requests of the batch, keeping up to `max_in_flight`
+    # requests in flight at once.
+    #
+    # Args:
+    #    method (grpc.UnaryUnaryMultiCallable): The method of buildbox-casd to call
+    #
+    # Yields:
+    #    The responses, in the order of the requests
+    #
+    def _send_requests(self, method):
         assert not self._sent
         self._sent = True
 
-        if not self._requests:
-            return
+        in_flight = collections.deque()
+        try:
+            for request in self._requests:
+                if len(in_flight) >= self._max_in_flight:
+                    yield in_flight.popleft().result()
+                in_flight.append(method.future(request))
 
-        local_cas = self._remote.cascache.get_local_cas()
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            # Don't leave requests running if a response was an error
+            for future in in_flight:
+                future.cancel()
 
-        for request in self._requests:
-            batch_response = local_cas.FetchMissingBlobs(request)
 
+# Represents a batch of blobs queued for fetching.
+#
+class _CASBatchRead(_CASBatch):
+    def send(self, *, missing_blobs=None):
+        local_cas = self._remote.cascache.get_local_cas()
+
+        for batch_response in self._send_requests(local_cas.FetchMissingBlobs):
             for response in batch_response.responses:
                 if response.status.code == code_pb2.NOT_FOUND:
                     if missing_blobs is None:
@@ -130,51 +381,24 @@ class _CASBatchRead:
                         )
 
                     missing_blobs.append(response.digest)
+                    continue
 
                 if response.status.code != code_pb2.OK:
                     raise CASRemoteError(
                         "Failed to download blob {}: {}".format(response.digest.hash, response.status.code)
                     )
-                if response.digest.size_bytes != len(response.data):
-                    raise CASRemoteError(
-                        "Failed to download blob {}: expected {} bytes, received {} bytes".format(
-                            response.digest.hash, response.digest.size_bytes, len(response.data)
-                        )
-                    )
+
+    def _create_request(self):
+        return local_cas_pb2.FetchMissingBlobsRequest()
 
 
 # Represents a batch of blobs queued for upload.
 #
-class _CASBatchUpdate:
-    def __init__(self, remote):
-        self._remote = remote
-        self._requests = []
-        self._request = None
-        self._sent = False
-
-    def add(self, digest):
-        assert not self._sent
-
-        if not self._request or len(self._request.blob_digests) >= _MAX_DIGESTS:
-            self._request = local_cas_pb2.UploadMissingBlobsRequest()
-            self._request.instance_name = self._remote.local_cas_instance_name
-            self._requests.append(self._request)
-
-        request_digest = self._request.blob_digests.add()
-        request_digest.CopyFrom(digest)
-
+class _CASBatchUpdate(_CASBatch):
     def send(self):
-        assert not self._sent
-        self._sent = True
-
-        if not self._requests:
-            return
-
         local_cas = self._remote.cascache.get_local_cas()
 
-        for request in self._requests:
-            batch_response = local_cas.UploadMissingBlobs(request)
-
+        for batch_response in self._send_requests(local_cas.UploadMissingBlobs):
             for response in batch_response.responses:
                 if response.status.code != code_pb2.OK:
                     if response.status.code == code_pb2.RESOURCE_EXHAUSTED:
@@ -186,3 +410,359 @@ class _CASBatchUpdate:
                         "Failed to upload blob {}: {}".format(response.digest.hash, response.status.code),
                         reason=reason,
                     )
+
+    def _create_request(self):
+        return local_cas_pb2.UploadMissingBlobsRequest()
+
+
+# Transfers single large blobs with ByteStream.
+#
+# Blobs are read in ranges, which are read concurrently, and interrupted
+# transfers are resumed from where they stopped rather than restarted.
+#
+# When compression was negotiated with the remote, blobs are rather
+# transferred compressed in a single stream directly with the remote.
+#
+# Args:
+#    remote (CASRemote): The remote to transfer blobs from or to
+#    progress (callable): Optional function called with the number of bytes
+#                         transferred whenever a transfer progresses, possibly
+#                         from several threads at once
+#
+class _CASStream:
+    def __init__(self, remote, *, progress=None):
+        self._remote = remote
+        self._progress = progress
+
+    # read():
+    #
+    # Read a blob from the remote into a file.
+    #
+    # Args:
+    #    digest (Digest): The digest of the blob
+    #    path (str): The path of the file to write
+    #
+    # Raises:
+    #    (BlobNotFound): If the remote does not have the blob
+    #    (CASRemoteError): If the blob could not be read
+    #
+    def read(self, digest, path):
+        if self._remote.compressor != Compressor.IDENTITY:
+            self._read_compressed(digest, path)
+            return
+
+        bytestream = self._get_bytestream()
+        resource_name = self._resource_name(digest)
+
+        ranges = [
+            (start, min(start + _STREAM_RANGE_BYTES, digest.size_bytes))
+            for start in range(0, digest.size_bytes, _STREAM_RANGE_BYTES)
+        ]
+
+        with open(path, "wb") as f:
+            f.truncate(digest.size_bytes)
+
+            with ThreadPoolExecutor(max_workers=_STREAM_CONCURRENCY) as executor:
+                futures = [
+                    executor.submit(self._read_range, bytestream, resource_name, digest, f.fileno(), start, end)
+                    for start, end in ranges
+                ]
+                try:
+                    for future in futures:
+                        future.result()
+                finally:
+                    for future in futures:
+                        future.cancel()
+
+    # write():
+    #
+    # Write a blob from a file to the remote.
+    #
+    # Args:
+    #    digest (Digest): The digest of the blob
+    #    path (str): The path of the file to read
+    #
+    # Raises:
+    #    (CASRemoteError): If the blob could not be written
+    #
+    def write(self, digest, path):
+        if self._remote.compressor != Compressor.IDENTITY:
+            self._write_compressed(digest, path)
+            return
+
+        bytestream = self._get_bytestream()
+        resource_name = self._resource_name(digest, upload=True)
+
+        offset = 0
+        failures = 0
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    response = bytestream.Write(
+                        self._write_requests(f, resource_name, digest, offset), metadata=self._remote.call_metadata
+                    )
+                except grpc.RpcError as e:
+                    if e.code() == grpc.StatusCode.ALREADY_EXISTS:
+                        return
+
+                    if e.code() not in _STREAM_RETRY_CODES:
+                        raise CASRemoteError(
+                            "Failed to upload blob {}: {}".format(digest.hash, e.code().name),
+                            reason="cache-too-full" if e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED else None,
+                        ) from e
+
+                    # Resume from what the remote received, which is what we
+                    # sent unless it lost some of the data
+                    committed_size = self._query_write_status(bytestream, resource_name, digest)
+                    self._report_progress(committed_size - f.tell())
+
+                    failures = 0 if committed_size > offset else failures + 1
+                    if failures > _STREAM_RETRIES:
+                        raise CASRemoteError("Failed to upload blob {}: {}".format(digest.hash, e.code().name)) from e
+
+                    offset = committed_size
+                    if offset == digest.size_bytes:
+                        return
+                    continue
+
+                if response.committed_size != digest.size_bytes:
+                    raise CASRemoteError(
+                        "Failed to upload blob {}: committed {} of {} bytes".format(
+                            digest.hash, response.committed_size, digest.size_bytes
+                        )
+                    )
+                return
+
+    # _read_range():
+    #
+    # Read a range of a blob, resuming the read when it is interrupted.
+    #
+    def _read_range(self, bytestream, resource_name, digest, fd, start, end):
+        offset = start
+        failures = 0
+        while offset < end:
+            request = bytestream_pb2.ReadRequest(
+                resource_name=resource_name, read_offset=offset, read_limit=end - offset
+            )
+
+            previous_offset = offset
+            error = "stream ended early"
+            try:
+                for response in bytestream.Read(request, metadata=self._remote.call_metadata):
+                    if offset + len(response.data) > end:
+                        raise CASRemoteError("Failed to download blob {}: received too much data".format(digest.hash))
+
+                    os.pwrite(fd, response.data, offset)
+                    offset += len(response.data)
+                    self._report_progress(len(response.data))
+            except grpc.RpcError as e:
+                if e.code() == grpc.StatusCode.NOT_FOUND:
+                    raise BlobNotFound(
+                        digest.hash, "Failed to download blob {}: {}".format(digest.hash, e.code().name)
+                    ) from e
+                if e.code() not in _STREAM_RETRY_CODES:
+                    raise CASRemoteError("Failed to download blob {}: {}".format(digest.hash, e.code().name)) from e
+                error = e.code().name
+
+            # Give up if the read is repeatedly interrupted without progress
+            failures = 0 if offset > previous_offset else failures + 1
+            if offset < end and failures > _STREAM_RETRIES:
+                raise CASRemoteError("Failed to download blob {}: {}".format(digest.hash, error))
+
+    # _write_requests():
+    #
+    # Generate the requests writing a blob from the given offset.
+    #
+    def _write_requests(self, f, resource_name, digest, offset):
+        f.seek(offset)
+        while True:
+            data = f.read(_MAX_PAYLOAD_BYTES)
+            request = bytestream_pb2.WriteRequest(resource_name=resource_name, write_offset=offset, data=data)
+            offset += len(data)
+            request.finish_write = offset >= digest.size_bytes
+
+            self._report_progress(len(data))
+            yield request
+
+            if request.finish_write:
+                break
+
+    # _read_compressed():
+    #
+    # Read a compressed blob from the remote, resuming the read from
+    # the uncompressed offset when it is interrupted.
+    #
+    def _read_compressed(self, digest, path):
+        resource_name = self._resource_name(digest, compressor=self._remote.compressor)
+
+        offset = 0
+        failures = 0
+        with open(path, "wb") as f:
+            while True:
+                request = bytestream_pb2.ReadRequest(resource_name=resource_name, read_offset=offset)
+                decompressor = cascompression.decompressobj(self._remote.compressor)
+
+                previous_offset = offset
+                error = "stream ended early"
+                try:
+                    for response in self._remote.bytestream.Read(request, metadata=self._remote.call_metadata):
+                        offset += self._write_decompressed(f, digest, decompressor.decompress(response.data))
+                    offset += self._write_decompressed(f, digest, decompressor.flush())
+                except grpc.RpcError as e:
+                    if e.code() == grpc.StatusCode.NOT_FOUND:
+                        raise BlobNotFound(
+                            digest.hash, "Failed to download blob {}: {}".format(digest.hash, e.code().name)
+                        ) from e
+                    if e.code() not in _STREAM_RETRY_CODES:
+                        raise CASRemoteError(
+                            "Failed to download blob {}: {}".format(digest.hash, e.code().name)
+                        ) from e
+                    error = e.code().name
+                except CASRemoteError:
+                    raise
+                except Exception as e:  # pylint: disable=broad-except
+                    # zlib and zstandard raise their own errors on corrupt data
+                    raise CASRemoteError("Failed to decompress blob {}: {}".format(digest.hash, e)) from e
+
+                if offset == digest.size_bytes:
+                    return
+
+                # Discard the partially decompressed data beyond the offset
+                f.truncate(offset)
+                f.seek(offset)
+
+                failures = 0 if offset > previous_offset else failures + 1
+                if failures > _STREAM_RETRIES:
+                    raise CASRemoteError("Failed to download blob {}: {}".format(digest.hash, error))
+
+    # _write_decompressed():
+    #
+    # Write decompressed data of a blob, returning its length.
+    #
+    def _write_decompressed(self, f, digest, data):
+        if f.tell() + len(data) > digest.size_bytes:
+            raise CASRemoteError("Failed to download blob {}: received too much data".format(digest.hash))
+
+        f.write(data)
+        self._report_progress(len(data))
+        return len(data)
+
+    # _write_compressed():
+    #
+    # Write a blob compressed to the remote. Compressed writes cannot be
+    # resumed as the compressed offsets are not known in advance, so an
+    # interrupted write is restarted.
+    #
+    def _write_compressed(self, digest, path):
+        failures = 0
+        with open(path, "rb") as f:
+            while True:
+                resource_name = self._resource_name(digest, upload=True, compressor=self._remote.compressor)
+                f.seek(0)
+                try:
+                    self._remote.bytestream.Write(
+                        self._write_compressed_requests(f, resource_name), metadata=self._remote.call_metadata
+                    )
+                    return
+                except grpc.RpcError as e:
+                    if e.code() == grpc.StatusCode.ALREADY_EXISTS:
+                        return
+
+                    failures += 1
+                    if e.code() not in _STREAM_RETRY_CODES or failures > _STREAM_RETRIES:
+                        raise CASRemoteError(
+                            "Failed to upload blob {}: {}".format(digest.hash, e.code().name),
+                            reason="cache-too-full" if e.code() == grpc.StatusCode.RESOURCE_EXHAUSTED else None,
+                        ) from e
+
+                    self._report_progress(-f.tell())
+
+    # _write_compressed_requests():
+    #
+    # Generate the requests writing a compressed blob, the write offsets
+    # of which are offsets in the compressed data.
+    #
+    def _write_compressed_requests(self, f, resource_name):
+        compressor = cascompression.compressobj(self._remote.compressor)
+        offset = 0
+        while True:
+            data = f.read(_MAX_PAYLOAD_BYTES)
+            self._report_progress(len(data))
+            if data:
+                compressed = compressor.compress(data)
+                if not compressed:
+                    continue
+                finish_write = False
+            else:
+                compressed = compressor.flush()
+                finish_write = True
+
+            yield bytestream_pb2.WriteRequest(
+                resource_name=resource_name, write_offset=offset, data=compressed, finish_write=finish_write
+            )
+            offset += len(compressed)
+
+            if finish_write:
+                break
+
+    # _query_write_status():
+    #
+    # Query how much of a blob the remote received, or 0 if the
+    # remote does not support resuming writes.
+    #
+    def _query_write_status(self, bytestream, resource_name, digest):
+        request = bytestream_pb2.QueryWriteStatusRequest(resource_name=resource_name)
+        try:
+            response = bytestream.QueryWriteStatus(request, metadata=self._remote.call_metadata)
+        except grpc.RpcError:
+            return 0
+
+        if response.complete:
+            return digest.size_bytes
+        return min(response.committed_size, digest.size_bytes)
+
+    # _get_bytestream():
+    #
+    # Get the ByteStream service to transfer blobs with, which is the one
+    # of the remote, unless the remote is the remote cache of buildbox-casd.
+    #
+    def _get_bytestream(self):
+        if self._remote.bytestream:
+            return self._remote.bytestream
+        return self._remote.cascache.get_bytestream()
+
+    # _resource_name():
+    #
+    # Get the ByteStream resource name of a blob.
+    #
+    # Blobs transferred directly with the remote use the instance of the
+    # remote, those transferred through buildbox-casd use the instance of
+    # buildbox-casd for the remote.
+    #
+    def _resource_name(self, digest, *, upload=False, compressor=Compressor.IDENTITY):
+        if compressor == Compressor.IDENTITY:
+            name = "blobs/{}/{}".format(digest.hash, digest.size_bytes)
+        else:
+            name = "compressed-blobs/{}/{}/{}".format(
+                cascompression.compressor_name(compressor), digest.hash, digest.size_bytes
+            )
+
+        if self._remote.bytestream:
+            instance_name = self._remote.spec.instance_name
+        else:
+            instance_name = self._remote.local_cas_instance_name
+
+        if upload:
+            name = "uploads/{}/{}".format(uuid.uuid4(), name)
+        if instance_name:
+            name = "{}/{}".format(instance_name, name)
+        return name
+
+    # _report_progress():
+    #
+    # Report that a transfer progressed by a number of bytes, which
+    # is negative when data must be transferred again.
+    #
+    def _report_progress(self, nbytes):
+        if self._progress and nbytes:
+            self._progress(nbytes)
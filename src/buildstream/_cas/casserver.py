@@ -30,7 +30,10 @@ from .._protos.build.bazel.remote.execution.v2 import (
     remote_execution_pb2,
     remote_execution_pb2_grpc,
 )
-from .._protos.google.bytestream import bytestream_pb2_grpc
+from .._protos.google.bytestream import bytestream_pb2, bytestream_pb2_grpc
+from .._protos.google.rpc import code_pb2
+from . import cascompression
+from .cascompression import Compressor
 from .casdprocessmanager import CASDProcessManager
 
 
@@ -134,6 +137,10 @@ class _ByteStreamServicer(bytestream_pb2_grpc.ByteStreamServicer):
 
     def Read(self, request, context):
         self.logger.debug("Reading %s", request.resource_name)
+        resource_name, compressor = self._parse_resource_name(request.resource_name, context)
+        if compressor != Compressor.IDENTITY:
+            return self._read_compressed(request, resource_name, compressor, context)
+
         try:
             ret = self.bytestream.Read(request)
         except grpc.RpcError as err:
@@ -144,12 +151,119 @@ class _ByteStreamServicer(bytestream_pb2_grpc.ByteStreamServicer):
         # Note that we can't easily give more information because the
         # data is stuck in an iterator that will be consumed if read.
         self.logger.debug("Writing data")
+
+        first_request = next(request_iterator, None)
+        if first_request is None:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Empty write")
+
+        def requests():
+            yield first_request
+            yield from request_iterator
+
+        resource_name, compressor = self._parse_resource_name(first_request.resource_name, context)
+        if compressor != Compressor.IDENTITY:
+            return self._write_compressed(requests(), resource_name, compressor, context)
+
+        try:
+            ret = self.bytestream.Write(requests())
+        except grpc.RpcError as err:
+            context.abort(err.code(), err.details())
+        return ret
+
+    def QueryWriteStatus(self, request, context):
+        self.logger.debug("Querying write status of %s", request.resource_name)
+        resource_name, _ = self._parse_resource_name(request.resource_name, context)
         try:
-            ret = self.bytestream.Write(request_iterator)
+            ret = self.bytestream.QueryWriteStatus(bytestream_pb2.QueryWriteStatusRequest(resource_name=resource_name))
         except grpc.RpcError as err:
             context.abort(err.code(), err.details())
         return ret
 
+    # _parse_resource_name():
+    #
+    # Parse a ByteStream resource name, which may refer to a compressed blob.
+    #
+    # buildbox-casd only serves uncompressed blobs, so the resource names of
+    # compressed blobs are rewritten to the names of the uncompressed blobs.
+    #
+    # Returns:
+    #    (str): The resource name of the uncompressed blob
+    #    (Compressor): The compressor of the transfer
+    #
+    def _parse_resource_name(self, resource_name, context):
+        parts = resource_name.split("/")
+        if "compressed-blobs" not in parts:
+            return resource_name, Compressor.IDENTITY
+
+        index = parts.index("compressed-blobs")
+        if index + 1 >= len(parts):
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Invalid resource name: {}".format(resource_name))
+
+        compressor = cascompression.compressor_from_name(parts[index + 1])
+        if compressor is None:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Unsupported compressor: {}".format(parts[index + 1]))
+
+        parts[index : index + 2] = ["blobs"]
+        return "/".join(parts), compressor
+
+    # _read_compressed():
+    #
+    # Read an uncompressed blob from buildbox-casd, compressing its data.
+    #
+    def _read_compressed(self, request, resource_name, compressor, context):
+        if request.read_limit:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Read limits of compressed blobs are not supported")
+
+        request = bytestream_pb2.ReadRequest(resource_name=resource_name, read_offset=request.read_offset)
+        compressobj = cascompression.compressobj(compressor)
+        try:
+            for response in self.bytestream.Read(request):
+                data = compressobj.compress(response.data)
+                if data:
+                    yield bytestream_pb2.ReadResponse(data=data)
+        except grpc.RpcError as err:
+            context.abort(err.code(), err.details())
+
+        yield bytestream_pb2.ReadResponse(data=compressobj.flush())
+
+    # _write_compressed():
+    #
+    # Write a compressed blob to buildbox-casd, decompressing its data.
+    #
+    # The write offset of the first request is an offset in the uncompressed
+    # blob, the offsets of the following requests also count the compressed
+    # data of the previous requests.
+    #
+    def _write_compressed(self, request_iterator, resource_name, compressor, context):
+        decompressobj = cascompression.decompressobj(compressor)
+        compressed_size = 0
+
+        def requests():
+            nonlocal compressed_size
+
+            offset = None
+            for request in request_iterator:
+                if offset is None:
+                    offset = request.write_offset
+                try:
+                    data = decompressobj.decompress(request.data)
+                    if request.finish_write:
+                        data += decompressobj.flush()
+                except Exception as e:  # pylint: disable=broad-except
+                    context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Failed to decompress data: {}".format(e))
+
+                compressed_size += len(request.data)
+                yield bytestream_pb2.WriteRequest(
+                    resource_name=resource_name, write_offset=offset, data=data, finish_write=request.finish_write
+                )
+                offset += len(data)
+
+        try:
+            self.bytestream.Write(requests())
+        except grpc.RpcError as err:
+            context.abort(err.code(), err.details())
+        return bytestream_pb2.WriteResponse(committed_size=compressed_size)
+
 
 class _ContentAddressableStorageServicer(remote_execution_pb2_grpc.ContentAddressableStorageServicer):
     def __init__(self, casd, *, enable_push):
@@ -168,14 +282,39 @@ class _ContentAddressableStorageServicer(remote_execution_pb2_grpc.ContentAddres
 
     def BatchReadBlobs(self, request, context):
         self.logger.info("Reading '%s'", request.digests)
+
+        # Compress the blobs with the first acceptable compressor we support
+        supported = cascompression.supported_compressors()
+        compressor = next((c for c in request.acceptable_compressors if c in supported), Compressor.IDENTITY)
+        del request.acceptable_compressors[:]
+
         try:
             ret = self.cas.BatchReadBlobs(request)
         except grpc.RpcError as err:
             context.abort(err.code(), err.details())
+
+        if compressor != Compressor.IDENTITY:
+            for response in ret.responses:
+                if response.status.code == code_pb2.OK:
+                    response.data = cascompression.compress(compressor, response.data)
+                    response.compressor = compressor
         return ret
 
     def BatchUpdateBlobs(self, request, context):
         self.logger.info("Updating: '%s'", [request.digest for request in request.requests])
+
+        supported = cascompression.supported_compressors()
+        for blob_request in request.requests:
+            if blob_request.compressor == Compressor.IDENTITY:
+                continue
+            if blob_request.compressor not in supported:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Unsupported compressor")
+            try:
+                blob_request.data = cascompression.decompress(blob_request.compressor, blob_request.data)
+            except Exception as e:  # pylint: disable=broad-except
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Failed to decompress data: {}".format(e))
+            blob_request.compressor = Compressor.IDENTITY
+
         try:
             ret = self.cas.BatchUpdateBlobs(request)
         except grpc.RpcError as err:
@@ -196,6 +335,8 @@ class _CapabilitiesServicer(remote_execution_pb2_grpc.CapabilitiesServicer):
         cache_capabilities.action_cache_update_capabilities.update_enabled = False
         cache_capabilities.max_batch_total_size_bytes = _MAX_PAYLOAD_BYTES
         cache_capabilities.symlink_absolute_path_strategy = remote_execution_pb2.SymlinkAbsolutePathStrategy.ALLOWED
+        cache_capabilities.supported_compressors.extend(cascompression.supported_compressors())
+        cache_capabilities.supported_batch_update_compressors.extend(cascompression.supported_compressors())
 
         response.deprecated_api_version.major = 2
         response.low_api_version.major = 2
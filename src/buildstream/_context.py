@@ -27,7 +27,13 @@ from ._messenger import Messenger
 from ._profile import Topics, PROFILER
 from ._platform import Platform
 from ._artifactcache import ArtifactCache
+from ._buildstats import BuildStats
+from ._downloader import Downloader
+from ._remotequerycache import RemoteQueryCache
+from ._mirrorhealth import MirrorHealth
+from ._cachekeyindex import CacheKeyIndex
 from ._elementsourcescache import ElementSourcesCache
+from ._loader.loadcache import LoadCache
 from ._remotespec import RemoteSpec, RemoteExecutionSpec
 from ._sourcecache import SourceCache
 from ._cas import CASCache, CASDProcessManager, CASLogLevel
@@ -39,6 +45,7 @@ from .node import Node, MappingNode
 if TYPE_CHECKING:
     # pylint: disable=cyclic-import
     from ._project import Project
+    from ._scheduler.jobserver import JobServer
 
     # pylint: enable=cyclic-import
 
@@ -152,9 +159,18 @@ class Context:
         # Maximum number of fetch or refresh tasks
         self.sched_fetchers: Optional[int] = None
 
+        # Maximum number of simultaneous connections to a host when downloading
+        self.sched_connections_per_host: Optional[int] = None
+
         # Maximum number of build tasks
         self.sched_builders: Optional[int] = None
 
+        # Whether to adapt the number of build tasks to the host load
+        self.sched_adaptive_builders: Optional[bool] = None
+
+        # Minimum number of build tasks, when adapting to the host load
+        self.sched_min_builders: Optional[int] = None
+
         # Maximum number of push tasks
         self.sched_pushers: Optional[int] = None
 
@@ -167,6 +183,12 @@ class Context:
         # Maximum jobs per build
         self.build_max_jobs: Optional[int] = None
 
+        # Whether to share a jobserver between concurrent builds
+        self.build_jobserver: Optional[bool] = None
+
+        # The jobserver shared by builds, while the scheduler is running
+        self.jobserver: Optional["JobServer"] = None
+
         # Retry any existing failed builds
         self.build_retry_failed: Optional[bool] = None
 
@@ -194,6 +216,18 @@ class Context:
         # Whether or not to cache build trees on artifact creation
         self.cache_buildtrees: Optional[str] = None
 
+        # Whether to store the artifact and source refs in a database
+        self.cache_indexed_refs: Optional[bool] = None
+
+        # Whether to query all artifact remotes at once when pulling artifacts
+        self.cache_race_remotes: Optional[bool] = None
+
+        # Number of seconds during which to reuse answers of remotes about artifacts
+        self.cache_remote_query_ttl: Optional[int] = None
+
+        # Whether to only pull the Directory protos of artifacts, fetching files on demand
+        self.cache_lazy_pull: Optional[bool] = None
+
         # Don't shoot the messenger
         self.messenger: Messenger = Messenger()
 
@@ -225,6 +259,12 @@ class Context:
         self._workspace_project_cache: WorkspaceProjectCache = WorkspaceProjectCache()
         self._casd: Optional[CASDProcessManager] = None
         self._cascache: Optional[CASCache] = None
+        self._cachekeyindex: Optional[CacheKeyIndex] = None
+        self._loadcache: Optional[LoadCache] = None
+        self._buildstats: Optional[BuildStats] = None
+        self._remotequerycache: Optional[RemoteQueryCache] = None
+        self._mirrorhealth: Optional[MirrorHealth] = None
+        self._downloader: Optional[Downloader] = None
 
     # __enter__()
     #
@@ -238,6 +278,24 @@ class Context:
     # Called when exiting the with-statement context.
     #
     def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self._cachekeyindex:
+            self._cachekeyindex.save()
+
+        if self._loadcache:
+            self._loadcache.save()
+
+        if self._buildstats:
+            self._buildstats.save()
+
+        if self._remotequerycache:
+            self._remotequerycache.save()
+
+        if self._mirrorhealth:
+            self._mirrorhealth.save()
+
+        if self._downloader:
+            self._downloader.release_resources()
+
         if self._artifactcache:
             self._artifactcache.release_resources()
 
@@ -362,7 +420,18 @@ class Context:
         # We need to find the first existing directory in the path of our
         # casdir - the casdir may not have been created yet.
         cache = defaults.get_mapping("cache")
-        cache.validate_keys(["quota", "storage-service", "pull-buildtrees", "cache-buildtrees"])
+        cache.validate_keys(
+            [
+                "quota",
+                "storage-service",
+                "pull-buildtrees",
+                "cache-buildtrees",
+                "indexed-refs",
+                "race-remotes",
+                "remote-query-ttl",
+                "lazy-pull",
+            ]
+        )
 
         cas_volume = self.casdir
         while not os.path.exists(cas_volume):
@@ -401,6 +470,24 @@ class Context:
         # Load cache build trees configuration
         self.cache_buildtrees = cache.get_enum("cache-buildtrees", _CacheBuildTrees)
 
+        # Load ref store configuration
+        self.cache_indexed_refs = cache.get_bool("indexed-refs")
+
+        # Load remote racing configuration
+        self.cache_race_remotes = cache.get_bool("race-remotes")
+
+        # Load remote query cache configuration
+        self.cache_remote_query_ttl = cache.get_int("remote-query-ttl")
+        if self.cache_remote_query_ttl < 0:
+            provenance = cache.get_scalar("remote-query-ttl").get_provenance()
+            raise LoadError(
+                "{}: Invalid value for 'remote-query-ttl'. Must be at least 0.".format(provenance),
+                LoadErrorReason.INVALID_DATA,
+            )
+
+        # Load lazy pull configuration
+        self.cache_lazy_pull = cache.get_bool("lazy-pull")
+
         # Load logging config
         logging = defaults.get_mapping("logging")
         logging.validate_keys(
@@ -426,17 +513,44 @@ class Context:
 
         # Load scheduler config
         scheduler = defaults.get_mapping("scheduler")
-        scheduler.validate_keys(["on-error", "fetchers", "builders", "pushers", "network-retries"])
+        scheduler.validate_keys(
+            [
+                "on-error",
+                "fetchers",
+                "connections-per-host",
+                "builders",
+                "adaptive-builders",
+                "min-builders",
+                "pushers",
+                "network-retries",
+            ]
+        )
         self.sched_error_action = scheduler.get_enum("on-error", _SchedulerErrorAction)
         self.sched_fetchers = scheduler.get_int("fetchers")
+        self.sched_connections_per_host = scheduler.get_int("connections-per-host")
+        if self.sched_connections_per_host < 1:
+            provenance = scheduler.get_scalar("connections-per-host").get_provenance()
+            raise LoadError(
+                "{}: Invalid value for 'connections-per-host'. Must be at least 1.".format(provenance),
+                LoadErrorReason.INVALID_DATA,
+            )
         self.sched_builders = scheduler.get_int("builders")
+        self.sched_adaptive_builders = scheduler.get_bool("adaptive-builders")
+        self.sched_min_builders = scheduler.get_int("min-builders")
+        if self.sched_min_builders < 1:
+            provenance = scheduler.get_scalar("min-builders").get_provenance()
+            raise LoadError(
+                "{}: Invalid value for 'min-builders'. Must be at least 1.".format(provenance),
+                LoadErrorReason.INVALID_DATA,
+            )
         self.sched_pushers = scheduler.get_int("pushers")
         self.sched_network_retries = scheduler.get_int("network-retries")
 
         # Load build config
         build = defaults.get_mapping("build")
-        build.validate_keys(["max-jobs", "retry-failed", "dependencies"])
+        build.validate_keys(["max-jobs", "jobserver", "retry-failed", "dependencies"])
         self.build_max_jobs = build.get_int("max-jobs")
+        self.build_jobserver = build.get_bool("jobserver")
         self.build_retry_failed = build.get_bool("retry-failed")
 
         dependencies = build.get_str("dependencies")
@@ -497,6 +611,48 @@ class Context:
 
         return self._sourcecache
 
+    @property
+    def cachekeyindex(self) -> CacheKeyIndex:
+        if not self._cachekeyindex:
+            assert self.cachedir
+            self._cachekeyindex = CacheKeyIndex(os.path.join(self.cachedir, "cache_key_index"))
+
+        return self._cachekeyindex
+
+    @property
+    def loadcache(self) -> LoadCache:
+        if not self._loadcache:
+            assert self.cachedir
+            self._loadcache = LoadCache(os.path.join(self.cachedir, "load_cache"))
+
+        return self._loadcache
+
+    @property
+    def buildstats(self) -> BuildStats:
+        if not self._buildstats:
+            assert self.cachedir
+            self._buildstats = BuildStats(os.path.join(self.cachedir, "build_stats"))
+
+        return self._buildstats
+
+    @property
+    def remotequerycache(self) -> RemoteQueryCache:
+        if not self._remotequerycache:
+            assert self.cachedir
+            self._remotequerycache = RemoteQueryCache(
+                os.path.join(self.cachedir, "remote_query_cache"), self.cache_remote_query_ttl
+            )
+
+        return self._remotequerycache
+
+    @property
+    def mirrorhealth(self) -> MirrorHealth:
+        if not self._mirrorhealth:
+            assert self.cachedir
+            self._mirrorhealth = MirrorHealth(os.path.join(self.cachedir, "mirror_health"))
+
+        return self._mirrorhealth
+
     # add_project():
     #
     # Add a project to the context.
@@ -709,6 +865,17 @@ class Context:
             self._cascache = CASCache(self.cachedir, casd=self.get_casd(), remote_cache=bool(self.remote_cache_spec))
         return self._cascache
 
+    # get_downloader():
+    #
+    # Return the Downloader running the downloads of sources
+    # for this session.
+    #
+    def get_downloader(self) -> Downloader:
+        if self._downloader is None:
+            assert self.sched_connections_per_host is not None
+            self._downloader = Downloader(self.sched_connections_per_host)
+        return self._downloader
+
     ######################################################
     #                  Private methods                   #
     ######################################################
@@ -0,0 +1,399 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import http.client
+import itertools
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import traceback
+import urllib.error
+import urllib.request
+from contextlib import suppress
+from typing import Dict, List, Tuple
+
+from . import _signals
+from ._exceptions import PluginError
+
+
+# The default maximum number of simultaneous connections to a host
+DEFAULT_CONNECTIONS_PER_HOST = 8
+
+# The connection pool of this process, see get_connection_pool()
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+
+# get_connection_pool()
+#
+# Get the HTTP connection pool of this process, creating it if needed.
+#
+# Downloads run in the process of the Downloader, such that all of them
+# share a single pool for the session.
+#
+# Returns:
+#    (HTTPConnectionPool): The connection pool
+#
+def get_connection_pool():
+    global _connection_pool  # pylint: disable=global-statement
+
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            _connection_pool = HTTPConnectionPool(DEFAULT_CONNECTIONS_PER_HOST)
+        return _connection_pool
+
+
+# build_opener()
+#
+# Build a urllib opener whose HTTP and HTTPS requests use the connection
+# pool of this process.
+#
+# Args:
+#    handlers (BaseHandler): Additional handlers, as for urllib.request.build_opener()
+#
+# Returns:
+#    (OpenerDirector): The opener
+#
+def build_opener(*handlers):
+    pool = get_connection_pool()
+    return urllib.request.build_opener(_PooledHTTPHandler(pool), _PooledHTTPSHandler(pool), *handlers)
+
+
+# HTTPConnectionPool()
+#
+# A thread safe pool of persistent HTTP connections, keyed by host, which
+# also caps the number of simultaneous connections to every host.
+#
+# Args:
+#    max_connections_per_host (int): The maximum number of simultaneous connections to a host
+#
+class HTTPConnectionPool:
+    def __init__(self, max_connections_per_host):
+        self._max_connections_per_host = max_connections_per_host
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple[str, str], List[http.client.HTTPConnection]] = {}
+        self._slots: Dict[Tuple[str, str], threading.BoundedSemaphore] = {}
+
+    # open()
+    #
+    # Send a urllib request over a pooled connection, waiting for
+    # a connection slot of the host if needed.
+    #
+    # The connection is returned to the pool once the body of the
+    # response was read entirely, or discarded if the response is
+    # closed earlier.
+    #
+    # Args:
+    #    connection_class (type): The HTTPConnection class for the scheme of the request
+    #    req (urllib.request.Request): The request
+    #    kwargs: Additional arguments for new connections
+    #
+    # Returns:
+    #    (http.client.HTTPResponse): The response
+    #
+    def open(self, connection_class, req, **kwargs):
+        if not req.host:
+            raise urllib.error.URLError("no host given")
+
+        key = (req.type, req.host)
+        headers = dict(req.unredirected_hdrs)
+        headers.update({name: value for name, value in req.headers.items() if name not in headers})
+        headers = {name.title(): value for name, value in headers.items()}
+
+        slots = self._get_slots(key)
+        slots.acquire()
+        try:
+            while True:
+                conn, reused = self._get_connection(key, connection_class, req, **kwargs)
+                try:
+                    conn.request(
+                        req.get_method(),
+                        req.selector,
+                        req.data,
+                        headers,
+                        encode_chunked=req.has_header("Transfer-encoding"),
+                    )
+                    response = conn.getresponse()
+                    break
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                    conn.close()
+                    # The server closed the idle connection, retry with a new one
+                    if not reused:
+                        raise urllib.error.URLError(e)
+                except OSError as e:
+                    conn.close()
+                    raise urllib.error.URLError(e)
+        except BaseException:
+            slots.release()
+            raise
+
+        response.url = req.get_full_url()
+        response.msg = response.reason
+        if response.isclosed():
+            self._release(key, conn, not response.will_close)
+        else:
+            response.on_close = lambda reusable: self._release(key, conn, reusable and not response.will_close)
+
+        # Drain the bodies of redirections and errors, such that
+        # the handlers retrying requests do not hold a connection slot
+        if response.status >= 300:
+            response.read()
+
+        return response
+
+    # close()
+    #
+    # Close the idle connections.
+    #
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    def _get_slots(self, key):
+        with self._lock:
+            slots = self._slots.get(key)
+            if slots is None:
+                slots = self._slots[key] = threading.BoundedSemaphore(self._max_connections_per_host)
+            return slots
+
+    def _get_connection(self, key, connection_class, req, **kwargs):
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+
+        if conn is None:
+            conn = connection_class(req.host, timeout=req.timeout, **kwargs)
+            conn.response_class = _PooledResponse
+            return conn, False
+
+        if isinstance(req.timeout, (int, float)):
+            conn.timeout = req.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(req.timeout)
+        return conn, True
+
+    def _release(self, key, conn, reusable):
+        if reusable:
+            with self._lock:
+                self._idle.setdefault(key, []).append(conn)
+        else:
+            conn.close()
+        self._slots[key].release()
+
+
+# Downloader()
+#
+# A process running downloads for the whole session, in which they
+# share a connection pool, such that downloading many files from
+# the same servers does not pay for a new connection every time.
+#
+# The process is started when the first download is run.
+#
+# Args:
+#    max_connections_per_host (int): The maximum number of simultaneous connections to a host
+#
+class Downloader:
+    def __init__(self, max_connections_per_host):
+        self._max_connections_per_host = max_connections_per_host
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._pending: Dict[int, queue.Queue] = {}
+        self._process = None
+        self._requests = None
+
+        try:
+            self._multiprocessing_context = multiprocessing.get_context("forkserver")
+        except ValueError:
+            # As for blocking activities of plugins, fallback to spawn
+            # on systems without forkserver support.
+            self._multiprocessing_context = multiprocessing.get_context("spawn")
+
+    # run()
+    #
+    # Run a download in the downloader process, and wait for it to complete.
+    #
+    # This is to be used in place of Plugin.blocking_activity() for downloads,
+    # with the same requirements: the function, its arguments and return value
+    # must all be pickleable, and the function should not raise an exception.
+    #
+    # Args:
+    #    target (callable): The function to run
+    #    args (tuple): The arguments of the function
+    #
+    # Returns:
+    #    The return value of `target`
+    #
+    # Raises:
+    #    (PluginError): If the function raised an exception, or the process died
+    #
+    def run(self, target, args):
+        result_queue = queue.Queue()
+        with self._lock:
+            process = self._ensure_process()
+            request_id = next(self._ids)
+            self._pending[request_id] = result_queue
+            self._requests.put((request_id, target, args))
+
+        try:
+            with _signals.suspendable(self._suspend, self._resume):
+                while True:
+                    try:
+                        err, result = result_queue.get(timeout=1)
+                        break
+                    except queue.Empty:
+                        if not process.is_alive():
+                            raise PluginError("Download process died with error code {}".format(process.exitcode))
+        finally:
+            with self._lock:
+                del self._pending[request_id]
+
+        if err is not None:
+            raise PluginError("An error happened while downloading", detail=err)
+
+        return result
+
+    # release_resources()
+    #
+    # Stop the downloader process.
+    #
+    def release_resources(self):
+        with self._lock:
+            process, self._process = self._process, None
+            if process is None:
+                return
+            self._requests.put(None)
+
+        process.join(timeout=15)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def _ensure_process(self):
+        if self._process is not None and self._process.is_alive():
+            return self._process
+
+        self._requests = self._multiprocessing_context.Queue()
+        results = self._multiprocessing_context.Queue()
+        self._process = self._multiprocessing_context.Process(
+            target=_downloader_main, args=(self._requests, results, self._max_connections_per_host), daemon=True
+        )
+        self._process.start()
+
+        dispatcher = threading.Thread(target=self._dispatch, args=(self._process, results), daemon=True)
+        dispatcher.start()
+
+        return self._process
+
+    # Hand the results over to the threads waiting for them, results of
+    # downloads whose jobs were terminated are dropped.
+    def _dispatch(self, process, results):
+        while True:
+            try:
+                request_id, err, result = results.get(timeout=1)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                return
+            except (EOFError, OSError):
+                return
+
+            with self._lock:
+                result_queue = self._pending.get(request_id)
+            if result_queue is not None:
+                result_queue.put((err, result))
+
+    def _suspend(self):
+        process = self._process
+        if process is not None and process.is_alive():
+            with suppress(ProcessLookupError):
+                os.kill(process.pid, signal.SIGSTOP)
+
+    def _resume(self):
+        process = self._process
+        if process is not None and process.is_alive():
+            with suppress(ProcessLookupError):
+                os.kill(process.pid, signal.SIGCONT)
+
+
+# A response which hands its connection back to the pool once closed
+class _PooledResponse(http.client.HTTPResponse):
+    on_close = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._reusable = True
+
+    def close(self):
+        # Closed before the whole body was read, the rest of
+        # the body would be received on the next request
+        if self.fp is not None:
+            self._reusable = False
+        super().close()
+
+    def _close_conn(self):
+        super()._close_conn()
+        on_close, self.on_close = self.on_close, None
+        if on_close is not None:
+            on_close(self._reusable)
+
+
+class _PooledHTTPHandler(urllib.request.HTTPHandler):
+    def __init__(self, pool):
+        super().__init__()
+        self._pool = pool
+
+    def http_open(self, req):
+        return self._pool.open(http.client.HTTPConnection, req)
+
+
+class _PooledHTTPSHandler(urllib.request.HTTPSHandler):
+    def __init__(self, pool):
+        super().__init__()
+        self._pool = pool
+
+    def https_open(self, req):
+        # Connections tunneled through proxies are not pooled
+        if req._tunnel_host:  # pylint: disable=protected-access
+            return super().https_open(req)
+        return self._pool.open(http.client.HTTPSConnection, req, context=self._context)
+
+
+def _run_download(results, request_id, target, args):
+    try:
+        result = target(*args)
+        results.put((request_id, None, result))
+    except Exception:  # pylint: disable=broad-except
+        results.put((request_id, traceback.format_exc(), None))
+
+
+def _downloader_main(requests, results, max_connections_per_host):
+    global _connection_pool  # pylint: disable=global-statement
+
+    # Interrupting the session suspends the jobs rather than terminating them
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    _connection_pool = HTTPConnectionPool(max_connections_per_host)
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        threading.Thread(target=_run_download, args=(results, *request), daemon=True).start()
+
+    _connection_pool.close()
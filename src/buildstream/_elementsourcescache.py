@@ -16,7 +16,6 @@ import os
 from ._cas.casremote import BlobNotFound
 from ._assetcache import AssetCache
 from ._exceptions import AssetCacheError, CASError, CASRemoteError, SourceCacheError
-from . import utils
 from ._protos.buildstream.v2 import source_pb2
 
 REMOTE_ASSET_SOURCE_URN_TEMPLATE = "urn:fdc:buildstream.build:2020:source:{}"
@@ -31,8 +30,7 @@ class ElementSourcesCache(AssetCache):
     def __init__(self, context):
         super().__init__(context)
 
-        self._basedir = os.path.join(context.cachedir, "elementsources")
-        os.makedirs(self._basedir, exist_ok=True)
+        self._open_refs(os.path.join(context.cachedir, "elementsources"))
 
     # load_proto():
     #
@@ -43,22 +41,19 @@ class ElementSourcesCache(AssetCache):
     #
     def load_proto(self, sources):
         ref = sources.get_cache_key()
-        path = self._source_path(ref)
 
-        if not os.path.exists(path):
+        data = self._refs.load(ref)
+        if data is None:
             return None
 
         source_proto = source_pb2.Source()
-        with open(path, "r+b") as f:
-            source_proto.ParseFromString(f.read())
-            return source_proto
+        source_proto.ParseFromString(data)
+        return source_proto
 
     def store_proto(self, sources, proto):
         ref = sources.get_cache_key()
-        path = self._source_path(ref)
 
-        with utils.save_file_atomic(path, "w+b") as f:
-            f.write(proto.SerializeToString())
+        self._refs.store([ref], proto.SerializeToString())
 
     # pull():
     #
@@ -187,17 +182,13 @@ class ElementSourcesCache(AssetCache):
         return pushed
 
     def _get_source(self, ref):
-        path = self._source_path(ref)
-        source_proto = source_pb2.Source()
-        try:
-            with open(path, "r+b") as f:
-                source_proto.ParseFromString(f.read())
-                return source_proto
-        except FileNotFoundError as e:
-            raise SourceCacheError("Attempted to access unavailable source: {}".format(e)) from e
+        data = self._refs.load(ref)
+        if data is None:
+            raise SourceCacheError("Attempted to access unavailable source: {}".format(ref))
 
-    def _source_path(self, ref):
-        return os.path.join(self._basedir, ref)
+        source_proto = source_pb2.Source()
+        source_proto.ParseFromString(data)
+        return source_proto
 
     # _push_source_blobs()
     #
@@ -291,9 +282,7 @@ class ElementSourcesCache(AssetCache):
                 source.ParseFromString(f.read())
 
             # Write the source proto to cache
-            source_path = os.path.join(self._basedir, key)
-            with utils.save_file_atomic(source_path, mode="wb") as f:
-                f.write(source.SerializeToString())
+            self._refs.store([key], source.SerializeToString())
 
             self.cas._fetch_directory(remote, source.files)
         except BlobNotFound:
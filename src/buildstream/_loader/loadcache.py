@@ -0,0 +1,210 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from .. import utils
+
+
+# Version of the cache format, bump this whenever the format of the cache
+# files or of the serialized nodes changes so that existing entries are discarded.
+_CACHE_VERSION = 2
+
+# Entries which were not used for this many seconds are dropped from the cache
+_EXPIRY = 30 * 24 * 60 * 60
+
+# Entries are only marked as used again on disk once their timestamp is older
+# than this many seconds, to avoid touching the cache on every invocation.
+# Expired entries are also looked for at most once per interval.
+_REFRESH_INTERVAL = 24 * 60 * 60
+
+# The file whose timestamp records when expired entries were last removed
+_EXPIRY_STAMP = "expiry-stamp"
+
+
+# LoadCache()
+#
+# A persistent cache of parsed element files.
+#
+# The cache records the serialized node trees of the files parsed by the
+# loader, indexed by the sha256 of the file contents. Files whose contents
+# did not change since they were last loaded are deserialized from the cache
+# instead of being parsed again.
+#
+# Each entry is stored in its own file, named after its key, whose
+# modification time records when it was last used. Entries are read when
+# they are looked up, and saving the cache only writes the new entries.
+#
+# Args:
+#    path (str): The path of the cache directory
+#
+class LoadCache:
+    def __init__(self, path: str):
+        self._path: str = path
+        self._entries: Dict[str, tuple] = {}  # The entries looked up or stored during this session
+        self._stored: Dict[str, tuple] = {}  # The entries stored during this session
+        self._refreshed: Set[str] = set()  # The keys of the entries to mark as used
+        self._lock: threading.Lock = threading.Lock()
+
+        self.misses: int = 0  # The number of lookups which missed the cache
+
+    # lookup()
+    #
+    # Look up the parsed node tree of file contents.
+    #
+    # Args:
+    #    contents (str): The contents of the file
+    #
+    # Returns:
+    #    (tuple): The serialized node tree, or None if the contents were not parsed before
+    #
+    def lookup(self, contents: str) -> Optional[tuple]:
+        key = self._key(contents)
+        with self._lock:
+            serialized = self._entries.get(key)
+        if serialized is not None:
+            return serialized
+
+        serialized, mtime = self._load_entry(key)
+
+        with self._lock:
+            if serialized is None:
+                self.misses += 1
+                return None
+
+            if time.time() - mtime > _REFRESH_INTERVAL:
+                self._refreshed.add(key)
+            self._entries[key] = serialized
+
+        return serialized
+
+    # store()
+    #
+    # Store the parsed node tree of file contents, the cache is written
+    # to disk with save().
+    #
+    # Args:
+    #    contents (str): The contents of the file
+    #    serialized (tuple): The serialized node tree
+    #
+    def store(self, contents: str, serialized: tuple) -> None:
+        key = self._key(contents)
+        with self._lock:
+            self._entries[key] = serialized
+            self._stored[key] = serialized
+
+    # save()
+    #
+    # Write the entries stored during this session to disk, mark the entries
+    # which were used as such and drop the expired entries.
+    #
+    def save(self) -> None:
+        with self._lock:
+            try:
+                for key, serialized in self._stored.items():
+                    path = self._entry_path(key)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with utils.save_file_atomic(path, "wb") as f:
+                        pickle.dump((_CACHE_VERSION, serialized), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+                for key in self._refreshed - self._stored.keys():
+                    try:
+                        os.utime(self._entry_path(key))
+                    except FileNotFoundError:
+                        # Removed concurrently by another session
+                        pass
+
+                if self._stored or self._refreshed:
+                    self._remove_expired()
+            except OSError:
+                # The cache is an optimization only, failing to save it is not an error
+                pass
+
+            self._stored = {}
+            self._refreshed = set()
+
+    # _key()
+    #
+    # Compute the key of file contents in the cache.
+    #
+    def _key(self, contents: str) -> str:
+        return hashlib.sha256(contents.encode("utf-8")).hexdigest()
+
+    # _entry_path()
+    #
+    # Get the path of the file of an entry.
+    #
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self._path, key[:2], key[2:])
+
+    # _load_entry()
+    #
+    # Load an entry from its file.
+    #
+    # Args:
+    #    key (str): The key of the entry
+    #
+    # Returns:
+    #    (tuple): The serialized node tree, or None if the entry is missing,
+    #             unreadable or was written by an incompatible version
+    #    (float): The time at which the entry was last used
+    #
+    def _load_entry(self, key: str) -> Tuple[Optional[tuple], float]:
+        try:
+            with open(self._entry_path(key), "rb") as f:
+                mtime = os.fstat(f.fileno()).st_mtime
+                version, serialized = pickle.load(f)
+        except Exception:  # pylint: disable=broad-except
+            # A missing, truncated or otherwise corrupted entry is simply discarded
+            return None, 0
+
+        if version != _CACHE_VERSION:
+            return None, 0
+
+        return serialized, mtime
+
+    # _remove_expired()
+    #
+    # Remove the entries which were not used for a long time, unless this
+    # was already done recently.
+    #
+    def _remove_expired(self) -> None:
+        stamp = os.path.join(self._path, _EXPIRY_STAMP)
+        now = time.time()
+        try:
+            if now - os.stat(stamp).st_mtime < _REFRESH_INTERVAL:
+                return
+        except FileNotFoundError:
+            pass
+
+        with open(stamp, "w", encoding="utf-8"):
+            pass
+
+        with os.scandir(self._path) as subdirs:
+            for subdir in subdirs:
+                if not subdir.is_dir(follow_symlinks=False):
+                    continue
+
+                with os.scandir(subdir.path) as entries:
+                    for entry in entries:
+                        if now - entry.stat(follow_symlinks=False).st_mtime > _EXPIRY:
+                            try:
+                                os.unlink(entry.path)
+                            except FileNotFoundError:
+                                pass
@@ -17,6 +17,7 @@
 from .._exceptions import LoadError
 from ..exceptions import LoadErrorReason
 from ..types import _ProjectInformation
+from .prefetcher import LoadPrefetcher
 
 
 # ProjectLoaders()
@@ -190,6 +191,18 @@ class LoadContext:
         # A table of all Loaders, indexed by project name
         self._loaders = {}
 
+        self._prefetcher = None
+
+    # prefetcher
+    #
+    # The LoadPrefetcher parsing element files ahead of the loaders
+    #
+    @property
+    def prefetcher(self):
+        if self._prefetcher is None:
+            self._prefetcher = LoadPrefetcher(self.context.loadcache, self.context.platform.get_cpu_count())
+        return self._prefetcher
+
     # set_rewritable()
     #
     # Sets whether the projects are to be loaded in a rewritable fashion,
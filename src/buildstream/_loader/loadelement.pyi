@@ -11,11 +11,12 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
-from typing import List
+from typing import List, Optional, Tuple
 
 from ..node import Node, ScalarNode
 
 def extract_depends_from_node(node: Node) -> List[Dependency]: ...
+def list_dependency_files(node: Node) -> List[Tuple[Optional[str], str]]: ...
 
 class Dependency: ...
 class DependencyType: ...
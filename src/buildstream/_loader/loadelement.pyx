@@ -616,3 +616,31 @@ def extract_depends_from_node(Node node):
     _extract_depends_from_node(node, <str> Symbol.RUNTIME_DEPENDS, <int> DependencyType.RUNTIME, acc)
     _extract_depends_from_node(node, <str> Symbol.DEPENDS, <int> 0, acc)
     return [dep for dep in acc.values()]
+
+
+# list_dependency_files():
+#
+# List the filename, junction tuples of all dependencies declared in a
+# node, without interpreting or removing the dependency declarations.
+#
+# Args:
+#    node (Node): A YAML loaded dictionary
+#
+# Returns:
+#    (list): A list of (junction, filename) tuples
+#
+# Raises:
+#    (LoadError): If the dependencies are malformed
+#
+def list_dependency_files(Node node):
+    cdef list files = []
+    cdef str key
+    cdef SequenceNode depends
+    cdef object dep_node_object
+
+    for key in (<str> Symbol.BUILD_DEPENDS, <str> Symbol.RUNTIME_DEPENDS, <str> Symbol.DEPENDS):
+        depends = node.get_sequence(key, [])
+        for dep_node_object in depends.value:
+            files.extend(_list_dependency_node_files(<Node> dep_node_object))
+
+    return files
@@ -126,11 +126,14 @@ class Loader:
         #
         target_elements = []
 
-        for target in targets:
-            with PROFILER.profile(Topics.LOAD_PROJECT, target):
-                _junction, name, loader = self._parse_name(target, None)
-                element = loader._load_file(name, None)
-                target_elements.append(element)
+        try:
+            for target in targets:
+                with PROFILER.profile(Topics.LOAD_PROJECT, target):
+                    _junction, name, loader = self._parse_name(target, None)
+                    element = loader._load_file(name, None)
+                    target_elements.append(element)
+        finally:
+            self.load_context.prefetcher.shutdown()
 
         #
         # Now that we've resolved the dependencies, scan them for circular dependencies
@@ -275,9 +278,14 @@ class Loader:
 
         # Load the data and process any conditional statements therein
         fullpath = os.path.join(self._basedir, filename)
+        self.load_context.prefetcher.wait(fullpath)
         try:
             node = _yaml.load(
-                fullpath, shortname=filename, copy_tree=self.load_context.rewritable, project=self.project
+                fullpath,
+                shortname=filename,
+                copy_tree=self.load_context.rewritable,
+                project=self.project,
+                cache=self.load_context.context.loadcache,
             )
         except LoadError as e:
             if e.reason == LoadErrorReason.MISSING_FILE:
@@ -477,6 +485,7 @@ class Loader:
         top_element.mark_fully_loaded()
 
         dependencies = extract_depends_from_node(top_element.node)
+        self._prefetch_dependencies(dependencies)
         # The loader queue is a stack of tuples
         # [0] is the LoadElement instance
         # [1] is a stack of Dependency objects to load
@@ -509,6 +518,7 @@ class Loader:
                         dep_element.mark_fully_loaded()
 
                         dep_deps = extract_depends_from_node(dep_element.node)
+                        self._prefetch_dependencies(dep_deps)
                         loader_queue.append((dep_element, list(reversed(dep_deps)), []))
 
                         # Pylint is not very happy about Cython and can't understand 'node' is a 'MappingNode'
@@ -530,6 +540,19 @@ class Loader:
         # Nothing more in the queue, return the top level element we loaded.
         return top_element
 
+    # _prefetch_dependencies():
+    #
+    # Request that the files of dependencies within this project be
+    # parsed ahead of loading them.
+    #
+    # Args:
+    #    dependencies (list): The Dependency objects which are about to be loaded
+    #
+    def _prefetch_dependencies(self, dependencies):
+        self.load_context.prefetcher.prefetch(
+            self._basedir, [dep.name for dep in dependencies if dep.junction is None]
+        )
+
     # _check_circular_deps():
     #
     # Detect circular dependencies on LoadElements with
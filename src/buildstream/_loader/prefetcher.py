@@ -0,0 +1,252 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import multiprocessing
+import os
+import queue
+import signal
+from concurrent.futures import BrokenExecutor, Future, ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .. import _yaml
+from .loadcache import LoadCache
+from .loadelement import list_dependency_files
+
+
+# The number of element files which must have missed the load cache before
+# worker processes are started, this avoids paying the cost of starting the
+# workers for warm loads and small projects.
+_PREFETCH_THRESHOLD = 200
+
+# The maximum number of element files parsed by a single worker task, files
+# are parsed in batches to amortize the cost of communicating with the workers.
+_BATCH_SIZE = 64
+
+
+# _init_worker()
+#
+# Initialize a worker process, the workers ignore interruptions
+# and leave them to the main process.
+#
+def _init_worker() -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTSTP, signal.SIG_IGN)
+
+
+# _parse_file()
+#
+# Parse an element file in a worker process.
+#
+# Args:
+#    fullpath (str): The absolute path of the element file
+#    basedir (str): The absolute path of the element directory of the project
+#
+# Returns:
+#    (tuple): The file contents, the serialized node tree and the absolute paths
+#             of the files it depends on in the same project, or None if
+#             the file could not be parsed
+#
+def _parse_file(fullpath: str, basedir: str) -> Optional[Tuple[str, tuple, List[str]]]:
+    try:
+        with open(fullpath, encoding="utf-8") as f:
+            contents = f.read()
+
+        data = _yaml.load_data(contents, file_name=fullpath)
+        depends = [
+            os.path.join(basedir, filename) for junction, filename in list_dependency_files(data) if junction is None
+        ]
+    except Exception:  # pylint: disable=broad-except
+        # Errors are reported by the loader when it loads the file itself
+        return None
+
+    return contents, _yaml.serialize_node(data), depends
+
+
+# _parse_files()
+#
+# Parse a batch of element files in a worker process.
+#
+# Args:
+#    batch (list): A list of (fullpath, basedir) tuples, as taken by _parse_file()
+#
+# Returns:
+#    (list): The results of _parse_file() for each file in the batch
+#
+def _parse_files(batch: List[Tuple[str, str]]) -> List[Optional[Tuple[str, tuple, List[str]]]]:
+    return [_parse_file(fullpath, basedir) for fullpath, basedir in batch]
+
+
+# LoadPrefetcher()
+#
+# Parses element files in worker processes ahead of the loader.
+#
+# Files are submitted with prefetch() as soon as the loader learns of them,
+# and the dependencies found in the parsed files are submitted in turn, so
+# the workers crawl the dependency graph ahead of the loader. The parsed
+# node trees are handed over to the loader through the LoadCache, which
+# deserializes them in the loader's thread in the order in which files are
+# loaded, keeping the provenance of loaded nodes deterministic.
+#
+# Args:
+#    cache (LoadCache): The load cache to populate
+#    max_workers (int): The maximum number of worker processes
+#
+class LoadPrefetcher:
+    def __init__(self, cache: LoadCache, max_workers: int):
+        self._cache: LoadCache = cache
+        self._max_workers: int = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[str, Future] = {}  # The pending futures of submitted files
+        self._batches: Dict[Future, List[Tuple[str, str]]] = {}  # The batches of pending futures
+        self._completed: queue.SimpleQueue = queue.SimpleQueue()  # Completed futures
+        self._seen: Set[str] = set()  # All files which were requested
+        self._deferred: Dict[str, str] = {}  # Requested files waiting to be submitted, with their basedir
+        self._broken: bool = False  # Whether the workers failed
+
+    # prefetch()
+    #
+    # Request that element files be parsed ahead of being loaded.
+    #
+    # Args:
+    #    basedir (str): The absolute path of the element directory of the project
+    #    filenames (iterable): The element-path relative filenames to parse
+    #
+    def prefetch(self, basedir: str, filenames: Iterable[str]) -> None:
+        for filename in filenames:
+            fullpath = os.path.join(basedir, filename)
+            if fullpath not in self._seen:
+                self._seen.add(fullpath)
+                self._deferred[fullpath] = basedir
+
+        self._process()
+
+    # wait()
+    #
+    # Wait for an element file to be parsed if it was prefetched, this
+    # must be called before loading the file.
+    #
+    # Args:
+    #    fullpath (str): The absolute path of the element file
+    #
+    def wait(self, fullpath: str) -> None:
+        self._deferred.pop(fullpath, None)
+
+        future = self._futures.get(fullpath)
+        if future is not None:
+            self._consume(future)
+
+        self._process()
+
+    # shutdown()
+    #
+    # Stop the worker processes and forget about all outstanding requests.
+    #
+    def shutdown(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+        self._futures = {}
+        self._batches = {}
+        self._completed = queue.SimpleQueue()
+        self._seen = set()
+        self._deferred = {}
+
+    # _process()
+    #
+    # Consume the completed results and submit the deferred requests
+    # once the workers are running.
+    #
+    def _process(self) -> None:
+        while True:
+            try:
+                future = self._completed.get_nowait()
+            except queue.Empty:
+                break
+
+            self._consume(future)
+
+        if not self._deferred:
+            return
+
+        if self._executor is None:
+            if self._broken or self._max_workers < 2 or self._cache.misses < _PREFETCH_THRESHOLD:
+                return
+            self._start()
+
+        # Spread the requests over the workers, in batches no larger than _BATCH_SIZE
+        deferred = list(self._deferred.items())
+        self._deferred = {}
+        batch_size = min(_BATCH_SIZE, -(-len(deferred) // self._max_workers))
+
+        for index in range(0, len(deferred), batch_size):
+            batch = deferred[index : index + batch_size]
+            try:
+                future = self._executor.submit(_parse_files, batch)
+            except BrokenExecutor:
+                # Fall back to parsing in the loader if a worker died
+                self._broken = True
+                self.shutdown()
+                return
+
+            self._batches[future] = batch
+            for fullpath, _ in batch:
+                self._futures[fullpath] = future
+            future.add_done_callback(self._completed.put)
+
+    # _consume()
+    #
+    # Hand over the results of a parsed batch to the load cache, and queue
+    # up the dependencies declared in the parsed files.
+    #
+    # Args:
+    #    future (Future): The future of the batch, which is waited for if needed
+    #
+    def _consume(self, future: Future) -> None:
+        batch = self._batches.pop(future, None)
+        if batch is None:
+            # Already consumed
+            return
+
+        for fullpath, _ in batch:
+            del self._futures[fullpath]
+
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        for (_, basedir), result in zip(batch, future.result()):
+            if result is None:
+                continue
+
+            contents, serialized, depends = result
+            self._cache.store(contents, serialized)
+
+            for dep_path in depends:
+                if dep_path not in self._seen:
+                    self._seen.add(dep_path)
+                    self._deferred[dep_path] = basedir
+
+    # _start()
+    #
+    # Start the worker processes.
+    #
+    def _start(self) -> None:
+        try:
+            mp_context = multiprocessing.get_context("forkserver")
+        except ValueError:
+            mp_context = multiprocessing.get_context("spawn")
+
+        self._executor = ProcessPoolExecutor(
+            max_workers=self._max_workers, mp_context=mp_context, initializer=_init_worker
+        )
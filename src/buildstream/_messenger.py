@@ -53,10 +53,13 @@ class _TimeData:
 # in order to fill in some Message parameters automatically.
 #
 class _JobInfo:
-    def __init__(self, action_name: str, element_name: str, element_key: _DisplayKey) -> None:
+    def __init__(
+        self, action_name: str, element_name: str, element_key: _DisplayKey, task: Optional[Task] = None
+    ) -> None:
         self.action_name = action_name
         self.element_name = element_name
         self.element_key = element_key
+        self.task = task
 
 
 # _MessengerLocal
@@ -124,10 +127,25 @@ class Messenger:
     #    action_name: The action name
     #    element_name: The element name
     #    element_key: The element's DisplayKey
+    #    task: The task of the job, to report progress to
     #
-    def setup_new_action_context(self, action_name: str, element_name: str, element_key: _DisplayKey) -> None:
+    def setup_new_action_context(
+        self, action_name: str, element_name: str, element_key: _DisplayKey, task: Optional[Task] = None
+    ) -> None:
         self._locals.silence_scope_depth = 0
-        self._locals.job = _JobInfo(action_name, element_name, element_key)
+        self._locals.job = _JobInfo(action_name, element_name, element_key, task)
+
+    # get_action_task()
+    #
+    # Get the task of the job running in the current thread, such
+    # that long running operations of the job can report their progress.
+    #
+    # Returns:
+    #    The task, or None if no job is running in the current thread
+    #
+    def get_action_task(self) -> Optional[Task]:
+        job = self._locals.job
+        return job.task if job else None
 
     # set_message_handler()
     #
@@ -0,0 +1,184 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import time
+from typing import Callable, List, Optional, Sequence, TypeVar
+
+from ._persistentstore import PersistentStore
+
+
+T = TypeVar("T")
+
+# Version of the health file format, bump this whenever it changes so
+# that existing records are discarded.
+_HEALTH_VERSION = 3
+
+# Records which were not updated for this long are dropped, in seconds
+_RECORD_TTL = 30 * 24 * 60 * 60
+
+# How long a mirror is tried last after failing, in seconds, doubled
+# for every consecutive failure up to the maximum
+_BACKOFF = 60
+_MAX_BACKOFF = 60 * 60
+
+# The weight of a new sample in the average latency of a mirror
+_LATENCY_WEIGHT = 0.3
+
+# How much slower than the fastest candidate a mirror must respond to be
+# tried after the others, such that noise does not reorder mirrors
+_SLOW_FACTOR = 2
+
+
+# MirrorHealth()
+#
+# Tracks the failures and latency of the hosts of source mirrors, such
+# that fetches try mirrors which recently failed or respond much slower
+# than the others last, rather than waiting for them to time out again
+# for every source.
+#
+# The latency is the time to the first byte of responses, reported by
+# the sources which can measure it. The durations of fetches are not
+# taken into account, as they mostly depend on the sizes of the sources
+# rather than on the mirrors.
+#
+# The records are shared by all fetch jobs of the session, and persisted
+# for the next sessions with save().
+#
+# Args:
+#    path (str): The path of the health file
+#
+class MirrorHealth(PersistentStore):
+    def __init__(self, path: str):
+        super().__init__(path, _HEALTH_VERSION)
+
+    # rank()
+    #
+    # Order the candidate mirrors of a fetch, preserving the configured
+    # order of mirrors unless they recently failed or respond much slower.
+    #
+    # Healthy mirrors come first, then mirrors much slower than the
+    # fastest healthy one, the slowest last, then the mirrors which
+    # recently failed, the ones which failed most recently last.
+    #
+    # Args:
+    #    candidates (list): The candidates in the configured order
+    #    get_host (callable): Returns the host of a candidate, or None
+    #
+    # Returns:
+    #    (list): The reordered candidates
+    #
+    def rank(self, candidates: Sequence[T], get_host: Callable[[T], Optional[str]]) -> List[T]:
+        if len(candidates) < 2:
+            return list(candidates)
+
+        now = time.time()
+        with self._lock:
+            records = [self._get_entry(get_host(candidate)) for candidate in candidates]
+
+        def backoff_until(record):
+            failures, last_failure = record[0], record[1]
+            if not failures:
+                return 0
+            return last_failure + min(_BACKOFF * 2 ** (failures - 1), _MAX_BACKOFF)
+
+        failing = [record is not None and backoff_until(record) > now for record in records]
+        latencies = [
+            record[3] for record, failed in zip(records, failing) if record is not None and not failed and record[3]
+        ]
+        fastest = min(latencies, default=None)
+
+        def sort_key(index):
+            record = records[index]
+            if failing[index]:
+                return (2, backoff_until(record))
+            if fastest and record is not None and record[3] and record[3] > fastest * _SLOW_FACTOR:
+                return (1, record[3])
+            return (0, index)
+
+        return [candidates[index] for index in sorted(range(len(candidates)), key=sort_key)]
+
+    # record_success()
+    #
+    # Record that a fetch from a mirror succeeded.
+    #
+    # Args:
+    #    host (str): The host of the mirror
+    #
+    def record_success(self, host: Optional[str]) -> None:
+        if host is None:
+            return
+
+        with self._lock:
+            record = self._get_entry(host)
+            if record and record[0]:
+                self._set_entry(host, [0, 0, time.time(), record[3]])
+
+    # record_failure()
+    #
+    # Record that a fetch from a mirror failed because of a temporary
+    # error, such as a network error.
+    #
+    # Args:
+    #    host (str): The host of the mirror
+    #
+    def record_failure(self, host: Optional[str]) -> None:
+        if host is None:
+            return
+
+        now = time.time()
+        with self._lock:
+            record = self._get_entry(host)
+            if record:
+                self._set_entry(host, [record[0] + 1, now, now, record[3]])
+            else:
+                self._set_entry(host, [1, now, now, None])
+
+    # record_latency()
+    #
+    # Record the time to the first byte of a response of a mirror.
+    #
+    # Args:
+    #    host (str): The host of the mirror
+    #    latency (float): The time to the first byte, in seconds
+    #
+    def record_latency(self, host: Optional[str], latency: float) -> None:
+        if host is None:
+            return
+
+        with self._lock:
+            record = self._get_entry(host)
+            if record:
+                if record[3] is not None:
+                    latency = (1 - _LATENCY_WEIGHT) * record[3] + _LATENCY_WEIGHT * latency
+                self._set_entry(host, [record[0], record[1], time.time(), latency])
+            else:
+                self._set_entry(host, [0, 0, time.time(), latency])
+
+    # _is_newer()
+    #
+    # The most recently updated record wins.
+    #
+    # The records are lists of the number of consecutive failures, the
+    # time of the last failure, the time of the update and the average
+    # latency, or None if it is unknown.
+    #
+    def _is_newer(self, entry: List, existing: List) -> bool:
+        return existing[2] < entry[2]
+
+    # _is_expired()
+    #
+    # Records which were not updated for a long time are dropped.
+    #
+    def _is_expired(self, entry: List) -> bool:
+        return time.time() - entry[2] >= _RECORD_TTL
@@ -0,0 +1,156 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import ujson
+
+from . import utils
+
+
+# PersistentStore()
+#
+# Base class for the stores of entries which are kept across sessions to
+# speed up later sessions, such as statistics and caches.
+#
+# The entries are loaded from the store file on first use, and only the
+# entries updated during the session are written back with save(), merged
+# with the entries written concurrently by other sessions.
+#
+# Stores are optimizations only: a missing, unreadable or incompatible store
+# file is treated as empty, and failing to write it is not an error.
+#
+# Subclasses hold the lock while accessing the entries, and define how
+# entries are merged and when they expire.
+#
+# Args:
+#    path (str): The path of the store file
+#    version (int): The version of the format of the entries, bump this
+#                   whenever it changes so that existing stores are discarded
+#
+class PersistentStore:
+    def __init__(self, path: str, version: int):
+        self._path: str = path
+        self._version: int = version
+        self._entries: Optional[Dict[str, Any]] = None  # The loaded entries
+        self._updated: Dict[str, Any] = {}  # The entries updated during this session
+        self._lock: threading.Lock = threading.Lock()
+
+    # save()
+    #
+    # Write the entries updated during this session to disk, merging them
+    # with any entries updated concurrently by other sessions and dropping
+    # the expired entries.
+    #
+    def save(self) -> None:
+        with self._lock:
+            if not self._updated:
+                return
+
+            entries = self._load_entries()
+            for key, entry in self._updated.items():
+                existing = entries.get(key)
+                if existing is None or self._is_newer(entry, existing):
+                    entries[key] = entry
+
+            entries = {key: entry for key, entry in entries.items() if not self._is_expired(entry)}
+
+            try:
+                os.makedirs(os.path.dirname(self._path), exist_ok=True)
+                with utils.save_file_atomic(self._path, "w", encoding="utf-8") as f:
+                    ujson.dump({"version": self._version, "entries": entries}, f)
+            except OSError:
+                pass
+
+            self._updated = {}
+
+    # _get_entry()
+    #
+    # Get an entry, the lock must be held.
+    #
+    # Args:
+    #    key (str): The key of the entry
+    #
+    # Returns:
+    #    The entry, or None if there is no such entry
+    #
+    def _get_entry(self, key: str) -> Any:
+        self._ensure_loaded()
+        return self._entries.get(key)
+
+    # _set_entry()
+    #
+    # Add or update an entry, the lock must be held.
+    #
+    # Args:
+    #    key (str): The key of the entry
+    #    entry: The entry, which must be serializable
+    #
+    def _set_entry(self, key: str, entry: Any) -> None:
+        self._ensure_loaded()
+        self._entries[key] = entry
+        self._updated[key] = entry
+
+    # _is_newer()
+    #
+    # Whether an entry updated during this session replaces an entry
+    # saved by another session when saving.
+    #
+    # By default entries of this session always win.
+    #
+    def _is_newer(self, entry: Any, existing: Any) -> bool:
+        return True
+
+    # _is_expired()
+    #
+    # Whether an entry is dropped when saving.
+    #
+    # By default entries never expire.
+    #
+    def _is_expired(self, entry: Any) -> bool:
+        return False
+
+    # _ensure_loaded()
+    #
+    # Load the entries from disk if they were not loaded yet.
+    #
+    def _ensure_loaded(self) -> None:
+        if self._entries is None:
+            self._entries = self._load_entries()
+
+    # _load_entries()
+    #
+    # Load the entries from the store file.
+    #
+    # Returns:
+    #    (dict): The entries, which are empty if the store file is missing,
+    #            unreadable or was written by an incompatible version
+    #
+    def _load_entries(self) -> Dict[str, Any]:
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                data = ujson.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        if not isinstance(data, dict) or data.get("version") != self._version:
+            return {}
+
+        entries = data.get("entries")
+        if not isinstance(entries, dict):
+            return {}
+
+        return entries
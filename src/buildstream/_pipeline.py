@@ -20,7 +20,7 @@ import itertools
 
 from collections import OrderedDict
 from operator import itemgetter
-from typing import List, Iterator
+from typing import Dict, List, Iterator
 from pyroaring import BitMap  # pylint: disable=no-name-in-module
 
 from .element import Element
@@ -300,6 +300,61 @@ def assert_sources_cached(context: Context, elements: List[Element]):
         raise PipelineError("Uncached sources", detail=detail, reason="uncached-sources")
 
 
+# prioritize()
+#
+# Assigns scheduling priorities to a list of elements, such that elements
+# on the longest remaining critical path are scheduled first.
+#
+# The critical path of an element is the sum of the estimated build
+# durations along the longest chain of elements which depend on it. Build
+# durations are estimated from the builds of previous sessions, elements
+# which are already cached take no time to build. Elements with equal
+# critical paths are prioritized by the number of elements which depend
+# on them, directly or indirectly, elements for which both are equal share
+# their priority and are scheduled by depth.
+#
+# Args:
+#    context: The invocation context
+#    elements: The elements to prioritize, dependencies must come before
+#              the elements which depend on them, as returned by the planner
+#
+def prioritize(context: Context, elements: List[Element]) -> None:
+    durations = {}
+    for element in elements:
+        duration = context.buildstats.get_duration(element)
+        if duration is not None:
+            durations[element] = duration
+
+    # Assume average build durations for elements which were never built
+    default_duration = sum(durations.values()) / len(durations) if durations else 1.0
+
+    critical_paths: Dict[Element, float] = {}
+    cone_sizes: Dict[Element, int] = {}
+    remaining_paths: Dict[Element, float] = {}
+    remaining_cones: Dict[Element, BitMap] = {}
+
+    # Visit every element after all of the elements which depend on it
+    for element in reversed(elements):
+        if element._can_query_cache() and element._cached_success():
+            duration = 0.0
+        else:
+            duration = durations.get(element, default_duration)
+
+        critical_paths[element] = critical_path = duration + remaining_paths.pop(element, 0.0)
+        cone = remaining_cones.pop(element, BitMap())
+        cone.add(element._unique_id)
+        cone_sizes[element] = len(cone)
+
+        for dep in element._dependencies(_Scope.ALL, recurse=False):
+            remaining_paths[dep] = max(remaining_paths.get(dep, 0.0), critical_path)
+            remaining_cones.setdefault(dep, BitMap()).update(cone)
+
+    ranks = sorted({(-critical_paths[element], -cone_sizes[element]) for element in elements})
+    priorities = {rank: priority for priority, rank in enumerate(ranks)}
+    for element in elements:
+        element._set_priority(priorities[(-critical_paths[element], -cone_sizes[element])])
+
+
 # _Planner()
 #
 # An internal object used for constructing build plan
@@ -0,0 +1,402 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from . import utils
+from ._exceptions import AssetCacheError
+
+
+# Version of the database schema, bump this whenever it changes
+_SCHEMA_VERSION = 1
+
+# Seconds to wait for other processes to release the database
+_BUSY_TIMEOUT = 60
+
+
+# RefStore()
+#
+# Stores the serialized protos of the artifact and source caches by ref.
+#
+# This is the interface implemented by the ref stores, see open_ref_store().
+#
+class RefStore:
+
+    # contains()
+    #
+    # Args:
+    #    ref (str): The ref
+    #
+    # Returns:
+    #    (bool): Whether the ref exists
+    #
+    def contains(self, ref: str) -> bool:
+        raise NotImplementedError()
+
+    # load()
+    #
+    # Load the data of a ref.
+    #
+    # Args:
+    #    ref (str): The ref
+    #    touch (bool): Whether to mark the ref as recently used
+    #
+    # Returns:
+    #    (bytes): The data of the ref, or None if the ref does not exist
+    #
+    def load(self, ref: str, *, touch: bool = False) -> Optional[bytes]:
+        raise NotImplementedError()
+
+    # store()
+    #
+    # Store the same data for one or more refs, as a single update.
+    #
+    # Args:
+    #    refs (list): The refs
+    #    data (bytes): The data to store
+    #
+    def store(self, refs: List[str], data: bytes) -> None:
+        raise NotImplementedError()
+
+    # link()
+    #
+    # Make a new ref refer to the data of an existing ref.
+    #
+    # Args:
+    #    oldref (str): The existing ref
+    #    newref (str): The new ref
+    #
+    # Raises:
+    #    (FileNotFoundError): If the existing ref does not exist
+    #
+    def link(self, oldref: str, newref: str) -> None:
+        raise NotImplementedError()
+
+    # remove()
+    #
+    # Remove a ref.
+    #
+    # Args:
+    #    ref (str): The ref to remove
+    #
+    # Raises:
+    #    (FileNotFoundError): If the ref does not exist
+    #
+    def remove(self, ref: str) -> None:
+        raise NotImplementedError()
+
+    # list_refs_mtimes()
+    #
+    # List the refs along with the time they were last used.
+    #
+    # Args:
+    #    glob_expr (str|None): Optional glob expression to match against refs
+    #
+    # Returns:
+    #    (iter (mtime, ref)): iterator of tuples of mtime and refs
+    #
+    def list_refs_mtimes(self, glob_expr: Optional[str] = None) -> Iterator[Tuple[float, str]]:
+        raise NotImplementedError()
+
+    # close()
+    #
+    # Release the resources used by the store.
+    #
+    def close(self) -> None:
+        pass
+
+
+# FileRefStore()
+#
+# A ref store keeping one file per ref in a directory, the modification
+# time of the files record when the refs were last used.
+#
+# Args:
+#    basedir (str): The directory of the refs
+#
+class FileRefStore(RefStore):
+    def __init__(self, basedir: str):
+        self._basedir: str = basedir
+        os.makedirs(self._basedir, exist_ok=True)
+
+    def contains(self, ref: str) -> bool:
+        return os.path.exists(os.path.join(self._basedir, ref))
+
+    def load(self, ref: str, *, touch: bool = False) -> Optional[bytes]:
+        path = os.path.join(self._basedir, ref)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+
+        if touch:
+            os.utime(path)
+
+        return data
+
+    def store(self, refs: List[str], data: bytes) -> None:
+        for ref in refs:
+            path = os.path.join(self._basedir, ref)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with utils.save_file_atomic(path, mode="wb") as f:
+                f.write(data)
+
+    def link(self, oldref: str, newref: str) -> None:
+        oldpath = os.path.join(self._basedir, oldref)
+        if not os.path.exists(oldpath):
+            raise FileNotFoundError("No such ref: '{}'".format(oldref))
+
+        newpath = os.path.join(self._basedir, newref)
+        os.makedirs(os.path.dirname(newpath), exist_ok=True)
+        utils.safe_link(oldpath, newpath)
+
+    def remove(self, ref: str) -> None:
+        utils._remove_path_with_parents(self._basedir, ref)
+
+    def list_refs_mtimes(self, glob_expr: Optional[str] = None) -> Iterator[Tuple[float, str]]:
+        path = self._basedir
+        if glob_expr is not None:
+            globdir = os.path.dirname(glob_expr)
+            if not any(c in "*?[" for c in globdir):
+                # path prefix contains no globbing characters so
+                # append the glob to optimise the os.walk()
+                path = os.path.join(self._basedir, globdir)
+
+        regexer = None
+        if glob_expr:
+            expression = utils._glob2re(glob_expr)
+            regexer = re.compile(expression)
+
+        for root, _, files in os.walk(path):
+            for filename in files:
+                ref_path = os.path.join(root, filename)
+                relative_path = os.path.relpath(ref_path, self._basedir)  # Relative to refs head
+                if regexer is None or regexer.match(relative_path):
+                    # Obtain the mtime (the time a file was last modified)
+                    yield (os.path.getmtime(ref_path), relative_path)
+
+
+# DatabaseRefStore()
+#
+# A ref store keeping all refs in a single SQLite database, indexed by
+# ref and by the time they were last used.
+#
+# Listing refs matching a glob only visits the refs sharing the literal
+# prefix of the glob, and updating several refs is a single transaction.
+#
+# Any refs found in the directory of a FileRefStore are moved into the
+# database when it is first used.
+#
+# Args:
+#    path (str): The path of the database
+#    basedir (str): The directory of the refs of the FileRefStore to migrate
+#
+class DatabaseRefStore(RefStore):
+    def __init__(self, path: str, basedir: str):
+        self._path: str = path
+        self._basedir: str = basedir
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    def contains(self, ref: str) -> bool:
+        with self._transaction() as db:
+            return db.execute("SELECT 1 FROM refs WHERE ref = ?", (ref,)).fetchone() is not None
+
+    def load(self, ref: str, *, touch: bool = False) -> Optional[bytes]:
+        with self._transaction() as db:
+            row = db.execute("SELECT data FROM refs WHERE ref = ?", (ref,)).fetchone()
+            if row is None:
+                return None
+
+            if touch:
+                db.execute("UPDATE refs SET mtime = ? WHERE ref = ?", (time.time(), ref))
+
+            return row[0]
+
+    def store(self, refs: List[str], data: bytes) -> None:
+        mtime = time.time()
+        with self._transaction() as db:
+            db.executemany("INSERT OR REPLACE INTO refs VALUES (?, ?, ?)", [(ref, data, mtime) for ref in refs])
+
+    def link(self, oldref: str, newref: str) -> None:
+        with self._transaction() as db:
+            cursor = db.execute(
+                "INSERT OR REPLACE INTO refs SELECT ?, data, mtime FROM refs WHERE ref = ?",
+                (newref, oldref),
+            )
+            if cursor.rowcount == 0:
+                raise FileNotFoundError("No such ref: '{}'".format(oldref))
+
+    def remove(self, ref: str) -> None:
+        with self._transaction() as db:
+            if db.execute("DELETE FROM refs WHERE ref = ?", (ref,)).rowcount == 0:
+                raise FileNotFoundError("No such ref: '{}'".format(ref))
+
+    def list_refs_mtimes(self, glob_expr: Optional[str] = None) -> Iterator[Tuple[float, str]]:
+        query = "SELECT mtime, ref FROM refs"
+        parameters: Tuple[str, ...] = ()
+
+        regexer = None
+        if glob_expr:
+            regexer = re.compile(utils._glob2re(glob_expr))
+
+            # Only visit the refs sharing the literal prefix of the glob
+            prefix = re.split(r"[*?\[]", glob_expr, maxsplit=1)[0]
+            if prefix:
+                query += " WHERE ref >= ? AND ref < ?"
+                parameters = (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+        with self._transaction() as db:
+            rows = db.execute(query + " ORDER BY mtime", parameters).fetchall()
+
+        for mtime, ref in rows:
+            if regexer is None or regexer.match(ref):
+                yield (mtime, ref)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection:
+                self._connection.close()
+                self._connection = None
+
+    # export()
+    #
+    # Move all refs of the database back to the directory of a
+    # FileRefStore, and remove the database.
+    #
+    def export(self) -> None:
+        with self._transaction() as db:
+            rows = db.execute("SELECT ref, data, mtime FROM refs").fetchall()
+
+        for ref, data, mtime in rows:
+            path = os.path.join(self._basedir, ref)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with utils.save_file_atomic(path, mode="wb") as f:
+                f.write(data)
+            os.utime(path, (mtime, mtime))
+
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.unlink(self._path + suffix)
+            except FileNotFoundError:
+                pass
+
+    # _transaction()
+    #
+    # Context manager running a transaction on the database, which is
+    # opened on first use. Database errors are reported as AssetCacheError.
+    #
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            try:
+                connection = self._connect()
+                with connection:
+                    yield connection
+            except sqlite3.Error as e:
+                raise AssetCacheError("Error accessing ref database '{}': {}".format(self._path, e)) from e
+
+    # _connect()
+    #
+    # Open the database, creating it if necessary, and move the refs
+    # of the FileRefStore into it.
+    #
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            connection = sqlite3.connect(self._path, timeout=_BUSY_TIMEOUT, check_same_thread=False)
+            try:
+                connection.execute("PRAGMA journal_mode = WAL")
+                connection.execute("PRAGMA synchronous = NORMAL")
+                with connection:
+                    version = connection.execute("PRAGMA user_version").fetchone()[0]
+                    if version not in (0, _SCHEMA_VERSION):
+                        raise AssetCacheError(
+                            "Ref database '{}' was created by an incompatible version of BuildStream".format(
+                                self._path
+                            )
+                        )
+                    connection.execute(
+                        "CREATE TABLE IF NOT EXISTS refs (ref TEXT PRIMARY KEY, data BLOB NOT NULL, mtime REAL NOT NULL)"
+                    )
+                    connection.execute("CREATE INDEX IF NOT EXISTS refs_mtime ON refs (mtime)")
+                    connection.execute("PRAGMA user_version = {}".format(_SCHEMA_VERSION))
+                self._migrate(connection)
+            except BaseException:
+                connection.close()
+                raise
+
+            self._connection = connection
+
+        return self._connection
+
+    # _migrate()
+    #
+    # Move the refs found in the directory of the FileRefStore into the database.
+    #
+    def _migrate(self, connection: sqlite3.Connection) -> None:
+        migrated = []
+        with connection:
+            for mtime, ref in FileRefStore(self._basedir).list_refs_mtimes():
+                with open(os.path.join(self._basedir, ref), "rb") as f:
+                    data = f.read()
+
+                # Keep the most recently used version of refs which exist in both
+                connection.execute(
+                    "INSERT INTO refs VALUES (?, ?, ?) "
+                    "ON CONFLICT (ref) DO UPDATE SET data = excluded.data, mtime = excluded.mtime "
+                    "WHERE excluded.mtime > refs.mtime",
+                    (ref, data, mtime),
+                )
+                migrated.append(ref)
+
+        for ref in migrated:
+            try:
+                utils._remove_path_with_parents(self._basedir, ref)
+            except FileNotFoundError:
+                pass
+
+
+# open_ref_store()
+#
+# Open the ref store of a cache.
+#
+# Refs are moved between the two kinds of stores whenever the
+# configured kind of store changes.
+#
+# Args:
+#    basedir (str): The directory of the refs when stored in files
+#    indexed (bool): Whether to store the refs in a database
+#
+# Returns:
+#    (RefStore): The ref store
+#
+def open_ref_store(basedir: str, *, indexed: bool) -> RefStore:
+    path = basedir.rstrip(os.sep) + ".db"
+
+    if indexed:
+        return DatabaseRefStore(path, basedir)
+
+    if os.path.exists(path):
+        DatabaseRefStore(path, basedir).export()
+
+    return FileRefStore(basedir)
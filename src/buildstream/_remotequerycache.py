@@ -0,0 +1,116 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import time
+from typing import List, Optional
+
+from ._persistentstore import PersistentStore
+
+
+# Version of the cache format, bump this whenever it changes so
+# that existing caches are discarded.
+_CACHE_VERSION = 1
+
+
+# RemoteQueryCache()
+#
+# A persistent cache of whether remotes have artifacts, such that repeatedly
+# showing the remote cache status of elements does not have to query the
+# remotes every time.
+#
+# Answers are only reused for `ttl` seconds, as artifacts may be pushed to
+# or expire from the remotes at any time. The answers about artifacts which
+# we push or pull are updated accordingly.
+#
+# Args:
+#    path (str): The path of the cache file
+#    ttl (int): The number of seconds during which answers are reused,
+#               nothing is cached if this is 0
+#
+class RemoteQueryCache(PersistentStore):
+    def __init__(self, path: str, ttl: int):
+        super().__init__(path, _CACHE_VERSION)
+        self._ttl: int = ttl
+
+    # lookup()
+    #
+    # Look up whether a remote was last known to have an artifact.
+    #
+    # Args:
+    #    remote (BaseRemote): The remote
+    #    artifact_name (str): The name of the artifact
+    #
+    # Returns:
+    #    (bool): Whether the remote has the artifact, or None if this
+    #            is unknown or the answer expired
+    #
+    def lookup(self, remote, artifact_name: str) -> Optional[bool]:
+        if not self._ttl:
+            return None
+
+        with self._lock:
+            entry = self._get_entry(self._key(remote, artifact_name))
+
+        if entry is None or not self._is_fresh(entry):
+            return None
+
+        return entry[0]
+
+    # record()
+    #
+    # Record whether a remote has an artifact, the cache is written
+    # to disk with save().
+    #
+    # Args:
+    #    remote (BaseRemote): The remote
+    #    artifact_name (str): The name of the artifact
+    #    cached (bool): Whether the remote has the artifact
+    #
+    def record(self, remote, artifact_name: str, cached: bool) -> None:
+        if not self._ttl:
+            return
+
+        key = self._key(remote, artifact_name)
+        entry = [cached, time.time()]
+        with self._lock:
+            self._set_entry(key, entry)
+
+    # _key()
+    #
+    # Compute the key of an answer in the cache.
+    #
+    def _key(self, remote, artifact_name: str) -> str:
+        return "{}\n{}\n{}".format(remote.spec.url, remote.spec.instance_name or "", artifact_name)
+
+    # _is_newer()
+    #
+    # The most recent answer wins.
+    #
+    def _is_newer(self, entry: List, existing: List) -> bool:
+        return existing[1] < entry[1]
+
+    # _is_expired()
+    #
+    # Expired answers are dropped.
+    #
+    def _is_expired(self, entry: List) -> bool:
+        return not self._is_fresh(entry)
+
+    # _is_fresh()
+    #
+    # Check whether an answer is recent enough to be reused.
+    #
+    def _is_fresh(self, entry: List) -> bool:
+        age = time.time() - entry[1]
+        return 0 <= age < self._ttl
@@ -22,6 +22,7 @@ from ._exceptions import LoadError, RemoteError
 from .exceptions import LoadErrorReason
 from .types import FastEnum
 from .node import MappingNode
+from ._cas import cascompression
 
 
 # RemoteType():
@@ -40,6 +41,16 @@ class RemoteType(FastEnum):
         return ""
 
 
+# RemoteCompression():
+#
+# Defines the compression of blobs transferred to and from a storage remote.
+#
+class RemoteCompression(FastEnum):
+    NONE = "none"
+    DEFLATE = "deflate"
+    ZSTD = "zstd"
+
+
 # RemoteSpecPurpose():
 #
 # What a RemoteSpec is going to be used for.
@@ -74,6 +85,7 @@ class RemoteSpec:
         access_token: str = None,
         access_token_reload_interval: Optional[int] = None,
         instance_name: Optional[str] = None,
+        compression: str = RemoteCompression.NONE,
         connection_config: Optional[MappingNode] = None,
         spec_node: Optional[MappingNode] = None,
     ) -> None:
@@ -94,6 +106,9 @@ class RemoteSpec:
         # The name of the grpc service to talk to at this remote url
         self.instance_name: Optional[str] = instance_name
 
+        # The compression to use for blob transfers, if supported by the remote
+        self.compression: str = compression
+
         # The credentials
         self.server_cert_file: Optional[str] = server_cert
         self.client_key_file: Optional[str] = client_key
@@ -134,6 +149,7 @@ class RemoteSpec:
                 self.push,
                 self.url,
                 self.instance_name,
+                self.compression,
                 self.server_cert_file,
                 self.client_key_file,
                 self.client_cert_file,
@@ -261,12 +277,16 @@ class RemoteSpec:
         access_token_reload_interval: Optional[int] = None
         push: bool = False
         remote_type: str = RemoteType.ENDPOINT
+        compression: str = RemoteCompression.NONE
 
         valid_keys: List[str] = ["url", "instance-name", "auth", "connection-config"]
         if not remote_execution:
             remote_type = cast(str, spec_node.get_enum("type", RemoteType, default=RemoteType.ALL))
             push = spec_node.get_bool("push", default=False)
-            valid_keys += ["push", "type"]
+            compression = cast(
+                str, spec_node.get_enum("compression", RemoteCompression, default=RemoteCompression.NONE)
+            )
+            valid_keys += ["push", "type", "compression"]
 
         spec_node.validate_keys(valid_keys)
 
@@ -289,6 +309,13 @@ class RemoteSpec:
 
         connection_config = spec_node.get_mapping("connection-config", None)
 
+        if compression == RemoteCompression.ZSTD and not cascompression.zstandard:
+            provenance = spec_node.get_node("compression").get_provenance()
+            raise LoadError(
+                "{}: zstd compression requires the 'zstandard' Python module".format(provenance),
+                LoadErrorReason.INVALID_DATA,
+            )
+
         return cls(
             remote_type,
             url,
@@ -299,6 +326,7 @@ class RemoteSpec:
             access_token=access_token,
             access_token_reload_interval=access_token_reload_interval,
             instance_name=instance_name,
+            compression=compression,
             connection_config=connection_config,
             spec_node=spec_node,
         )
@@ -325,6 +353,7 @@ class RemoteSpec:
         url: Optional[str] = None
         instance_name: Optional[str] = None
         remote_type: str = RemoteType.ALL
+        compression: str = RemoteCompression.NONE
         push: bool = True
         server_cert: Optional[str] = None
         client_key: Optional[str] = None
@@ -360,6 +389,17 @@ class RemoteSpec:
                                 ", ".join([str(_type) for _type in allowed_types])
                             )
                         )
+                elif key == "compression":
+                    try:
+                        compression = cast(str, RemoteCompression(val))
+                    except ValueError as e:
+                        raise RemoteError(
+                            "Value for remote 'compression' must be one of: {}".format(
+                                ", ".join(RemoteCompression.values())
+                            )
+                        ) from e
+                    if compression == RemoteCompression.ZSTD and not cascompression.zstandard:
+                        raise RemoteError("zstd compression requires the 'zstandard' Python module")
                 elif key == "push":
 
                     # Provide a sensible error for `bst artifact push --remote url=http://pony.com,push=False ...`
@@ -398,6 +438,7 @@ class RemoteSpec:
             client_cert=client_cert,
             access_token=access_token,
             instance_name=instance_name,
+            compression=compression,
         )
 
     # _resolve_path()
@@ -310,7 +310,10 @@ class Job:
         # Set the global message handler in this child
         # process to forward messages to the parent process
         self._messenger.setup_new_action_context(
-            self.action_name, self._message_element_name, self._message_element_key
+            self.action_name,
+            self._message_element_name,
+            self._message_element_key,
+            self._scheduler._state.tasks.get(self.id),
         )
 
         with ExitStack() as stack:
@@ -0,0 +1,135 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import re
+import shutil
+import tempfile
+from typing import Optional
+
+# The path at which the jobserver is made available in the sandboxes
+JOBSERVER_SANDBOX_PATH = "/run/buildstream-jobserver"
+
+# Matches the options of MAKEFLAGS which request parallel jobs
+_JOBS_OPTION = re.compile(r"^(?:-j|--jobs)(?:=?(\d+))?$")
+
+# The character written to the jobserver for each token
+_TOKEN = b"+"
+
+
+# JobServer()
+#
+# A GNU make compatible jobserver shared by all the builds of a session.
+#
+# The jobserver is a named pipe holding one token per job which may run in
+# addition to the first job of each build, following the protocol of GNU make
+# 4.4 and later. Builds which request parallel jobs from make through the
+# MAKEFLAGS environment variable are handed the jobserver, so that all builds
+# running concurrently draw their parallel jobs from a single pool rather than
+# each of them running as many jobs as the host has CPUs.
+#
+# Args:
+#    directory (str): The directory in which to create the named pipe
+#    slots (int): The total number of jobs which may run at once
+#    builders (int): The maximum number of builds running at once
+#
+class JobServer:
+    def __init__(self, directory: str, slots: int, builders: int):
+        # Each build implicitly owns the slot of its first job
+        self._tokens: int = max(slots - builders, 0)
+
+        os.makedirs(directory, exist_ok=True)
+        self._directory: str = tempfile.mkdtemp(prefix="jobserver-", dir=directory)
+        self.path: str = os.path.join(self._directory, "fifo")
+
+        # The named pipe must be usable by whichever user the builds run as
+        os.mkfifo(self.path, 0o666)
+        os.chmod(self.path, 0o666)
+
+        # Keep the pipe open for both reading and writing, so that builds never
+        # block opening it nor see it closed while the session is running.
+        self._fd: Optional[int] = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+
+        self.reset()
+
+    # reset()
+    #
+    # Refill the jobserver with all of its tokens.
+    #
+    # Builds which are killed while running parallel jobs never give back
+    # the tokens they hold, this must only be called while no build is running
+    # to recover any such lost tokens.
+    #
+    def reset(self) -> None:
+        while True:
+            try:
+                if not os.read(self._fd, 4096):
+                    break
+            except BlockingIOError:
+                break
+
+        if self._tokens:
+            os.write(self._fd, _TOKEN * self._tokens)
+
+    # close()
+    #
+    # Close the jobserver and remove its named pipe.
+    #
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+    # get_makeflags()
+    #
+    # Get the value of MAKEFLAGS to run a build with the jobserver.
+    #
+    # Only builds which request parallel jobs in MAKEFLAGS use the jobserver,
+    # builds which do not set MAKEFLAGS or explicitly request a single job
+    # are left alone.
+    #
+    # Args:
+    #    makeflags (str): The MAKEFLAGS requested by the build, if any
+    #
+    # Returns:
+    #    (str): The MAKEFLAGS using the jobserver, or None if the build does not
+    #           request parallel jobs
+    #
+    @staticmethod
+    def get_makeflags(makeflags: Optional[str]) -> Optional[str]:
+        if not makeflags:
+            return None
+
+        parallel = False
+        options = makeflags.split()
+        for index, option in enumerate(options):
+            match = _JOBS_OPTION.match(option)
+            if match:
+                jobs = match.group(1)
+                if jobs is None and index + 1 < len(options) and options[index + 1].isdigit():
+                    # The number of jobs is given as a separate argument,
+                    # without any the number of jobs is unlimited
+                    jobs = options[index + 1]
+
+                # The last option wins, like it does for make
+                parallel = jobs is None or int(jobs) > 1
+
+        if not parallel:
+            return None
+
+        # Make ignores the number of jobs found in MAKEFLAGS when it is given
+        # a jobserver, and takes its jobs from the jobserver instead.
+        return "{} --jobserver-auth=fifo:{}".format(makeflags, JOBSERVER_SANDBOX_PATH)
@@ -0,0 +1,172 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+import os
+import time
+from typing import Optional
+
+import psutil
+
+from .resources import ResourceType
+
+
+# Minimum number of seconds between two adjustments of the number of builders,
+# this leaves time for the effect of the previous adjustment to show in the
+# measured host load.
+_ADJUST_INTERVAL = 5
+
+# Thresholds above which the host is considered overloaded
+_CPU_PRESSURE_HIGH = 70.0  # Percentage of time tasks waited for a CPU
+_MEMORY_PRESSURE_HIGH = 10.0  # Percentage of time tasks waited for memory
+_MEMORY_AVAILABLE_LOW = 0.1  # Fraction of memory available
+_LOAD_HIGH = 1.5  # Load average per CPU, when pressure information is not available
+
+# Thresholds below which the host is considered to have spare capacity
+_CPU_PRESSURE_LOW = 25.0
+_MEMORY_PRESSURE_LOW = 1.0
+_MEMORY_AVAILABLE_HIGH = 0.25
+_LOAD_LOW = 0.8
+
+# The directory in which Linux exposes pressure stall information
+_PRESSURE_DIR = "/proc/pressure"
+
+
+# _read_pressure()
+#
+# Read the pressure stall information of a resource, as exposed by Linux
+# in /proc/pressure.
+#
+# Args:
+#    resource (str): The resource, "cpu", "memory" or "io"
+#
+# Returns:
+#    (float): The percentage of time in the last 10 seconds during which some
+#             tasks were stalled on the resource, or None if not available
+#
+def _read_pressure(resource: str) -> Optional[float]:
+    try:
+        with open(os.path.join(_PRESSURE_DIR, resource), "r", encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if fields and fields[0] == "some":
+                    values = dict(field.split("=", 1) for field in fields[1:])
+                    return float(values["avg10"])
+    except (OSError, ValueError, KeyError):
+        pass
+
+    return None
+
+
+# LoadMonitor()
+#
+# Adapts the number of simultaneous build tasks to the load of the host.
+#
+# Only build jobs are limited, other jobs using processes such as cache
+# queries are not.
+#
+# The monitor samples the pressure stall information of the host when it is
+# available, falling back to the load average otherwise, along with the amount
+# of available memory. The number of builders is reduced while the host is
+# overloaded, and increased while all builders are busy and the host has
+# spare capacity.
+#
+# Args:
+#    min_builders (int): The minimum number of builders
+#    max_builders (int): The maximum number of builders
+#
+class LoadMonitor:
+    def __init__(self, min_builders: int, max_builders: int):
+        self._min_builders: int = min_builders
+        self._max_builders: int = max_builders
+        self._builders: int = min_builders
+        self._cpu_count: int = os.cpu_count() or 1
+        self._last_adjustment: Optional[float] = None
+
+    # update()
+    #
+    # Sample the host load and adjust the number of builders of
+    # the resources if necessary.
+    #
+    # Args:
+    #    resources (Resources): The scheduler resources
+    #
+    # Returns:
+    #    (bool): Whether the number of builders was increased
+    #
+    def update(self, resources) -> bool:
+        now = time.monotonic()
+        if self._last_adjustment is None:
+            # Start with the minimum number of builders
+            resources.set_limit(ResourceType.BUILD, self._builders)
+            self._last_adjustment = now
+            return False
+
+        if now - self._last_adjustment < _ADJUST_INTERVAL:
+            return False
+
+        builders = self._builders
+        if self._is_overloaded():
+            builders = max(self._min_builders, builders - 1)
+        elif resources.get_used(ResourceType.BUILD) >= builders and self._has_spare_capacity():
+            builders = min(self._max_builders, builders + 1)
+
+        if builders == self._builders:
+            return False
+
+        grown = builders > self._builders
+        self._builders = builders
+        self._last_adjustment = now
+        resources.set_limit(ResourceType.BUILD, builders)
+
+        return grown
+
+    # _is_overloaded()
+    #
+    # Returns:
+    #    (bool): Whether the host is currently overloaded
+    #
+    def _is_overloaded(self) -> bool:
+        memory = psutil.virtual_memory()
+        if memory.available < memory.total * _MEMORY_AVAILABLE_LOW:
+            return True
+
+        memory_pressure = _read_pressure("memory")
+        if memory_pressure is not None and memory_pressure > _MEMORY_PRESSURE_HIGH:
+            return True
+
+        cpu_pressure = _read_pressure("cpu")
+        if cpu_pressure is not None:
+            return cpu_pressure > _CPU_PRESSURE_HIGH
+
+        return os.getloadavg()[0] / self._cpu_count > _LOAD_HIGH
+
+    # _has_spare_capacity()
+    #
+    # Returns:
+    #    (bool): Whether the host can currently run more builds
+    #
+    def _has_spare_capacity(self) -> bool:
+        memory = psutil.virtual_memory()
+        if memory.available < memory.total * _MEMORY_AVAILABLE_HIGH:
+            return False
+
+        memory_pressure = _read_pressure("memory")
+        if memory_pressure is not None and memory_pressure > _MEMORY_PRESSURE_LOW:
+            return False
+
+        cpu_pressure = _read_pressure("cpu")
+        if cpu_pressure is not None:
+            return cpu_pressure < _CPU_PRESSURE_LOW
+
+        return os.getloadavg()[0] / self._cpu_count < _LOAD_LOW
@@ -15,6 +15,8 @@
 #        Tristan Van Berkom <tristan.vanberkom@codethink.co.uk>
 #        Jürg Billeter <juerg.billeter@codethink.co.uk>
 
+import time
+
 from . import Queue, QueueStatus
 from ..resources import ResourceType
 from ..jobs import JobStatus
@@ -26,7 +28,7 @@ class BuildQueue(Queue):
 
     action_name = "Build"
     complete_name = "Built"
-    resources = [ResourceType.PROCESS, ResourceType.CACHE]
+    resources = [ResourceType.PROCESS, ResourceType.CACHE, ResourceType.BUILD]
 
     def get_process_func(self):
         return BuildQueue._assemble_element
@@ -52,4 +54,6 @@ class BuildQueue(Queue):
 
     @staticmethod
     def _assemble_element(element):
+        start_time = time.monotonic()
         element._assemble()
+        element._get_context().buildstats.record(element, time.monotonic() - start_time)
@@ -15,21 +15,53 @@
 #        Tristan Van Berkom <tristan.vanberkom@codethink.co.uk>
 #        Jürg Billeter <juerg.billeter@codethink.co.uk>
 
+# System imports
+import heapq
+
 # Local imports
 from . import Queue, QueueStatus
 from ..resources import ResourceType
 from ..jobs import JobStatus
-from ..._exceptions import SkipJob
+from ..jobs.job import Job
+from ..._exceptions import BstError, SkipJob
+from ..._message import MessageType
+
+
+# The maximum number of artifacts pulled together by a batch job
+_PULL_BATCH_SIZE = 256
 
 
 # A queue which pulls element artifacts
 #
+# Whenever several elements are ready, their artifacts are first pulled in
+# bulk by a batch job, while the elements which were part of an earlier
+# batch are processed by their own jobs, which only report the results of
+# the batch and pull any artifact the batch could not pull.
+#
 class PullQueue(Queue):
 
     action_name = "Pull"
     complete_name = "Artifacts Pulled"
     resources = [ResourceType.DOWNLOAD, ResourceType.CACHE]
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._batch = None  # The ready queue entries of the running batch job
+        self._batch_count = 0  # Number of batch jobs started
+        self._batched_elements = set()  # Elements which were part of a batch
+
+    def harvest_jobs(self):
+        jobs = []
+
+        if self._batch is None:
+            batch_job = self._harvest_batch_job()
+            if batch_job:
+                jobs.append(batch_job)
+
+        jobs.extend(super().harvest_jobs())
+        return jobs
+
     def get_process_func(self):
         return PullQueue._pull_or_skip
 
@@ -50,3 +82,86 @@ class PullQueue(Queue):
     def _pull_or_skip(element):
         if not element._load_artifact(pull=True):
             raise SkipJob(PullQueue.action_name)
+
+    # _harvest_batch_job()
+    #
+    # Take the ready elements which were not part of a batch yet out of
+    # the ready queue, and create a job to pull their artifacts in bulk.
+    #
+    # Returns:
+    #    (_PullBatchJob): The batch job, or None if there are not enough
+    #                     elements to batch or no resources are available
+    #
+    def _harvest_batch_job(self):
+        entries = [entry for entry in self._ready_queue if entry[3] not in self._batched_elements]
+        if len(entries) < 2:
+            return None
+
+        if not self._resources.reserve(self.resources):
+            return None
+
+        self._batch = heapq.nsmallest(_PULL_BATCH_SIZE, entries)
+        self._batch_count += 1
+
+        batch_elements = set()
+        for _, _, _, element in self._batch:
+            batch_elements.add(element)
+            self._batched_elements.add(element)
+
+        self._ready_queue = [entry for entry in self._ready_queue if entry[3] not in batch_elements]
+        heapq.heapify(self._ready_queue)
+
+        return _PullBatchJob(
+            self._scheduler,
+            self.action_name,
+            "pull-batch-{}".format(self._batch_count),
+            elements=[element for _, _, _, element in self._batch],
+            complete_cb=self._batch_job_done,
+        )
+
+    # _batch_job_done()
+    #
+    # Return the elements of a completed batch job to the ready queue,
+    # such that their own jobs report the results of the batch.
+    #
+    def _batch_job_done(self, job, status):
+        self._resources.release(self.resources)
+
+        for entry in self._batch:
+            heapq.heappush(self._ready_queue, entry)
+
+        self._batch = None
+
+
+# _PullBatchJob()
+#
+# A job pulling the artifacts of several elements at once, with
+# ArtifactCache.pull_batch().
+#
+# Args:
+#    scheduler (Scheduler): The scheduler
+#    action_name (str): The queue action name
+#    logfile (str): The log file name
+#    elements (list): The Elements whose artifacts should be pulled
+#    complete_cb (callable): The function to call in the main thread when
+#                            the job completes, with the job and its status
+#
+class _PullBatchJob(Job):
+    def __init__(self, *args, elements, complete_cb, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_name("{} artifacts".format(len(elements)))
+        self._elements = elements
+        self._complete_cb = complete_cb
+
+    def parent_complete(self, status, result):
+        self._complete_cb(self, status)
+
+    def child_process(self):
+        context = self._scheduler.context
+        task = context.messenger.get_action_task()
+
+        try:
+            context.artifactcache.pull_batch(self._elements, pull_buildtrees=context.pull_buildtrees, task=task)
+        except BstError as e:
+            # The artifacts are left to the jobs of the elements, which report errors
+            self.message(MessageType.WARN, "Failed to pull artifacts in bulk: {}".format(e))
@@ -217,8 +217,9 @@ class Queue:
     # can be reserved.
     #
     # Priority is first given to elements which have been assigned a lower
-    # depth (see Element._set_depth()), and then to elements which have
-    # been enqueued earlier.
+    # priority value (see Element._set_priority()), then to elements which
+    # have been assigned a lower depth (see Element._set_depth()), and then
+    # to elements which have been enqueued earlier.
     #
     # Returns:
     #     ([Job]): A list of jobs which can be run now
@@ -231,7 +232,7 @@ class Queue:
             if not reserved:
                 break
 
-            _, _, element = heapq.heappop(self._ready_queue)
+            _, _, _, element = heapq.heappop(self._ready_queue)
             ready.append(element)
 
         return [
@@ -388,7 +389,7 @@ class Queue:
             self._done_queue.append(element)  # Elements to proceed to the next queue
         elif status == QueueStatus.READY:
             # Push elements which are ready to be processed immediately into the queue
-            heapq.heappush(self._ready_queue, (element._depth, self._queued_elements, element))
+            heapq.heappush(self._ready_queue, (element._priority, element._depth, self._queued_elements, element))
             self._queued_elements += 1
         else:
             # Register a queue specific callback for pending elements
@@ -18,6 +18,7 @@ class ResourceType:
     DOWNLOAD = 1
     PROCESS = 2
     UPLOAD = 3
+    BUILD = 4  # Build jobs only, whose number may be adapted to the host load
 
 
 class Resources:
@@ -27,14 +28,20 @@ class Resources:
             ResourceType.DOWNLOAD: num_fetchers,
             ResourceType.PROCESS: num_builders,
             ResourceType.UPLOAD: num_pushers,
+            ResourceType.BUILD: num_builders,
         }
 
+        # Limits currently in effect for resources which are adapted
+        # at runtime, these never exceed the maximum resources.
+        self._limits = {}
+
         # Resources jobs are currently using.
         self._used_resources = {
             ResourceType.CACHE: 0,
             ResourceType.DOWNLOAD: 0,
             ResourceType.PROCESS: 0,
             ResourceType.UPLOAD: 0,
+            ResourceType.BUILD: 0,
         }
 
         # Resources jobs currently want exclusive access to. The set
@@ -47,6 +54,7 @@ class Resources:
             ResourceType.DOWNLOAD: set(),
             ResourceType.PROCESS: set(),
             ResourceType.UPLOAD: set(),
+            ResourceType.BUILD: set(),
         }
 
     # reserve()
@@ -105,7 +113,8 @@ class Resources:
         # available. If we don't have enough, the job cannot be
         # scheduled.
         for resource in resources:
-            if self._max_resources[resource] > 0 and self._used_resources[resource] >= self._max_resources[resource]:
+            limit = self._limits.get(resource, self._max_resources[resource])
+            if 0 < limit <= self._used_resources[resource]:
                 return False
 
         # Now we register the fact that our job is using the resources
@@ -128,3 +137,28 @@ class Resources:
         for resource in resources:
             assert self._used_resources[resource] > 0, "Scheduler resource imbalance"
             self._used_resources[resource] -= 1
+
+    # set_limit()
+    #
+    # Limit the number of jobs which may use a resource at the same time
+    # to fewer than the configured maximum, jobs which are already using
+    # the resource are not affected.
+    #
+    # Args:
+    #    resource (ResourceType): The resource to limit
+    #    limit (int): The number of jobs which may use the resource
+    #
+    def set_limit(self, resource, limit):
+        assert 0 < limit <= self._max_resources[resource] or self._max_resources[resource] == 0
+        self._limits[resource] = limit
+
+    # get_used()
+    #
+    # Args:
+    #    resource (ResourceType): The resource
+    #
+    # Returns:
+    #    (int): The number of jobs currently using the resource
+    #
+    def get_used(self, resource):
+        return self._used_resources[resource]
@@ -28,6 +28,8 @@ import sys
 from concurrent.futures import ThreadPoolExecutor
 
 # Local imports
+from .jobserver import JobServer
+from .loadmonitor import LoadMonitor
 from .resources import Resources
 from .jobs import JobStatus
 from ..types import FastEnum
@@ -109,6 +111,15 @@ class Scheduler:
 
         self.resources = Resources(context.sched_builders, context.sched_fetchers, context.sched_pushers)
 
+        # Adapts the number of builders to the host load, if enabled
+        self._load_monitor = None
+        if context.sched_adaptive_builders:
+            self._load_monitor = LoadMonitor(
+                min(context.sched_min_builders, context.sched_builders), context.sched_builders
+            )
+
+        self._jobserver = None  # The jobserver shared by the builds while running, if enabled
+
         # Ensure that the forkserver is started before we start.
         # This is best run before we do any GRPC connections to casd or have
         # other background threads started.
@@ -167,6 +178,13 @@ class Scheduler:
 
         _watcher.add_child_handler(self._casd_process.pid, abort_casd)
 
+        # Share a single pool of parallel jobs between all builds
+        if self.context.build_jobserver:
+            self._jobserver = JobServer(
+                self.context.tmpdir, self.context.platform.get_cpu_count(), self.context.sched_builders
+            )
+            self.context.jobserver = self._jobserver
+
         # Start the profiler
         with PROFILER.profile(Topics.SCHEDULER, "_".join(queue.action_name for queue in self.queues)):
             # This is not a no-op. Since it is the first signal registration
@@ -192,6 +210,11 @@ class Scheduler:
         # Stop handling unix signals
         self._disconnect_signals()
 
+        if self._jobserver:
+            self.context.jobserver = None
+            self._jobserver.close()
+            self._jobserver = None
+
         failed = any(queue.any_failed_elements() for queue in self.queues)
         self.loop = None
 
@@ -296,6 +319,10 @@ class Scheduler:
 
         self._state.remove_task(job.id)
 
+        # Recover the tokens which interrupted builds could have failed to give back
+        if self._jobserver and not self._active_jobs:
+            self._jobserver.reset()
+
         self._sched()
 
     #######################################################
@@ -428,6 +455,10 @@ class Scheduler:
 
             if not self.terminated:
 
+                # Adapt the number of builders to the host load
+                if self._load_monitor:
+                    self._load_monitor.update(self.resources)
+
                 #
                 # Run as many jobs as the queues can handle for the
                 # available resources
@@ -524,6 +555,15 @@ class Scheduler:
     # Regular timeout for driving status in the UI
     def _tick(self):
         self._ticker_callback()
+
+        # Start more builds right away if the host load allows it
+        if (
+            self._load_monitor
+            and not (self.terminated or self.suspended)
+            and self._load_monitor.update(self.resources)
+        ):
+            self._sched()
+
         self.loop.call_later(1, self._tick)
 
     def _handle_exception(self, loop, context: dict) -> None:
@@ -35,8 +35,7 @@ class SourceCache(AssetCache):
     def __init__(self, context):
         super().__init__(context)
 
-        self._basedir = os.path.join(context.cachedir, "source_protos")
-        os.makedirs(self._basedir, exist_ok=True)
+        self._open_refs(os.path.join(context.cachedir, "source_protos"))
 
     # contains()
     #
@@ -51,9 +50,8 @@ class SourceCache(AssetCache):
     #
     def contains(self, source):
         ref = source._get_source_name()
-        path = self._source_path(ref)
 
-        if not os.path.exists(path):
+        if not self._refs.contains(ref):
             return False
 
         # check files
@@ -201,23 +199,16 @@ class SourceCache(AssetCache):
         self._store_proto(source_proto, ref)
 
     def _store_proto(self, proto, ref):
-        path = self._source_path(ref)
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with utils.save_file_atomic(path, "w+b") as f:
-            f.write(proto.SerializeToString())
+        self._refs.store([ref], proto.SerializeToString())
 
     def _get_source(self, ref):
-        path = self._source_path(ref)
+        data = self._refs.load(ref)
+        if data is None:
+            raise SourceCacheError("Attempted to access unavailable source: {}".format(ref))
+
         source_proto = source_pb2.Source()
-        try:
-            with open(path, "r+b") as f:
-                source_proto.ParseFromString(f.read())
-                return source_proto
-        except FileNotFoundError as e:
-            raise SourceCacheError("Attempted to access unavailable source: {}".format(e)) from e
-
-    def _source_path(self, ref):
-        return os.path.join(self._basedir, ref)
+        source_proto.ParseFromString(data)
+        return source_proto
 
     def _pull_source(self, source_ref, remote):
         uri = REMOTE_ASSET_SOURCE_URN_TEMPLATE.format(source_ref)
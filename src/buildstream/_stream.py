@@ -198,39 +198,47 @@ class Stream:
             # Enqueue complete build plan as this is required to determine `buildable` status.
             plan = list(_pipeline.dependencies(elements, _Scope.ALL))
 
-            if self._context.remote_cache_spec:
-                # Parallelize cache queries if a remote cache is configured
-                self._reset()
-                self._add_queue(
-                    CacheQueryQueue(
-                        self._scheduler, sources=only_sources, sources_if_cached=sources_of_cached_elements
-                    ),
-                    track=True,
-                )
-                self._enqueue_plan(plan)
-                self._run()
-            else:
-                task.set_maximum_progress(len(plan))
-                for element in plan:
-                    if element._can_query_cache():
-                        # Cache status already available.
-                        # This is the case for artifact elements, which load the
-                        # artifact early on.
-                        pass
-                    elif not only_sources and element._get_cache_key(strength=_KeyStrength.WEAK):
-                        element._load_artifact(pull=False)
-                        if (
-                            sources_of_cached_elements
-                            or not element._can_query_cache()
-                            or not element._cached_success()
-                        ):
+            if not only_sources:
+                # Query the artifacts of the whole plan in bulk, the per-element
+                # cache queries below then only consume the recorded results.
+                self._artifacts.query_cache_batch([element for element in plan if not element._can_query_cache()])
+
+            try:
+                if self._context.remote_cache_spec:
+                    # Parallelize cache queries if a remote cache is configured
+                    self._reset()
+                    self._add_queue(
+                        CacheQueryQueue(
+                            self._scheduler, sources=only_sources, sources_if_cached=sources_of_cached_elements
+                        ),
+                        track=True,
+                    )
+                    self._enqueue_plan(plan)
+                    self._run()
+                else:
+                    task.set_maximum_progress(len(plan))
+                    for element in plan:
+                        if element._can_query_cache():
+                            # Cache status already available.
+                            # This is the case for artifact elements, which load the
+                            # artifact early on.
+                            pass
+                        elif not only_sources and element._get_cache_key(strength=_KeyStrength.WEAK):
+                            element._load_artifact(pull=False)
+                            if (
+                                sources_of_cached_elements
+                                or not element._can_query_cache()
+                                or not element._cached_success()
+                            ):
+                                element._query_source_cache()
+                            if not element._pull_pending():
+                                element._load_artifact_done()
+                        elif element._has_all_sources_resolved():
                             element._query_source_cache()
-                        if not element._pull_pending():
-                            element._load_artifact_done()
-                    elif element._has_all_sources_resolved():
-                        element._query_source_cache()
 
-                    task.add_current_progress()
+                        task.add_current_progress()
+            finally:
+                self._artifacts.clear_batch_query_results()
 
     # shell()
     #
@@ -417,6 +425,9 @@ class Stream:
         # is required, independent of whether the artifact is already available.
         self.query_cache(elements, sources_of_cached_elements=source_push_enabled)
 
+        # Schedule the elements on the longest remaining build paths first
+        _pipeline.prioritize(self._context, elements)
+
         # Now construct the queues
         #
         self._reset()
@@ -1805,7 +1816,10 @@ class Stream:
             self._session_start_callback()
 
         self._running = True
-        status = self._scheduler.run(self.queues, self._context.get_cascache().get_casd())
+        try:
+            status = self._scheduler.run(self.queues, self._context.get_cascache().get_casd())
+        finally:
+            self._artifacts.clear_batch_pull_results()
         self._running = False
 
         if status == SchedStatus.ERROR:
@@ -13,6 +13,14 @@
 #
 from typing import Optional
 
-from .node import MappingNode
+from .node import MappingNode, Node
 
-def load(filename: str, shortname: str, copy_tree: bool = False, project: Optional[object] = None) -> MappingNode: ...
+def load(
+    filename: str,
+    shortname: str,
+    copy_tree: bool = False,
+    project: Optional[object] = None,
+    cache: Optional[object] = None,
+) -> MappingNode: ...
+def serialize_node(data: Node) -> tuple: ...
+def deserialize_node(serialized: tuple, file_index: int) -> Node: ...
@@ -29,7 +29,7 @@ from ruamel import yaml
 from ._exceptions import LoadError
 from .exceptions import LoadErrorReason
 from . cimport node
-from .node cimport MappingNode, ScalarNode, SequenceNode
+from .node cimport Node, MappingNode, ScalarNode, SequenceNode
 
 
 # These exceptions are intended to be caught entirely within
@@ -249,13 +249,15 @@ cdef class Representer:
 #    copy_tree (bool): Whether to make a copy, preserving the original toplevels
 #                      for later serialization
 #    project (Project): The (optional) project to associate the parsed YAML with
+#    cache (LoadCache): The (optional) cache of previously parsed file contents
 #
 # Returns (dict): A loaded copy of the YAML file with provenance information
 #
 # Raises: LoadError
 #
-cpdef MappingNode load(str filename, str shortname, bint copy_tree=False, object project=None):
+cpdef MappingNode load(str filename, str shortname, bint copy_tree=False, object project=None, object cache=None):
     cdef MappingNode data
+    cdef tuple serialized
 
     if not shortname:
         shortname = filename
@@ -272,11 +274,24 @@ cpdef MappingNode load(str filename, str shortname, bint copy_tree=False, object
         with open(filename) as f:
             contents = f.read()
 
+        if cache is not None:
+            serialized = cache.lookup(contents)
+            if serialized is not None:
+                data = <MappingNode> deserialize_node(serialized, file_number)
+                node._set_root_node_for_file(file_number, data)
+
+                if copy_tree:
+                    data = data.clone()
+                return data
+
         data = load_data(contents,
                          file_index=file_number,
                          file_name=filename,
                          copy_tree=copy_tree)
 
+        if cache is not None:
+            cache.store(contents, serialize_node(data))
+
         return data
     except FileNotFoundError as e:
         raise LoadError("Could not find file at {}".format(filename),
@@ -328,6 +343,71 @@ cpdef MappingNode load_data(str data, int file_index=node._SYNTHETIC_FILE_INDEX,
     return contents
 
 
+# serialize_node()
+#
+# Converts a loaded node tree into plain python data which pickles
+# compactly, and which deserialize_node() turns back into nodes much
+# faster than the YAML can be parsed again.
+#
+# Args:
+#    data (Node): The node to serialize
+#
+# Returns:
+#    (tuple): The serialized node
+#
+cpdef tuple serialize_node(Node data):
+    cdef object value
+    cdef object key
+    cdef Node child
+
+    if type(data) is MappingNode:
+        value = {}
+        for key, child in (<MappingNode> data).value.items():
+            value[key] = serialize_node(child)
+    elif type(data) is SequenceNode:
+        value = []
+        for child in (<SequenceNode> data).value:
+            value.append(serialize_node(child))
+    else:
+        value = (<ScalarNode> data).value
+
+    return (data.line, data.column, value)
+
+
+# deserialize_node()
+#
+# Creates a node tree from data obtained with serialize_node().
+#
+# Args:
+#    serialized (tuple): The serialized node
+#    file_index (int): The index of the file the nodes are to be attributed to
+#
+# Returns:
+#    (Node): The node tree
+#
+cpdef Node deserialize_node(tuple serialized, int file_index):
+    cdef int line = serialized[0]
+    cdef int column = serialized[1]
+    cdef object value = serialized[2]
+    cdef dict mapping
+    cdef list sequence
+    cdef object key
+    cdef tuple child
+
+    if type(value) is dict:
+        mapping = {}
+        for key, child in (<dict> value).items():
+            mapping[key] = deserialize_node(child, file_index)
+        return MappingNode.__new__(MappingNode, file_index, line, column, mapping)
+    elif type(value) is list:
+        sequence = []
+        for child in <list> value:
+            sequence.append(deserialize_node(child, file_index))
+        return SequenceNode.__new__(SequenceNode, file_index, line, column, sequence)
+
+    return ScalarNode.__new__(ScalarNode, file_index, line, column, value)
+
+
 ###############################################################################
 
 # Roundtrip code
@@ -88,11 +88,51 @@ import os
 import urllib.request
 import urllib.error
 import contextlib
-import shutil
+import fcntl
+import hashlib
+import http.client
+import json
 import netrc
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from .source import Source, SourceError
 from . import utils
+from . import _downloader
+
+
+# The timeout of download requests, in seconds
+_DOWNLOAD_TIMEOUT = 10 * 60
+
+# The size of the chunks of downloaded data
+_DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+# Files at least this large are downloaded in segments with HTTP range
+# requests, if the server supports them
+_SEGMENTED_DOWNLOAD_THRESHOLD = 32 * 1024 * 1024
+
+# How many segments of a file to download in parallel
+_DOWNLOAD_SEGMENTS = 4
+
+# How many bytes to download between saves of the state of a partial download
+_PARTIAL_SAVE_BYTES = 8 * 1024 * 1024
+
+# How many times to resume a segment which is interrupted without progress
+_DOWNLOAD_RETRIES = 3
+
+# The name of a partially downloaded file in the mirror directory
+_PARTIAL_DOWNLOAD_NAME = "download.partial"
+
+# The name of the directory storing the downloaded files by sha256sum,
+# shared by all downloadable file sources, in the source mirrors directory
+_DOWNLOAD_STORE_NAME = "_downloads"
+
+
+# Raised when a server answers a range request with anything else than
+# the requested range
+class _RangeNotHonoredError(ValueError):
+    pass
 
 
 class _NetrcFTPOpener(urllib.request.FTPHandler):
@@ -144,9 +184,193 @@ class _NetrcPasswordManager:
             return login, password
 
 
-def _download_file(opener_creator, url, etag, directory, bearer_auth):
-    opener = opener_creator.get_url_opener(bearer_auth)
-    default_name = os.path.basename(url)
+# _PartialDownload()
+#
+# The state of a file downloaded in segments, which is kept next to the
+# partially downloaded file such that an interrupted download can be
+# resumed by a later fetch.
+#
+# The download is only resumed if the server still reports the same
+# length and validator (strong ETag or Last-Modified) for the file, the
+# range requests are conditional on the validator as well.
+#
+# Args:
+#    directory (str): The directory to keep the partial download in
+#
+class _PartialDownload:
+    def __init__(self, directory):
+        self.path = os.path.join(directory, _PARTIAL_DOWNLOAD_NAME)
+        self.url = None
+        self.validator = None
+        self.length = 0
+
+        # The segments, as [start, offset, end] lists where offset is the
+        # end of the data downloaded so far
+        self.segments = []
+
+        self._state_path = self.path + ".json"
+        self._lock_file = None
+        self._lock = threading.Lock()
+        self._unsaved_bytes = 0
+
+    # acquire()
+    #
+    # Lock the partial download against concurrent downloads of the same
+    # file by other sessions.
+    #
+    # Returns:
+    #    (bool): Whether the lock was acquired
+    #
+    def acquire(self):
+        self._lock_file = open(self.path + ".lock", "a", encoding="utf-8")  # pylint: disable=consider-using-with
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.release()
+            return False
+        return True
+
+    # release()
+    #
+    # Unlock the partial download.
+    #
+    def release(self):
+        if self._lock_file:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # start()
+    #
+    # Start downloading a file, resuming the previous download of the
+    # file if possible.
+    #
+    # Args:
+    #    url (str): The url of the file
+    #    validator (str): The ETag or Last-Modified header of the file, or None
+    #    length (int): The length of the file
+    #
+    def start(self, url, validator, length):
+        state = None
+        if validator:
+            try:
+                with open(self._state_path, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+                if os.path.getsize(self.path) != length:
+                    state = None
+            except (OSError, ValueError):
+                state = None
+
+        if state and state.get("url") == url and state.get("validator") == validator and state.get("length") == length:
+            self.segments = state["segments"]
+        else:
+            segment_size = -(-length // _DOWNLOAD_SEGMENTS)
+            self.segments = [
+                [start, start, min(start + segment_size, length)] for start in range(0, length, segment_size)
+            ]
+            with open(self.path, "wb") as f:
+                f.truncate(length)
+
+        self.url = url
+        self.validator = validator
+        self.length = length
+        self.save()
+
+    # advance()
+    #
+    # Record that data of a segment was written to the file.
+    #
+    # Args:
+    #    index (int): The index of the segment
+    #    nbytes (int): The number of bytes written
+    #
+    def advance(self, index, nbytes):
+        with self._lock:
+            self.segments[index][1] += nbytes
+            self._unsaved_bytes += nbytes
+            if self._unsaved_bytes >= _PARTIAL_SAVE_BYTES:
+                self._save()
+
+    # contiguous_length()
+    #
+    # Returns:
+    #    (int): The length of the data downloaded from the start of the file
+    #
+    def contiguous_length(self):
+        with self._lock:
+            for _, offset, end in self.segments:
+                if offset < end:
+                    return offset
+            return self.length
+
+    # save()
+    #
+    # Save the state of the download.
+    #
+    def save(self):
+        with self._lock:
+            self._save()
+
+    # discard()
+    #
+    # Remove the partial download, after it completed or failed for
+    # reasons which resuming it would not fix.
+    #
+    def discard(self):
+        for path in (self.path, self._state_path):
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(path)
+
+    def _save(self):
+        state = {"url": self.url, "validator": self.validator, "length": self.length, "segments": self.segments}
+        with utils.save_file_atomic(self._state_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        self._unsaved_bytes = 0
+
+
+# _IncrementalHash()
+#
+# Computes the sha256sum of a file while it is downloaded, such that it
+# is not read again once the download completes. As segments complete out
+# of order, the data is hashed once it is contiguous with the hashed data.
+#
+# Args:
+#    fd (int): The file descriptor of the file
+#
+class _IncrementalHash:
+    def __init__(self, fd):
+        self._fd = fd
+        self._sha256 = hashlib.sha256()
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    # update()
+    #
+    # Hash the data up to the given offset, unless another thread is
+    # hashing already.
+    #
+    # Args:
+    #    end (int): The end of the contiguous data written to the file
+    #    wait (bool): Whether to wait for other threads hashing the file
+    #
+    def update(self, end, *, wait=False):
+        if not self._lock.acquire(blocking=wait):  # pylint: disable=consider-using-with
+            return
+
+        try:
+            while self._offset < end:
+                data = os.pread(self._fd, min(_DOWNLOAD_CHUNK_BYTES * 16, end - self._offset), self._offset)
+                if not data:
+                    raise ValueError("Downloaded file is truncated")
+                self._sha256.update(data)
+                self._offset += len(data)
+        finally:
+            self._lock.release()
+
+    def hexdigest(self):
+        return self._sha256.hexdigest()
+
+
+def _create_request(opener_creator, url, bearer_auth):
     request = urllib.request.Request(url)
     request.add_header("Accept", "*/*")
     request.add_header("User-Agent", "BuildStream/2")
@@ -159,44 +383,282 @@ def _download_file(opener_creator, url, etag, directory, bearer_auth):
             auth_header = "Bearer " + password
             request.add_header("Authorization", auth_header)
 
+    return request
+
+
+# _supports_segments()
+#
+# Check whether a file can be downloaded in segments with range requests.
+#
+def _supports_segments(url, info, length):
+    return (
+        urllib.parse.urlsplit(url).scheme in ("http", "https")
+        and info.get("Accept-Ranges", "").strip().lower() == "bytes"
+        and info.get("Content-Encoding", "identity").strip().lower() == "identity"
+        and length is not None
+        and int(length) >= _SEGMENTED_DOWNLOAD_THRESHOLD
+    )
+
+
+# _range_validator()
+#
+# Get the validator of a file to make range requests conditional on
+# with If-Range headers, which only accept strong validators.
+#
+# Returns:
+#    (str): The strong ETag or the Last-Modified date of the file, or None
+#
+def _range_validator(info):
+    etag = info["ETag"]
+    if etag and not etag.startswith("W/"):
+        return etag
+    return info["Last-Modified"]
+
+
+# _download_whole()
+#
+# Download a file with the response of a single request.
+#
+# Returns:
+#    (str): The sha256sum of the file
+#
+def _download_whole(response, length, local_file):
+    sha256 = hashlib.sha256()
+    with open(local_file, "wb") as dest:
+        for chunk in iter(lambda: response.read(_DOWNLOAD_CHUNK_BYTES), b""):
+            dest.write(chunk)
+            sha256.update(chunk)
+
+        actual_length = dest.tell()
+        if length and actual_length < int(length):
+            raise ValueError(f"Partial file {actual_length}/{length}")
+
+    return sha256.hexdigest()
+
+
+# _download_again()
+#
+# Download a whole file with a new request.
+#
+# Returns:
+#    (str): The ETag of the file
+#    (str): The sha256sum of the file
+#
+def _download_again(opener_creator, url, bearer_auth, local_file):
+    request = _create_request(opener_creator, url, bearer_auth)
+    opener = opener_creator.get_url_opener(bearer_auth)
+    with contextlib.closing(opener.open(request, timeout=_DOWNLOAD_TIMEOUT)) as response:
+        info = response.info()
+        return info["ETag"], _download_whole(response, info.get("Content-Length"), local_file)
+
+
+# _download_segments()
+#
+# Download a file in parallel segments with HTTP range requests, resuming
+# interrupted segments and hashing the file as its data becomes contiguous.
+#
+# Args:
+#    opener_creator (_UrlOpenerCreator): To create the openers of the requests
+#    url (str): The url of the file
+#    bearer_auth (bool): Whether to use bearer authentication
+#    response: The response of the initial request, which is used for the
+#              first segment when the download starts from scratch
+#    partial (_PartialDownload): The partial download to continue
+#
+# Returns:
+#    (str): The sha256sum of the file
+#
+def _download_segments(opener_creator, url, bearer_auth, response, partial):
+    aborted = threading.Event()
+
+    def open_range(offset, end):
+        request = _create_request(opener_creator, url, bearer_auth)
+        request.add_header("Range", "bytes={}-{}".format(offset, end - 1))
+        if partial.validator:
+            request.add_header("If-Range", partial.validator)
+        range_response = opener_creator.get_url_opener(bearer_auth).open(request, timeout=_DOWNLOAD_TIMEOUT)
+
+        content_range = range_response.info().get("Content-Range", "")
+        if range_response.status != 206 or not content_range.startswith("bytes {}-".format(offset)):
+            range_response.close()
+            raise _RangeNotHonoredError("Server did not honor range request, the file may have changed")
+        return range_response
+
+    def download_segment(index, segment_response):
+        failures = 0
+        while partial.segments[index][1] < partial.segments[index][2]:
+            _, offset, end = partial.segments[index]
+            previous_offset = offset
+            try:
+                if segment_response is None:
+                    segment_response = open_range(offset, end)
+
+                with contextlib.closing(segment_response):
+                    while offset < end and not aborted.is_set():
+                        data = segment_response.read(min(_DOWNLOAD_CHUNK_BYTES, end - offset))
+                        if not data:
+                            break
+                        os.pwrite(fd, data, offset)
+                        offset += len(data)
+                        partial.advance(index, len(data))
+                        hasher.update(partial.contiguous_length())
+            except urllib.error.HTTPError as e:
+                if e.code < 500:
+                    raise
+                error = e
+            except (urllib.error.URLError, OSError, http.client.HTTPException) as e:
+                error = e
+            else:
+                # Not a ValueError, such that the partial download is kept and resumed later
+                error = ConnectionError("Connection closed before the end of the segment")
+            segment_response = None
+
+            if aborted.is_set():
+                return
+
+            # Give up if the segment is repeatedly interrupted without progress
+            failures = 0 if offset > previous_offset else failures + 1
+            if offset < end and failures > _DOWNLOAD_RETRIES:
+                raise error
+
+    resume = any(start != offset for start, offset, _ in partial.segments)
+    with open(partial.path, "r+b") as f:
+        fd = f.fileno()
+        hasher = _IncrementalHash(fd)
+
+        with ThreadPoolExecutor(max_workers=_DOWNLOAD_SEGMENTS) as executor:
+            futures = [
+                executor.submit(download_segment, index, response if index == 0 and not resume else None)
+                for index in range(len(partial.segments))
+            ]
+            if resume:
+                response.close()
+
+            try:
+                for future in futures:
+                    future.result()
+            finally:
+                aborted.set()
+                partial.save()
+
+        hasher.update(partial.length, wait=True)
+
+    return hasher.hexdigest()
+
+
+# _link_atomic()
+#
+# Hard link a file into place, replacing any existing file atomically,
+# or copy it if it cannot be linked.
+#
+# Args:
+#    src (str): The file to link
+#    dest (str): The path to link the file to
+#
+def _link_atomic(src, dest):
+    directory = os.path.dirname(dest)
+    os.makedirs(directory, exist_ok=True)
+    with utils._tempdir(dir=directory, prefix=".link-") as tempdir:
+        temp_file = os.path.join(tempdir, "file")
+        utils.safe_link(src, temp_file)
+        os.replace(temp_file, dest)
+
+
+# _download_file()
+#
+# Download a file, in parallel segments if the file is large and the
+# server supports range requests.
+#
+# Args:
+#    opener_creator (_UrlOpenerCreator): To create the openers of the requests
+#    url (str): The url of the file
+#    etag (str): The ETag of the file in the mirror, or None
+#    directory (str): A temporary directory to download the file to
+#    bearer_auth (bool): Whether to use bearer authentication
+#    partial_directory (str): The directory to keep partial downloads of
+#                             segmented downloads in, or None
+#
+# Returns:
+#    (str): The path of the downloaded file, or None if it was not modified
+#    (str): The ETag of the downloaded file
+#    (str): The sha256sum of the downloaded file
+#    (str): An error message, or None
+#    (float): The time to the first byte of the response in seconds, or None
+#
+def _download_file(opener_creator, url, etag, directory, bearer_auth, partial_directory=None):
+    opener = opener_creator.get_url_opener(bearer_auth)
+    default_name = os.path.basename(url)
+    request = _create_request(opener_creator, url, bearer_auth)
+
     if etag is not None:
         request.add_header("If-None-Match", etag)
 
+    latency = None
+    start_time = time.monotonic()
     try:
-        with contextlib.closing(opener.open(request, timeout=10 * 60)) as response:
+        with contextlib.closing(opener.open(request, timeout=_DOWNLOAD_TIMEOUT)) as response:
+            latency = time.monotonic() - start_time
             info = response.info()
 
             # some servers don't honor the 'If-None-Match' header
             if etag and info["ETag"] == etag:
-                return None, None, None
+                return None, None, None, None, latency
 
             etag = info["ETag"]
             length = info.get("Content-Length")
-
             filename = info.get_filename(default_name)
             filename = os.path.basename(filename)
-            local_file = os.path.join(directory, filename)
-            with open(local_file, "wb") as dest:
-                shutil.copyfileobj(response, dest)
 
-                actual_length = dest.tell()
-                if length and actual_length < int(length):
-                    raise ValueError(f"Partial file {actual_length}/{length}")
+            if _supports_segments(url, info, length):
+                partial = _PartialDownload(partial_directory or directory)
+                if not partial.acquire():
+                    # Another session is downloading the file, don't resume its download
+                    partial = _PartialDownload(directory)
+                    partial.acquire()
+
+                try:
+                    partial.start(url, _range_validator(info), int(length))
+                    try:
+                        sha256 = _download_segments(opener_creator, url, bearer_auth, response, partial)
+                    except _RangeNotHonoredError:
+                        # Some servers advertise range requests without honoring them,
+                        # or the file changed, download the whole file instead
+                        partial.discard()
+                        local_file = os.path.join(directory, filename)
+                        etag, sha256 = _download_again(opener_creator, url, bearer_auth, local_file)
+                    except ValueError:
+                        # Resuming the download would not help
+                        partial.discard()
+                        raise
+                    else:
+                        # Keep the file on the same filesystem, the caller moves it into the mirror
+                        local_file = partial.path + ".complete"
+                        os.rename(partial.path, local_file)
+                        partial.discard()
+                finally:
+                    partial.release()
+            else:
+                local_file = os.path.join(directory, filename)
+                sha256 = _download_whole(response, length, local_file)
 
     except urllib.error.HTTPError as e:
+        # The server responded, even if with an error
+        if latency is None:
+            latency = time.monotonic() - start_time
+
         if e.code == 304:
             # 304 Not Modified.
             # Because we use etag only for matching ref, currently specified ref is what
             # we would have downloaded.
-            return None, None, None
+            return None, None, None, None, latency
 
-        return None, None, str(e)
-    except (urllib.error.URLError, OSError, ValueError) as e:
+        return None, None, None, str(e), latency
+    except (urllib.error.URLError, OSError, ValueError, http.client.HTTPException) as e:
         # Note that urllib.request.Request in the try block may throw a
         # ValueError for unknown url types, so we handle it here.
-        return None, None, str(e)
+        return None, None, None, str(e), latency
 
-    return local_file, etag, None
+    return local_file, etag, sha256, None, latency
 
 
 class DownloadableFileSource(Source):
@@ -260,6 +722,11 @@ class DownloadableFileSource(Source):
         if os.path.isfile(self._get_mirror_file()):
             return  # pragma: nocover
 
+        # Reuse the file if it was already downloaded by any source,
+        # possibly from another url or by another project.
+        if self._link_from_download_store(self.ref):
+            return
+
         # Download the file, raise hell if the sha256sums don't match,
         # and mirror the file otherwise.
         sha256 = self._ensure_mirror(
@@ -297,17 +764,8 @@ class DownloadableFileSource(Source):
 
             url_opener_creator = _UrlOpenerCreator(self._parse_netrc())
 
-            local_file, new_etag, error = self.blocking_activity(
-                _download_file, (url_opener_creator, self.url, etag, td, self.bearer_auth), activity_name
-            )
-
-            if error:
-                raise SourceError("{}: Error mirroring {}: {}".format(self, self.url, error), temporary=True)
-
-            if local_file is None:
-                return self.ref
-
-            # Make sure url-specific mirror dir exists.
+            # Make sure url-specific mirror dir exists, partial downloads
+            # are kept there to be resumed by later fetches.
             try:
                 os.makedirs(self._mirror_dir, exist_ok=True)
             except FileExistsError as e:
@@ -315,16 +773,64 @@ class DownloadableFileSource(Source):
                     "{}: Mirror directory exists but is not a directory: {}".format(self, self._mirror_dir)
                 ) from e
 
-            # Store by sha256sum
-            sha256 = utils.sha256sum(local_file)
+            # Downloads run in the downloader process of the session, in
+            # order to reuse its connections to the same servers.
+            downloader = self._get_context().get_downloader()
+            with self.timed_activity(activity_name):
+                local_file, new_etag, sha256, error, latency = downloader.run(
+                    _download_file,
+                    (url_opener_creator, self.url, etag, td, self.bearer_auth, self._mirror_dir),
+                )
+
+            if latency is not None:
+                self._record_first_byte_latency(latency)
+
+            if error:
+                raise SourceError("{}: Error mirroring {}: {}".format(self, self.url, error), temporary=True)
+
+            if local_file is None:
+                return self.ref
+
+            # Store by sha256sum, which was computed while downloading.
             # Even if the file already exists, move the new file over.
             # In case the old file was corrupted somehow.
             os.rename(local_file, self._get_mirror_file(sha256))
+            self._add_to_download_store(sha256)
 
             if new_etag:
                 self._store_etag(sha256, new_etag)
             return sha256
 
+    # Links the file with the given sha256sum from the download store
+    # into the mirror directory, returns whether the store had the file.
+    def _link_from_download_store(self, sha256):
+        store_file = self._get_download_store_file(sha256)
+        if not os.path.isfile(store_file):
+            return False
+
+        with self.timed_activity("Using previous download of {}".format(self.url)):
+            try:
+                _link_atomic(store_file, self._get_mirror_file(sha256))
+            except (OSError, utils.UtilError) as e:
+                raise SourceError("{}: Error mirroring {}: {}".format(self, self.url, e)) from e
+        return True
+
+    # Adds the mirrored file with the given sha256sum to the download store,
+    # for other sources to reuse without downloading it again.
+    def _add_to_download_store(self, sha256):
+        store_file = self._get_download_store_file(sha256)
+        if os.path.isfile(store_file):
+            return
+
+        try:
+            _link_atomic(self._get_mirror_file(sha256), store_file)
+        except (OSError, utils.UtilError) as e:
+            # The store is an optimization only, failing to add to it is not an error
+            self.warn("{}: Failed to add {} to the download store: {}".format(self, self.url, e))
+
+    def _get_download_store_file(self, sha256):
+        return os.path.join(self._get_context().sourcedir, _DOWNLOAD_STORE_NAME, sha256[:2], sha256[2:])
+
     def _parse_netrc(self):
         netrc_config = None
         try:
@@ -359,5 +865,5 @@ class _UrlOpenerCreator:
             netrc_pw_mgr = _NetrcPasswordManager(self.netrc_config)
             http_auth = urllib.request.HTTPBasicAuthHandler(netrc_pw_mgr)
             ftp_handler = _NetrcFTPOpener(self.netrc_config)
-            return urllib.request.build_opener(http_auth, ftp_handler)
-        return urllib.request.build_opener()
+            return _downloader.build_opener(http_auth, ftp_handler)
+        return _downloader.build_opener()
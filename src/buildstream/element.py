@@ -247,6 +247,7 @@ class Element(Plugin):
         # Internal instance properties
         #
         self._depth = None  # Depth of Element in its current dependency graph
+        self._priority = 0  # Scheduling priority of Element, lower values are scheduled first
         self._overlap_collector = None  # type: Optional[OverlapCollector]
         self._description = load_element.description or ""  # type: str
 
@@ -684,8 +685,11 @@ class Element(Plugin):
         """
         assert self._overlap_collector is not None, "Attempted to stage artifacts outside of Element.stage()"
 
+        dependencies = list(self.dependencies(selection))
+        self.__fetch_artifact_files(dependencies, include, exclude, orphans)
+
         with self._overlap_collector.session(action, path):
-            for dep in self.dependencies(selection):
+            for dep in dependencies:
                 dep._stage_artifact(sandbox, path=path, include=include, exclude=exclude, orphans=orphans, owner=self)
 
     def integrate(self, sandbox: "Sandbox") -> None:
@@ -974,6 +978,9 @@ class Element(Plugin):
 
         split_filter = self.__split_filter_func(include, exclude, orphans)
 
+        # Only fetch the files to stage if the artifact was pulled lazily
+        self.__artifact.fetch_files(filter_callback=split_filter)  # type: ignore
+
         result = vstagedir._import_files_internal(files_vdir, filter_callback=split_filter)
         assert result is not None
 
@@ -1001,8 +1008,11 @@ class Element(Plugin):
     #                              occur.
     #
     def _stage_dependency_artifacts(self, sandbox, scope, *, path=None, include=None, exclude=None, orphans=True):
+        dependencies = list(self._dependencies(scope))
+        self.__fetch_artifact_files(dependencies, include, exclude, orphans)
+
         with self._overlap_collector.session(OverlapAction.WARNING, path):
-            for dep in self._dependencies(scope):
+            for dep in dependencies:
                 dep._stage_artifact(sandbox, path=path, include=include, exclude=exclude, orphans=orphans, owner=self)
 
     # _new_from_load_element():
@@ -1415,6 +1425,7 @@ class Element(Plugin):
 
             if usebuildtree:
                 # Use the cached buildroot directly
+                self.__artifact.fetch_files("buildroot")
                 buildrootvdir = self.__artifact.get_buildroot()
                 sandbox_vroot = sandbox.get_virtual_directory()
                 sandbox_vroot._import_files_internal(buildrootvdir, collect_result=False)
@@ -1476,6 +1487,7 @@ class Element(Plugin):
             if last_build_artifact:
                 self.info("Incremental build")
                 last_sources = last_build_artifact.get_sources()
+                last_build_artifact.fetch_files("buildtree")
                 import_dir = last_build_artifact.get_buildtree()
                 import_dir._apply_changes(last_sources, staged_sources)
             else:
@@ -1936,6 +1948,24 @@ class Element(Plugin):
         self.__artifact = artifact
         return pulled
 
+    # _get_artifact_query_keys()
+    #
+    # Get the cache keys which `_load_artifact()` uses to look up the
+    # artifact in the local cache, without querying the cache.
+    #
+    # Returns:
+    #   (list): The cache keys, in the order in which they are looked up
+    #
+    def _get_artifact_query_keys(self):
+        keys = []
+        if self.__strict_cache_key or self.__weak_cache_key:
+            keys.append(self.__strict_cache_key or self.__weak_cache_key)
+            if not self._get_context().get_strict():
+                # In non-strict mode the weak cache key is used as a fallback
+                keys.append(self.__weak_cache_key)
+
+        return list(utils._deduplicate(keys))
+
     def _query_source_cache(self):
         self.__sources.query_cache()
 
@@ -2401,6 +2431,17 @@ class Element(Plugin):
     def _set_depth(self, depth):
         self._depth = depth
 
+    # _set_priority()
+    #
+    # Set the scheduling priority of the Element.
+    #
+    # Elements with a lower priority value are scheduled first by the
+    # queues, elements of equal priority are scheduled according to
+    # their depth.
+    #
+    def _set_priority(self, priority):
+        self._priority = priority
+
     # _update_ready_for_runtime_and_cached()
     #
     # An Element becomes ready for runtime and cached once the following criteria
@@ -3177,6 +3218,34 @@ class Element(Plugin):
         # the required callback signature: a single `path` parameter.
         return partial(self.__split_filter, element_domains, include, exclude, orphans)
 
+    # __fetch_artifact_files():
+    #
+    # Fetch the files which are about to be staged from the artifacts of the
+    # given elements, all at once rather than one artifact after the other.
+    # This is only needed if the artifacts were pulled lazily.
+    #
+    # Args:
+    #    elements (list): The elements whose artifacts will be staged
+    #    include (list): An optional list of domains to include files from
+    #    exclude (list): An optional list of domains to exclude files from
+    #    orphans (bool): Whether to include files not spoken for by split domains
+    #
+    def __fetch_artifact_files(self, elements, include, exclude, orphans):
+        context = self._get_context()
+        if not context.cache_lazy_pull:
+            return
+
+        entries = []
+        for element in elements:
+            # Uncached artifacts are reported when staging them
+            if element._cached():
+                files_digest = element.__artifact._get_field_digest("files")
+                if files_digest:
+                    filter_callback = element.__split_filter_func(include, exclude, orphans)
+                    entries.append((element._get_project(), files_digest, filter_callback))
+
+        context.artifactcache.fetch_missing_files_batch(entries)
+
     def __compute_splits(self, include=None, exclude=None, orphans=True):
         filter_func = self.__split_filter_func(include=include, exclude=exclude, orphans=orphans)
 
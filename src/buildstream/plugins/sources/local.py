@@ -63,14 +63,13 @@ class LocalSource(Source):
         #
         # As a core plugin, we use some private API to optimize file hashing.
         #
-        # * Use Source._cache_directory() to prepare a Directory
+        # * Use Source._cache_local_path() to prepare a Directory, unless
+        #   the files are unchanged since they were last cached
         # * Do the regular staging activity into the Directory
         # * Use the hash of the cached digest as the unique key
         #
         if not self.__digest:
-            with self._cache_directory() as directory:
-                self.__do_stage(directory)
-                self.__digest = directory._get_digest()
+            self.__digest = self._cache_local_path(self.fullpath, self.__do_stage)
 
         return self.__digest.hash
 
@@ -52,16 +52,15 @@ See :ref:`built-in functionality doumentation <core_source_builtins>` for
 details on common configuration options for sources.
 """
 
-import functools
 import os
-import sys
 import tarfile
 from contextlib import contextmanager
 from tempfile import TemporaryFile
 from typing import Optional
 
-from buildstream import DownloadableFileSource, SourceError
+from buildstream import DownloadableFileSource, SourceError, DirectoryError
 from buildstream import utils
+from buildstream.storage import FileBasedDirectory
 
 
 class ReadableTarInfo(tarfile.TarInfo):
@@ -92,6 +91,7 @@ class TarSource(DownloadableFileSource):
     # pylint: disable=attribute-defined-outside-init
 
     BST_MIN_VERSION = "2.0"
+    BST_STAGE_VIRTUAL_DIRECTORY = True
 
     def configure(self, node):
         super().configure(node)
@@ -128,6 +128,11 @@ class TarSource(DownloadableFileSource):
                 yield tar
 
     def stage(self, directory):
+        self.stage_directory(FileBasedDirectory(directory))
+
+    # The members of the archive are imported straight into the directory,
+    # rather than extracted to disk and imported into CAS afterwards.
+    def stage_directory(self, directory):
         try:
             with self._get_tar() as tar:
                 base_dir = None
@@ -136,47 +141,38 @@ class TarSource(DownloadableFileSource):
                     if base_dir and not base_dir.endswith(os.sep):
                         base_dir = base_dir + os.sep
 
-                filter_function = functools.partial(self._extract_filter, base_dir)
-                if sys.version_info >= (3, 12):
-                    tar.extractall(path=directory, filter=filter_function)
-                else:
-                    filtered_members = []
-                    for member in tar.getmembers():
-                        member = filter_function(member, directory)
-                        if member is not None:
-                            filtered_members.append(member)
-                    tar.extractall(path=directory, members=filtered_members)
-
-        except (tarfile.TarError, OSError) as e:
+                members = (self._extract_filter(base_dir, member) for member in tar.getmembers())
+                directory._import_tar(tar, (member for member in members if member is not None))
+
+        except (tarfile.TarError, OSError, DirectoryError) as e:
             raise SourceError("{}: Error staging source: {}".format(self, e)) from e
 
     # Assert that a tarfile is safe to extract; specifically, make
     # sure that we don't do anything outside of the target
     # directory (this is possible, if, say, someone engineered a
     # tarfile to contain paths that start with ..).
-    def _assert_safe(self, member: tarfile.TarInfo, target_dir: str):
-        final_path = os.path.abspath(os.path.join(target_dir, member.path))
-        if not final_path.startswith(target_dir):
+    def _assert_safe(self, member: tarfile.TarInfo):
+        def is_outside(path):
+            path = os.path.normpath(path)
+            return os.path.isabs(path) or path == ".." or path.startswith("../")
+
+        if is_outside(member.path):
             raise SourceError(
                 "{}: Tarfile attempts to extract outside the staging area: "
-                "{} -> {}".format(self, member.path, final_path)
+                "{} -> {}".format(self, member.path, os.path.normpath(member.path))
             )
 
-        if member.islnk():
-            linked_path = os.path.abspath(os.path.join(target_dir, member.linkname))
-            if not linked_path.startswith(target_dir):
-                raise SourceError(
-                    "{}: Tarfile attempts to hardlink outside the staging area: "
-                    "{} -> {}".format(self, member.path, final_path)
-                )
+        if member.islnk() and is_outside(member.linkname):
+            raise SourceError(
+                "{}: Tarfile attempts to hardlink outside the staging area: "
+                "{} -> {}".format(self, member.path, os.path.normpath(member.linkname))
+            )
 
         # Don't need to worry about symlinks because they're just
         # files here and won't be able to do much harm once we are
         # in a sandbox.
 
-    def _extract_filter(
-        self, base_dir: Optional[str], member: tarfile.TarInfo, target_dir: str
-    ) -> Optional[tarfile.TarInfo]:
+    def _extract_filter(self, base_dir: Optional[str], member: tarfile.TarInfo) -> Optional[tarfile.TarInfo]:
         if base_dir:
             # Override and translate which filenames to extract
             L = len(base_dir)
@@ -206,7 +202,7 @@ class TarSource(DownloadableFileSource):
 
             member.path = member.path[L:]
 
-        self._assert_safe(member, target_dir)
+        self._assert_safe(member)
 
         # Skip device nodes
         if member.isdev():
@@ -67,14 +67,13 @@ class WorkspaceSource(Source):
         #
         # As a core plugin, we use some private API to optimize file hashing.
         #
-        # * Use Source._cache_directory() to prepare a Directory
+        # * Use Source._cache_local_path() to prepare a Directory, unless
+        #   the files are unchanged since they were last cached
         # * Do the regular staging activity into the Directory
         # * Use the hash of the cached digest as the unique key
         #
         if not self.__digest:
-            with self._cache_directory() as directory:
-                self.__do_stage(directory)
-                self.__digest = directory._get_digest()
+            self.__digest = self._cache_local_path(self.path, self.__do_stage, properties=["mtime"])
 
         return self.__digest.hash
 
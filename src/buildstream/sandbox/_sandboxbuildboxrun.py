@@ -24,6 +24,7 @@ from . import _SandboxFlags
 from .._exceptions import SandboxError, SandboxUnavailableError
 from .._platform import Platform
 from .._protos.build.bazel.remote.execution.v2 import remote_execution_pb2
+from .._scheduler.jobserver import JobServer, JOBSERVER_SANDBOX_PATH
 from ._sandboxreapi import SandboxREAPI
 
 
@@ -83,6 +84,20 @@ class SandboxBuildBoxRun(SandboxREAPI):
         if config.build_gid is not None and "platform:unixGID" not in cls._capabilities:
             raise SandboxUnavailableError("Configuring sandbox GID is not supported by buildbox-run.")
 
+    def _run(self, command, *, flags, cwd, env):
+        context = self._get_context()
+
+        # Hand over the jobserver shared by all builds to make
+        if context.jobserver and "bind-mount" in self._capabilities:
+            makeflags = JobServer.get_makeflags(env.get("MAKEFLAGS"))
+            if makeflags:
+                if JOBSERVER_SANDBOX_PATH not in self._get_mount_sources():
+                    self.mark_directory(JOBSERVER_SANDBOX_PATH)
+                    self._set_mount_source(JOBSERVER_SANDBOX_PATH, context.jobserver.path)
+                env = dict(env, MAKEFLAGS=makeflags)
+
+        return super()._run(command, flags=flags, cwd=cwd, env=env)
+
     def _execute_action(self, action, flags):
         stdout, stderr = self._get_output()
 
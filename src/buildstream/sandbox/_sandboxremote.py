@@ -274,7 +274,7 @@ class SandboxRemote(SandboxREAPI):
                 try:
                     local_missing_blobs = cascache.missing_blobs(missing_blobs)
                     if local_missing_blobs:
-                        artifactcache.fetch_missing_blobs(project, local_missing_blobs)
+                        artifactcache.fetch_missing_blobs_batch({project: local_missing_blobs})
                 except (grpc.RpcError, BstError) as e:
                     raise SandboxError("Failed to pull missing blobs from artifact cache: {}".format(e)) from e
 
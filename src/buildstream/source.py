@@ -216,6 +216,7 @@ Class Reference
 """
 
 import os
+import urllib.parse
 from contextlib import contextmanager
 from typing import Iterable, Iterator, Optional, Tuple, Dict, Any, Set, TYPE_CHECKING, Union
 from dataclasses import dataclass
@@ -265,6 +266,19 @@ class AliasSubstitution:
     _effective_alias: str
     _mirror: Union[SourceMirror, str]
 
+    # _get_host()
+    #
+    # Get the host which the health of this substitution is tracked for,
+    # the network location of mirror URIs or the name of mirror plugins.
+    #
+    # Returns:
+    #    (str): The host of the substitution
+    #
+    def _get_host(self) -> str:
+        if isinstance(self._mirror, str):
+            return urllib.parse.urlsplit(self._mirror).netloc or self._mirror
+        return "source-mirror:{}".format(self._mirror.name)
+
 
 class SourceFetcher:
     """SourceFetcher()
@@ -429,6 +443,9 @@ class Source(Plugin):
 
         self.__first_pass = meta.first_pass
 
+        # The mirror which is being fetched from, if any
+        self.__fetch_mirror = None  # type: Optional[AliasSubstitution]
+
         # cached values for commonly access values on the source
         self.__mirror_directory = None  # type: Optional[str]
 
@@ -1360,6 +1377,65 @@ class Source(Plugin):
 
         yield cas_dir
 
+    # _cache_local_path()
+    #
+    # Cache the content of a host local path and return the Digest of the
+    # cached directory, as done for local sources and workspaces.
+    #
+    # Staging local files requires hashing all of their content, to avoid
+    # this on every invocation the resulting digest is recorded in the
+    # persistent cache key index, along with a fingerprint of the file
+    # metadata. As long as the fingerprint is unchanged and the content
+    # is still available in CAS, the recorded digest is reused.
+    #
+    # Args:
+    #    path (str): The host local path being cached
+    #    stage (callable): A function which stages the path into the given Directory
+    #    properties (list): The node properties which are captured by `stage`
+    #
+    # Returns:
+    #    (Digest): The digest of the cached content
+    #
+    def _cache_local_path(self, path, stage, *, properties=None):
+        context = self._get_context()
+        cache = context.get_cascache()
+        index = context.cachekeyindex
+
+        identity = generate_key(
+            {"kind": self.get_kind(), "path": os.path.abspath(path), "properties": sorted(properties or [])}
+        )
+        fingerprint = index.fingerprint(path)
+
+        if fingerprint is not None:
+            digest = index.lookup(identity, fingerprint)
+            if digest is not None and cache.contains_directory(digest, with_files=True):
+                return digest
+
+        with self._cache_directory() as directory:
+            stage(directory)
+            digest = directory._get_digest()
+
+        if fingerprint is not None:
+            index.record(identity, fingerprint, digest)
+
+        return digest
+
+    # _record_first_byte_latency()
+    #
+    # Record how long the mirror which is being fetched from took to start
+    # responding, such that later fetches try the fastest mirrors first.
+    #
+    # Unlike the duration of fetches, the time to the first byte does not
+    # depend on the size of the source, sources which can measure it report
+    # it with this method.
+    #
+    # Args:
+    #    latency (float): The time to the first byte, in seconds
+    #
+    def _record_first_byte_latency(self, latency):
+        if self.__fetch_mirror:
+            self._get_context().mirrorhealth.record_latency(self.__fetch_mirror._get_host(), latency)
+
     #############################################################
     #                   Local Private Methods                   #
     #############################################################
@@ -1446,16 +1522,23 @@ class Source(Plugin):
 
                 alias = fetcher._get_alias()
                 last_error = None
-                for mirror in project.get_alias_uris(alias, first_pass=self.__first_pass, tracking=False):
+                for mirror in self.__rank_mirrors(
+                    project.get_alias_uris(alias, first_pass=self.__first_pass, tracking=False)
+                ):
+                    self.__fetch_mirror = mirror
                     try:
                         fetcher.fetch(mirror)
                     # FIXME: Need to consider temporary vs. permanent failures,
                     #        and how this works with retries.
                     except BstError as e:
+                        self.__record_mirror_failure(mirror, e)
                         last_error = e
                         continue
+                    finally:
+                        self.__fetch_mirror = None
 
                     # No error, we're done with this fetcher
+                    self.__record_mirror_success(mirror)
                     break
 
                 else:
@@ -1475,23 +1558,42 @@ class Source(Plugin):
                 return
 
             last_error = None
-            for mirror in project.get_alias_uris(alias, first_pass=self.__first_pass, tracking=False):
+            for mirror in self.__rank_mirrors(
+                project.get_alias_uris(alias, first_pass=self.__first_pass, tracking=False)
+            ):
 
                 new_source = self.__clone_for_uri(mirror)
+                new_source.__fetch_mirror = mirror
                 try:
                     new_source.fetch(**kwargs)
                 # FIXME: Need to consider temporary vs. permanent failures,
                 #        and how this works with retries.
                 except BstError as e:
+                    self.__record_mirror_failure(mirror, e)
                     last_error = e
                     continue
 
                 # No error, we're done here
+                self.__record_mirror_success(mirror)
                 return
 
             # Re raise the last detected error
             raise last_error
 
+    # Orders the mirrors to fetch from according to their health
+    def __rank_mirrors(self, mirrors):
+        return self._get_context().mirrorhealth.rank(mirrors, lambda mirror: mirror._get_host() if mirror else None)
+
+    def __record_mirror_success(self, mirror):
+        if mirror:
+            self._get_context().mirrorhealth.record_success(mirror._get_host())
+
+    # Only temporary errors, such as network errors, tell about the health of
+    # the mirror, other errors would also occur with the other mirrors
+    def __record_mirror_failure(self, mirror, error):
+        if mirror and error.temporary:
+            self._get_context().mirrorhealth.record_failure(mirror._get_host())
+
     # Tries to call track for every mirror, stopping once it succeeds
     def __do_track(self, **kwargs):
         project = self._get_project()
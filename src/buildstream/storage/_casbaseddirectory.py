@@ -18,10 +18,10 @@
 import os
 import stat
 import tarfile as tarfilelib
-from tarfile import TarFile
+from tarfile import TarFile, TarInfo
 from contextlib import contextmanager
 from io import StringIO, BytesIO
-from typing import Callable, Optional, Union, List, IO, Iterator, Dict
+from typing import Callable, Optional, Union, List, IO, Iterable, Iterator, Dict, Tuple
 
 from google.protobuf import timestamp_pb2
 
@@ -32,6 +32,18 @@ from .directory import Directory, DirectoryError, FileType, FileStat
 from ..utils import FileListResult, BST_ARBITRARY_TIMESTAMP
 
 
+# Files imported from tar archives up to this size are read into memory
+# and written to CAS in batches, larger files are streamed
+_TAR_BATCH_FILE_BYTES = 1024 * 1024
+
+# How many bytes of files imported from tar archives to keep in memory
+_TAR_BATCH_BYTES = 16 * 1024 * 1024
+
+# Maximum number of symlinks followed when opening the directory of a tar
+# archive member, like the limit of Linux
+_MAX_SYMLINKS = 40
+
+
 # _IndexEntry()
 #
 # An object to represent a file, used to track members of a CasBasedDirectory
@@ -386,6 +398,90 @@ class CasBasedDirectory(Directory):
 
         return result
 
+    def _import_tar(self, tar: TarFile, members: Iterable[TarInfo]) -> None:
+        # Directories already opened by their path
+        directories: Dict[str, CasBasedDirectory] = {}
+
+        # The entries of the imported files by their path, to resolve hard links
+        files: Dict[str, _IndexEntry] = {}
+
+        # The entries of the files waiting to be written to CAS in a batch
+        batch: List[Tuple[_IndexEntry, bytes]] = []
+        batch_bytes = 0
+
+        def flush_batch():
+            nonlocal batch, batch_bytes
+            if batch:
+                digests = self.__cas_cache.add_objects(buffers=[buffer for _, buffer in batch])
+                for (entry, _), digest in zip(batch, digests):
+                    entry.digest = digest
+                batch = []
+                batch_bytes = 0
+
+        for member in members:
+            path = os.path.normpath(member.name)
+            if path == ".":
+                continue
+
+            dirname, name = os.path.split(path)
+            subdir = directories.get(dirname)
+            if subdir is None:
+                subdir = self.__open_tar_directory(dirname.split("/"))
+                directories[dirname] = subdir
+
+            existing_entry = subdir.__index.get(name)
+            if existing_entry and existing_entry.type == FileType.DIRECTORY:
+                if member.isdir():
+                    continue
+
+                # Later members replace earlier ones, forget the replaced directories
+                directories = {}
+            elif existing_entry and existing_entry.type == FileType.SYMLINK:
+                # Forget the directories opened through the replaced symlink
+                directories = {}
+
+            if member.isdir():
+                entry = _IndexEntry(self.__cas_cache, name, FileType.DIRECTORY)
+                entry.directory = CasBasedDirectory(self.__cas_cache, parent=subdir, filename=name)
+            elif member.issym():
+                entry = _IndexEntry(self.__cas_cache, name, FileType.SYMLINK, target=member.linkname)
+            elif member.isfile() or member.islnk():
+                entry = _IndexEntry(
+                    self.__cas_cache, name, FileType.REGULAR_FILE, is_executable=bool(member.mode & stat.S_IXUSR)
+                )
+
+                link_target = files.get(os.path.normpath(member.linkname)) if member.islnk() else None
+                if link_target:
+                    if link_target.digest is None:
+                        flush_batch()
+                    entry.digest = link_target.digest
+                else:
+                    try:
+                        fileobj = tar.extractfile(member)
+                    except KeyError as e:
+                        raise DirectoryError(
+                            "Target of hard link {} not found: {}".format(member.name, member.linkname)
+                        ) from e
+
+                    if member.isfile() and member.size <= _TAR_BATCH_FILE_BYTES:
+                        buffer = fileobj.read()
+                        batch.append((entry, buffer))
+                        batch_bytes += len(buffer)
+                        if batch_bytes >= _TAR_BATCH_BYTES:
+                            flush_batch()
+                    else:
+                        entry.digest = self.__cas_cache.add_object_stream(fileobj)
+
+                files[path] = entry
+            else:
+                # Other file types cannot be stored in CAS
+                continue
+
+            subdir.__index[name] = entry
+            subdir.__invalidate_digest()
+
+        flush_batch()
+
     def _export_files(self, to_directory: str, *, can_link: bool = False, can_destroy: bool = False) -> None:
         #
         # This is documented to raise DirectoryError, if we are raising a system error
@@ -537,6 +633,10 @@ class CasBasedDirectory(Directory):
     #
     # Return the Digest for this directory.
     #
+    # The Directory protobufs of this directory and of all its modified
+    # subdirectories are serialized bottom-up, and written to CAS together
+    # in as few requests as possible.
+    #
     # Returns:
     #   (Digest): The Digest protobuf object for the Directory protobuf
     #
@@ -545,43 +645,75 @@ class CasBasedDirectory(Directory):
     #
     def _get_digest(self):
         if not self.__digest:
-            # Create updated Directory proto
-            pb2_directory = remote_execution_pb2.Directory()
+            pending: List[Tuple["CasBasedDirectory", remote_execution_pb2.Digest]] = []
+            buffers: Dict[str, bytes] = {}
 
-            if self.__subtree_read_only is not None:
-                node_property = pb2_directory.node_properties.properties.add()
-                node_property.name = "SubtreeReadOnly"
-                node_property.value = "true" if self.__subtree_read_only else "false"
+            self.__serialize(pending, buffers)
 
-            for name, entry in sorted(self.__index.items()):
-                if entry.type == FileType.DIRECTORY:
-                    dirnode = pb2_directory.directories.add()
-                    dirnode.name = name
-
-                    # Update digests for subdirectories in DirectoryNodes.
-                    # No need to call entry.get_directory().
-                    # If it hasn't been instantiated, digest must be up-to-date.
-                    subdir = entry.directory
-                    if subdir is not None:
-                        dirnode.digest.CopyFrom(subdir._get_digest())
-                    else:
-                        dirnode.digest.CopyFrom(entry.digest)
-                elif entry.type == FileType.REGULAR_FILE:
-                    filenode = pb2_directory.files.add()
-                    filenode.name = name
-                    filenode.digest.CopyFrom(entry.digest)
-                    filenode.is_executable = entry.is_executable
-                    if entry.mtime is not None:
-                        filenode.node_properties.mtime.CopyFrom(entry.mtime)
-                elif entry.type == FileType.SYMLINK:
-                    symlinknode = pb2_directory.symlinks.add()
-                    symlinknode.name = name
-                    symlinknode.target = entry.target
-
-            self.__digest = self.__cas_cache.add_object(buffer=pb2_directory.SerializeToString())
+            self.__cas_cache.add_objects(buffers=list(buffers.values()))
+
+            # Only consider the directories clean once their protobufs are in CAS
+            for directory, digest in pending:
+                directory.__digest = digest
 
         return self.__digest
 
+    # __serialize()
+    #
+    # Serialize the Directory protobuf of this directory and compute its digest,
+    # along with those of all modified subdirectories.
+    #
+    # Args:
+    #   pending (list): The list to append the modified directories and their digests to
+    #   buffers (dict): The dictionary to add the serialized protobufs to, by hash
+    #
+    # Returns:
+    #   (Digest): The Digest protobuf object for the Directory protobuf
+    #
+    def __serialize(self, pending, buffers):
+        if self.__digest:
+            return self.__digest
+
+        # Create updated Directory proto
+        pb2_directory = remote_execution_pb2.Directory()
+
+        if self.__subtree_read_only is not None:
+            node_property = pb2_directory.node_properties.properties.add()
+            node_property.name = "SubtreeReadOnly"
+            node_property.value = "true" if self.__subtree_read_only else "false"
+
+        for name, entry in sorted(self.__index.items()):
+            if entry.type == FileType.DIRECTORY:
+                dirnode = pb2_directory.directories.add()
+                dirnode.name = name
+
+                # Update digests for subdirectories in DirectoryNodes.
+                # No need to call entry.get_directory().
+                # If it hasn't been instantiated, digest must be up-to-date.
+                subdir = entry.directory
+                if subdir is not None:
+                    dirnode.digest.CopyFrom(subdir.__serialize(pending, buffers))
+                else:
+                    dirnode.digest.CopyFrom(entry.digest)
+            elif entry.type == FileType.REGULAR_FILE:
+                filenode = pb2_directory.files.add()
+                filenode.name = name
+                filenode.digest.CopyFrom(entry.digest)
+                filenode.is_executable = entry.is_executable
+                if entry.mtime is not None:
+                    filenode.node_properties.mtime.CopyFrom(entry.mtime)
+            elif entry.type == FileType.SYMLINK:
+                symlinknode = pb2_directory.symlinks.add()
+                symlinknode.name = name
+                symlinknode.target = entry.target
+
+        buffer = pb2_directory.SerializeToString()
+        digest = utils._message_digest(buffer)
+        buffers[digest.hash] = buffer
+        pending.append((self, digest))
+
+        return digest
+
     # __open_directory()
     #
     # Open a directory using a list of already separated path components
@@ -634,6 +766,62 @@ class CasBasedDirectory(Directory):
 
         return current_dir
 
+    # __open_tar_directory()
+    #
+    # Open the parent directory of a member of a tar archive, creating
+    # missing directories.
+    #
+    # Like when extracting the archive, symlinks to directories are
+    # followed, including symlinks imported earlier from the same archive.
+    # Absolute symlinks and parent directory references are resolved
+    # relative to this directory, such that they never point outside of it.
+    #
+    # Args:
+    #    paths: The separated path components of the directory
+    #
+    # Returns:
+    #    The opened directory
+    #
+    def __open_tar_directory(self, paths: List[str]) -> "CasBasedDirectory":
+        current_dir = self
+        # The parents of the current directory, up to this directory
+        parents: List[CasBasedDirectory] = []
+        pending = list(reversed(paths))
+        symlinks = 0
+
+        while pending:
+            element = pending.pop()
+            if not element or element == ".":
+                continue
+            if element == "..":
+                if parents:
+                    current_dir = parents.pop()
+                continue
+
+            entry = current_dir.__index.get(element)
+            if entry is None:
+                parents.append(current_dir)
+                current_dir = current_dir.__add_directory(element)
+            elif entry.type == FileType.DIRECTORY:
+                parents.append(current_dir)
+                current_dir = entry.get_directory(current_dir)
+            elif entry.type == FileType.SYMLINK:
+                assert entry.target is not None
+                symlinks += 1
+                if symlinks > _MAX_SYMLINKS:
+                    raise DirectoryError(
+                        "Too many levels of symbolic links in {}".format("/".join(paths)), reason="symlink-loop"
+                    )
+                if os.path.isabs(entry.target):
+                    current_dir = self
+                    parents = []
+                pending.extend(reversed(entry.target.split("/")))
+            else:
+                error = "Cannot open {}, which is a '{}' in the directory {}"
+                raise DirectoryError(error.format(element, entry.type, current_dir), reason="not-a-directory")
+
+        return current_dir
+
     # __populate_index()
     #
     # Populate the _IndexEntry for this digest
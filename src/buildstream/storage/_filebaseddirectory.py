@@ -18,9 +18,11 @@
 import os
 import shutil
 import stat
+import sys
+import tarfile as tarfilelib
 from contextlib import contextmanager
-from tarfile import TarFile
-from typing import Callable, Optional, Union, List, IO, Iterator
+from tarfile import TarFile, TarInfo
+from typing import Callable, Optional, Union, List, IO, Iterable, Iterator
 
 from .directory import Directory, DirectoryError, FileType, FileStat
 from .. import utils
@@ -285,6 +287,16 @@ class FileBasedDirectory(Directory):
 
         return import_result
 
+    def _import_tar(self, tar: TarFile, members: Iterable[TarInfo]) -> None:
+        try:
+            if sys.version_info >= (3, 12):
+                # The members were filtered already
+                tar.extractall(path=self.__external_directory, members=members, filter="fully_trusted")
+            else:
+                tar.extractall(path=self.__external_directory, members=list(members))
+        except (tarfilelib.TarError, OSError) as e:
+            raise DirectoryError("Error extracting tar archive: {}".format(e)) from e
+
     def _export_files(self, to_directory: str, *, can_link: bool = False, can_destroy: bool = False) -> None:
         if can_destroy:
             # Try a simple rename of the sandbox root; if that
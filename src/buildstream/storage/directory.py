@@ -43,8 +43,8 @@ of filesystem root directories.
 
 
 from contextlib import contextmanager
-from tarfile import TarFile
-from typing import Callable, Optional, Union, List, IO, Iterator
+from tarfile import TarFile, TarInfo
+from typing import Callable, Optional, Union, List, IO, Iterable, Iterator
 
 from .._exceptions import BstError
 from ..exceptions import ErrorDomain
@@ -449,6 +449,26 @@ class Directory:
     ) -> Optional[FileListResult]:
         raise NotImplementedError()
 
+    # _import_tar()
+    #
+    # Abstract method for backends to import members of a tar archive,
+    # without extracting the archive to a temporary directory first.
+    #
+    # The paths of the members are relative to this directory, and must
+    # have been checked not to point outside of it. Hard links whose target
+    # was not imported are imported as a copy of their target in the archive.
+    #
+    # Args:
+    #   tar: The TarFile to read the members from
+    #   members: The TarInfo objects of the members to import, in the
+    #            order of the archive. Device nodes are not supported.
+    #
+    # Raises:
+    #    DirectoryError: if any system error occurs.
+    #
+    def _import_tar(self, tar: TarFile, members: Iterable[TarInfo]) -> None:
+        raise NotImplementedError()
+
     # _export_files()
     #
     # Exports everything from this directory into to_directory.
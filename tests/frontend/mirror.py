@@ -468,6 +468,44 @@ def test_mirror_fetch_default_cmdline_overrides_config(cli, tmpdir):
         assert arrakis_pos < me_pos, "'{}' wasn't found before '{}'".format(arrakis_str, me_str)
 
 
+@pytest.mark.datafiles(DATA_DIR)
+@pytest.mark.usefixtures("datafiles")
+@pytest.mark.parametrize("temporary_failures", [True, False], ids=["temporary", "permanent"])
+def test_mirror_fetch_failing_mirrors_last(cli, tmpdir, temporary_failures):
+    project_dir = str(tmpdir)
+    element_dir = os.path.join(project_dir, "elements")
+    os.makedirs(element_dir, exist_ok=True)
+    _yaml.roundtrip_dump(generate_project(), os.path.join(project_dir, "project.conf"))
+
+    # Only the alias succeeds, after trying all mirrors
+    for name in ["first", "second"]:
+        element = generate_element(os.path.join(project_dir, "{}.txt".format(name)))
+        element["sources"][0]["urls"] = ["foo:repo1"]
+        element["sources"][0]["temporary-failures"] = temporary_failures
+        _yaml.roundtrip_dump(element, os.path.join(element_dir, "{}.bst".format(name)))
+
+    result = cli.run(project=project_dir, args=["source", "fetch", "first.bst"])
+    result.assert_success()
+    with open(os.path.join(project_dir, "first.txt"), encoding="utf-8") as f:
+        assert f.read().splitlines() == [
+            "Fetch foo:repo1 failed from OOF/repo1",
+            "Fetch foo:repo1 failed from OFO/repo1",
+            "Fetch foo:repo1 failed from ooF/repo1",
+            "Fetch foo:repo1 succeeded from FOO/repo1",
+        ]
+
+    # Mirrors which failed with temporary errors are tried last by the next
+    # sessions, other errors do not tell about the health of the mirrors
+    result = cli.run(project=project_dir, args=["source", "fetch", "second.bst"])
+    result.assert_success()
+    with open(os.path.join(project_dir, "second.txt"), encoding="utf-8") as f:
+        contents = f.read().splitlines()
+    if temporary_failures:
+        assert contents == ["Fetch foo:repo1 succeeded from FOO/repo1"]
+    else:
+        assert contents[0] == "Fetch foo:repo1 failed from OOF/repo1"
+
+
 @pytest.mark.datafiles(DATA_DIR)
 @pytest.mark.skipif("not pip_sample_packages()", reason=SAMPLE_PACKAGES_SKIP_REASON)
 def test_mirror_git_submodule_fetch(cli, tmpdir, datafiles):
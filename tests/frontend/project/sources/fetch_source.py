@@ -11,6 +11,7 @@ from buildstream import Source, SourceError, SourceFetcher
 #   fetch-succeeds:
 #     Foo/bar: true
 #     ooF/bar: false
+#   temporary-failures: false
 
 
 class FetchFetcher(SourceFetcher):
@@ -28,7 +29,7 @@ class FetchFetcher(SourceFetcher):
             message = "Fetch {} {} from {}\n".format(self.original_url, "succeeded" if success else "failed", url)
             f.write(message)
             if not success:
-                raise SourceError("Failed to fetch {}".format(url))
+                raise SourceError("Failed to fetch {}".format(url), temporary=self.source.temporary_failures)
 
 
 class FetchSource(Source):
@@ -40,6 +41,7 @@ class FetchSource(Source):
         self.original_urls = node.get_str_list("urls")
         self.output_file = node.get_str("output-text")
         self.fetch_succeeds = {key: value.as_bool() for key, value in node.get_mapping("fetch-succeeds", {}).items()}
+        self.temporary_failures = node.get_bool("temporary-failures", False)
 
         # First URL is the primary one for this test
         #
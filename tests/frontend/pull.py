@@ -625,3 +625,59 @@ def test_dynamic_build_plan(cli, tmpdir, datafiles):
         assert states[target] == "cached"
         assert states[runtime_dep] == "cached"
         assert states[build_dep] != "cached"
+
+
+# Tests that artifacts pulled with `lazy-pull` only come with the files
+# which are actually staged, the other files being fetched on demand
+@pytest.mark.datafiles(DATA_DIR)
+def test_lazy_pull(cli, tmpdir, datafiles):
+    project = str(datafiles)
+    element_name = "import-bin-dev.bst"
+    filter_name = "filter-bin.bst"
+
+    # An artifact with files of both the runtime and devel domains,
+    # and a filter element staging only the runtime domain of it
+    element = {
+        "kind": "import",
+        "sources": [{"kind": "local", "path": "files/bin-files"}, {"kind": "local", "path": "files/dev-files"}],
+    }
+    _yaml.roundtrip_dump(element, os.path.join(project, "elements", element_name))
+    element = {"kind": "filter", "build-depends": [element_name], "config": {"include": ["runtime"]}}
+    _yaml.roundtrip_dump(element, os.path.join(project, "elements", filter_name))
+
+    def cached_file(path):
+        digest = utils.sha256sum(os.path.join(project, "files", path))
+        return os.path.exists(os.path.join(cli.directory, "cas", "objects", digest[:2], digest[2:]))
+
+    with create_artifact_share(os.path.join(str(tmpdir), "artifactshare")) as share:
+
+        # First build the element and push it to the remote.
+        cli.configure({"artifacts": {"servers": [{"url": share.repo, "push": True}]}})
+        result = cli.run(project=project, args=["build", element_name])
+        result.assert_success()
+
+        # Now we've pushed, delete the user's local artifact cache directory
+        shutil.rmtree(os.path.join(cli.directory, "cas"))
+        shutil.rmtree(os.path.join(cli.directory, "artifacts"))
+
+        # Pull the element lazily, without its files
+        cli.configure({"cache": {"lazy-pull": True}})
+        result = cli.run(project=project, args=["artifact", "pull", element_name])
+        result.assert_success()
+
+        assert cli.get_element_state(project, element_name) == "cached"
+        assert not cached_file("bin-files/usr/bin/hello")
+        assert not cached_file("dev-files/usr/include/pony.h")
+
+        # Building the filter element only fetches the files of the runtime domain
+        result = cli.run(project=project, args=["build", filter_name])
+        result.assert_success()
+        assert cached_file("bin-files/usr/bin/hello")
+        assert not cached_file("dev-files/usr/include/pony.h")
+
+        # Checking out the element fetches the rest of its files
+        checkout = os.path.join(str(tmpdir), "checkout")
+        result = cli.run(project=project, args=["artifact", "checkout", element_name, "--directory", checkout])
+        result.assert_success()
+        assert os.path.exists(os.path.join(checkout, "usr", "include", "pony.h"))
+        assert cached_file("dev-files/usr/include/pony.h")
@@ -0,0 +1,467 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import os
+from concurrent.futures import Future
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import grpc
+import pytest
+
+from buildstream._artifactcache import REMOTE_ASSET_ARTIFACT_URN_TEMPLATE, ArtifactCache
+from buildstream._assetcache import AssetRemote
+from buildstream._cas import CASRemote
+from buildstream._exceptions import ArtifactError
+from buildstream._protos.build.bazel.remote.asset.v1 import remote_asset_pb2
+from buildstream._protos.buildstream.v2 import artifact_pb2
+from buildstream._remotespec import RemoteSpec, RemoteType
+from tests.testutils.fakecas import FakeRpcError, fake_cas_cache
+
+
+# An index remote resolving the artifacts of a dictionary
+#
+# Args:
+#    url (str): The url of the remote
+#    artifacts (dict): The digests of the artifact protos, by artifact name
+#    error (grpc.StatusCode): An error to fail all requests with
+#    hold (bool): Whether to leave requests unanswered until release() is called
+#
+class FakeAssetRemote(AssetRemote):
+    def __init__(self, url, artifacts=None, *, error=None, hold=False):
+        super().__init__(RemoteSpec(RemoteType.INDEX, url), None)
+        self.artifacts = artifacts if artifacts is not None else {}
+        self.error = error
+        self.hold = hold
+        self.requests = []
+        self.held = []
+
+    def _configure_protocols(self):
+        self.fetch_service = SimpleNamespace(FetchBlob=SimpleNamespace(future=self._fetch_blob_future))
+
+    def _fetch_blob_future(self, request):
+        self.requests.append(request)
+        future = Future()
+
+        def answer():
+            if not future.set_running_or_notify_cancel():
+                return
+
+            (uri,) = request.uris
+            name = uri[len(REMOTE_ASSET_ARTIFACT_URN_TEMPLATE.format("")) :]
+            if self.error:
+                future.set_exception(FakeRpcError(self.error, "Remote failed"))
+            elif name not in self.artifacts:
+                future.set_exception(FakeRpcError(grpc.StatusCode.NOT_FOUND))
+            else:
+                response = remote_asset_pb2.FetchBlobResponse(uri=uri)
+                response.blob_digest.CopyFrom(self.artifacts[name])
+                future.set_result(response)
+
+        if self.hold:
+            self.held.append(answer)
+        else:
+            answer()
+
+        return future
+
+    # Answer the requests which were held
+    def release(self):
+        for answer in self.held:
+            answer()
+        self.held = []
+
+
+# A storage remote whose blobs are those of the instance of the
+# fake buildbox-casd named after its url
+class FakeStorageRemote(CASRemote):
+    def __init__(self, url, cascache, *, push=False):
+        super().__init__(RemoteSpec(RemoteType.STORAGE, url, push=push), cascache)
+
+    def _configure_protocols(self):
+        self.local_cas_instance_name = self.spec.url
+
+
+# Configure the index and storage remotes of the projects
+def setup_remotes(artifactcache, project_remotes):
+    for project_name, remotes in project_remotes.items():
+        specs = []
+        for remote in remotes:
+            artifactcache._remotes[remote.spec] = SimpleNamespace(
+                index=remote if isinstance(remote, AssetRemote) else None,
+                storage=remote if isinstance(remote, CASRemote) else None,
+            )
+            specs.append(remote.spec)
+        artifactcache._project_specs[project_name] = specs
+
+
+# An artifact cache whose CASCache is backed by a fake buildbox-casd
+@contextmanager
+def fake_artifact_cache(path):
+    with fake_cas_cache(os.path.join(str(path), "cas")) as (cascache, casd):
+        context = MagicMock()
+        context.get_cascache.return_value = cascache
+        context.artifactdir = os.path.join(str(path), "refs")
+        context.cache_indexed_refs = False
+        context.cache_lazy_pull = False
+
+        artifactcache = ArtifactCache(context)
+        try:
+            yield artifactcache, casd
+        finally:
+            artifactcache.release_resources()
+
+
+def create_element(name, keys, *, project_name="project", workspace=None):
+    element = MagicMock()
+    element._get_artifact_query_keys.return_value = keys
+    element.get_artifact_name.side_effect = lambda key: "{}/{}/{}".format(project_name, name, key)
+    element._get_project.return_value.name = project_name
+    element._get_workspace.return_value = workspace
+    return element
+
+
+# Create the proto of an artifact, with its blobs added to the
+# given instance of the fake buildbox-casd
+def create_artifact(casd, artifact_name, files, *, buildtree=None, instance_name=""):
+    artifact = artifact_pb2.Artifact()
+    artifact.files.CopyFrom(casd.add_directory(files, instance_name))
+    if buildtree is not None:
+        artifact.buildtree.CopyFrom(casd.add_directory(buildtree, instance_name))
+    artifact.low_diversity_meta.CopyFrom(casd.add_blob(b"low " + artifact_name.encode(), instance_name))
+    artifact.high_diversity_meta.CopyFrom(casd.add_blob(b"high " + artifact_name.encode(), instance_name))
+    artifact.public_data.CopyFrom(casd.add_blob(b"public " + artifact_name.encode(), instance_name))
+    artifact.logs.add(name="log").digest.CopyFrom(casd.add_blob(b"log " + artifact_name.encode(), instance_name))
+    return artifact
+
+
+# Store the proto of an artifact in the ref store, with its blobs
+# added to the local cache of the fake buildbox-casd
+def store_artifact(artifactcache, casd, artifact_name, files):
+    artifact = create_artifact(casd, artifact_name, files)
+    artifactcache._refs.store([artifact_name], artifact.SerializeToString())
+    return artifact
+
+
+# Add an artifact to a storage remote, returning the digest of its proto
+def push_artifact(casd, remote, artifact_name, files, *, buildtree=None):
+    artifact = create_artifact(casd, artifact_name, files, buildtree=buildtree, instance_name=remote.spec.url)
+    return casd.add_blob(artifact.SerializeToString(), remote.spec.url)
+
+
+# The availability of an artifact as checked by Artifact.query_cache()
+# without the result of a batch query
+def query_artifact(artifactcache, artifact):
+    cas = artifactcache.cas
+    if str(artifact.files) and not cas.contains_directory(artifact.files, with_files=True):
+        return False
+    digests = [artifact.low_diversity_meta, artifact.high_diversity_meta, artifact.public_data]
+    digests.extend(logfile.digest for logfile in artifact.logs)
+    return cas.contains_files(digests)
+
+
+def test_query_cache_batch(tmp_path):
+    with fake_artifact_cache(tmp_path) as (artifactcache, casd):
+        artifacts = {
+            "project/complete/key": store_artifact(artifactcache, casd, "project/complete/key", {"a": b"a"}),
+            "project/missing-file/key": store_artifact(artifactcache, casd, "project/missing-file/key", {"b": b"b"}),
+            "project/missing-log/key": store_artifact(artifactcache, casd, "project/missing-log/key", {"c": b"c"}),
+        }
+        casd.remove_blob(casd.add_blob(b"b"))
+        casd.remove_blob(artifacts["project/missing-log/key"].logs[0].digest)
+
+        elements = [
+            create_element("complete", ["key"]),
+            create_element("missing-file", ["key"]),
+            create_element("missing-log", ["key"]),
+            create_element("uncached", ["key"]),
+        ]
+        artifactcache.query_cache_batch(elements)
+
+        for artifact_name, artifact in artifacts.items():
+            assert artifactcache.pop_batch_query_result(artifact_name) == query_artifact(artifactcache, artifact)
+
+        # Results are consumed, and not recorded for artifacts without a ref
+        assert artifactcache.pop_batch_query_result("project/complete/key") is None
+        assert artifactcache.pop_batch_query_result("project/uncached/key") is None
+
+
+def test_query_cache_batch_results_cleared(tmp_path):
+    with fake_artifact_cache(tmp_path) as (artifactcache, casd):
+        store_artifact(artifactcache, casd, "project/element/key", {"a": b"a"})
+
+        artifactcache.query_cache_batch([create_element("element", ["key"])])
+        artifactcache.clear_batch_query_results()
+
+        # A result which was not consumed cannot go stale once the blobs
+        # of the artifact are gone, the artifact is then queried again
+        casd.remove_blob(casd.add_blob(b"a"))
+        assert artifactcache.pop_batch_query_result("project/element/key") is None
+
+
+def test_resolve_artifacts_batch(tmp_path):
+    with fake_artifact_cache(tmp_path) as (artifactcache, casd):
+        digests = {name: casd.add_blob(name.encode()) for name in ["a", "b", "c"]}
+        first = FakeAssetRemote("http://first", {"a": digests["a"]})
+        failing = FakeAssetRemote("http://failing", error=grpc.StatusCode.UNAVAILABLE)
+        last = FakeAssetRemote("http://last", {"a": digests["c"], "b": digests["b"]})
+
+        resolved, failed = artifactcache._resolve_artifacts_batch(["a", "b", "c"], [first, failing, last])
+
+        # Artifacts are resolved by the first remote which has them, and
+        # only failed if no other remote could resolve them
+        assert resolved == {"a": digests["a"], "b": digests["b"]}
+        assert failed == {"c"}
+
+        # Remotes are only queried for the artifacts not resolved yet
+        assert len(first.requests) == 3
+        assert len(failing.requests) == 2
+        assert len(last.requests) == 2
+
+        # Only answers of the remotes are recorded
+        recorded = {
+            (remote, name, found)
+            for (remote, name, found), _ in artifactcache.context.remotequerycache.record.call_args_list
+        }
+        assert recorded == {
+            (first, "a", True),
+            (first, "b", False),
+            (first, "c", False),
+            (last, "b", True),
+            (last, "c", False),
+        }
+
+
+def test_pull_artifacts_storage_batch(tmp_path):
+    with fake_artifact_cache(tmp_path) as (artifactcache, casd):
+        remote = FakeStorageRemote("remote", artifactcache.cas)
+        digests = {
+            "project/a/key": push_artifact(casd, remote, "project/a/key", {"a": b"a"}, buildtree={"t": b"t"}),
+            "project/b/key": push_artifact(casd, remote, "project/b/key", {"b": b"b"}),
+            "project/c/key": push_artifact(casd, remote, "project/c/key", {"c": b"c"}),
+            "project/d/key": casd.add_blob(b"missing proto"),
+        }
+        casd.remove_blob(casd.add_blob(b"c", "remote"), "remote")
+        casd.remove_blob(digests["project/d/key"])
+
+        buildtrees = {"project/a/key": True, "project/b/key": False, "project/c/key": False, "project/d/key": False}
+        pulled = artifactcache._pull_artifacts_storage_batch(digests, buildtrees, remote)
+
+        # Only the completely pulled artifacts are stored
+        assert pulled == {"project/a/key", "project/b/key"}
+        for name in ["project/a/key", "project/b/key"]:
+            assert artifactcache._refs.contains(name)
+        for name in ["project/c/key", "project/d/key"]:
+            assert not artifactcache._refs.contains(name)
+
+        # Buildtrees are pulled along when requested
+        assert casd.has_blob(casd.add_blob(b"t", "remote"))
+
+
+def test_pull_batch(tmp_path):
+    with fake_artifact_cache(tmp_path) as (artifactcache, casd):
+        first_storage = FakeStorageRemote("first", artifactcache.cas)
+        last_storage = FakeStorageRemote("last", artifactcache.cas)
+        artifacts = {
+            "project/a/strong": push_artifact(casd, first_storage, "project/a/strong", {"a": b"a"}),
+            "project/b/weak": push_artifact(casd, last_storage, "project/b/weak", {"b": b"b"}),
+            "project/c/strong": push_artifact(casd, last_storage, "project/c/strong", {"c": b"c"}),
+        }
+        # The data of the last artifact is incomplete
+        casd.remove_blob(casd.add_blob(b"c", "last"), "last")
+
+        index = FakeAssetRemote("http://index", artifacts)
+        setup_remotes(artifactcache, {"project": [index, first_storage, last_storage]})
+
+        elements = [
+            create_element("a", ["strong", "weak"]),
+            create_element("b", ["strong", "weak"]),
+            create_element("c", ["strong"]),
+            create_element("d", ["strong"]),
+        ]
+        artifactcache.pull_batch(elements)
+
+        # Artifacts are pulled from the remote which has all of their data,
+        # the failed artifacts are left to pull() which reports the error
+        assert artifactcache._batch_pull_results == {
+            "project/a/strong": str(first_storage),
+            "project/b/strong": None,
+            "project/b/weak": str(last_storage),
+            "project/d/strong": None,
+        }
+        assert artifactcache._refs.contains("project/a/strong")
+        assert artifactcache._refs.contains("project/b/weak")
+        assert not artifactcache._refs.contains("project/c/strong")
+
+        # The results are consumed by pull()
+        assert artifactcache.pull(elements[0], "strong")
+        assert "project/a/strong" not in artifactcache._batch_pull_results
+        assert not artifactcache.pull(elements[3], "strong")
+
+
+def test_race_index_remotes_first_hit_wins(tmp_path):
+    with fake_artifact_cache(tmp_path) as (artifactcache, casd):
+        slow_digest = casd.add_blob(b"slow")
+        fast_digest = casd.add_blob(b"fast")
+        slow = FakeAssetRemote("http://slow", {"project/a/key": slow_digest}, hold=True)
+        fast = FakeAssetRemote("http://fast", {"project/a/key": fast_digest})
+        element = create_element("a", ["key"])
+
+        errors = []
+        digest = artifactcache._race_index_remotes(element, "key", "project/a/key", [slow, fast], errors)
+
+        # The first answer wins even if the remote comes later in the configuration
+        assert digest == fast_digest
+        assert not errors
+
+        # Answering the cancelled request has no effect
+        slow.release()
+
+        # The slow remote was cancelled and is at least as slow as the race
+        assert artifactcache._remote_latencies[slow.spec] >= artifactcache._remote_latencies[fast.spec]
+        assert artifactcache._sort_by_latency([slow, fast]) == [fast, slow]
+        artifactcache.context.remotequerycache.record.assert_called_once_with(fast, "project/a/key", True)
+
+
+def test_race_index_remotes_errors_fall_through(tmp_path):
+    with fake_artifact_cache(tmp_path) as (artifactcache, casd):
+        artifact_digest = casd.add_blob(b"artifact")
+        failing = FakeAssetRemote("http://failing", error=grpc.StatusCode.UNAVAILABLE)
+        missing = FakeAssetRemote("http://missing")
+        found = FakeAssetRemote("http://found", {"project/a/key": artifact_digest})
+        element = create_element("a", ["key"])
+
+        errors = []
+        digest = artifactcache._race_index_remotes(element, "key", "project/a/key", [failing, missing, found], errors)
+
+        # Errors and missing artifacts fall through to the other remotes
+        assert digest == artifact_digest
+        assert len(errors) == 1
+        element.warn.assert_called_once()
+
+        # Only the remotes which answered have their latency recorded
+        assert set(artifactcache._remote_latencies) == {missing.spec, found.spec}
+        recorded = [call.args for call in artifactcache.context.remotequerycache.record.call_args_list]
+        assert recorded == [(missing, "project/a/key", False), (found, "project/a/key", True)]
+
+        # No remote has the artifact
+        errors = []
+        assert artifactcache._race_index_remotes(element, "key", "project/b/key", [failing, missing], errors) is None
+        assert len(errors) == 1
+
+
+def test_record_latency(tmp_path):
+    with fake_artifact_cache(tmp_path) as (artifactcache, _):
+        first = FakeAssetRemote("http://first")
+        second = FakeAssetRemote("http://second")
+        third = FakeAssetRemote("http://third")
+        fourth = FakeAssetRemote("http://fourth")
+
+        # New measurements are smoothed with the previous ones
+        artifactcache._record_latency(first, 1.0)
+        artifactcache._record_latency(first, 2.0)
+        assert artifactcache._remote_latencies[first.spec] == pytest.approx(1.3)
+
+        # Remotes whose latency was not measured keep their order, last
+        artifactcache._record_latency(third, 0.5)
+        assert artifactcache._sort_by_latency([first, second, third, fourth]) == [third, first, second, fourth]
+
+
+def test_pull_storage_remotes_sorted_by_latency(tmp_path):
+    with fake_artifact_cache(tmp_path) as (artifactcache, casd):
+        artifactcache.context.cache_race_remotes = True
+        artifactcache.context.log_key_length = 8
+
+        slow = FakeStorageRemote("slow", artifactcache.cas)
+        fast = FakeStorageRemote("fast", artifactcache.cas)
+        artifact_digest = push_artifact(casd, slow, "project/a/key", {"a": b"a"})
+        push_artifact(casd, fast, "project/a/key", {"a": b"a"})
+        artifactcache._record_latency(slow, 2.0)
+        artifactcache._record_latency(fast, 1.0)
+
+        index = FakeAssetRemote("http://index", {"project/a/key": artifact_digest})
+        other_index = FakeAssetRemote("http://other-index")
+        setup_remotes(artifactcache, {"project": [index, other_index, slow, fast]})
+
+        # The data is pulled from the fastest storage remote first
+        element = create_element("a", ["key"])
+        assert artifactcache.pull(element, "key")
+        element.info.assert_called_with("Pulled artifact key <- {}".format(fast))
+
+
+# The digests requested from each storage remote with FetchMissingBlobs
+def fetch_requests(casd):
+    requests = {}
+    for request in casd.local_cas.FetchMissingBlobs.requests:
+        requests.setdefault(request.instance_name, []).append(sorted(digest.hash for digest in request.blob_digests))
+    casd.local_cas.FetchMissingBlobs.requests.clear()
+    return requests
+
+
+def test_fetch_missing_blobs_batch(tmp_path):
+    with fake_artifact_cache(tmp_path) as (artifactcache, casd):
+        first = MagicMock()
+        first.name = "first"
+        second = MagicMock()
+        second.name = "second"
+        shared = FakeStorageRemote("shared", artifactcache.cas)
+        other = FakeStorageRemote("other", artifactcache.cas)
+        setup_remotes(artifactcache, {"first": [shared], "second": [shared, other]})
+
+        common = casd.add_blob(b"common", "shared")
+        first_only = casd.add_blob(b"first", "shared")
+        second_only = casd.add_blob(b"second", "other")
+
+        artifactcache.fetch_missing_blobs_batch({first: [common, first_only], second: [common, second_only]})
+
+        # The blobs are deduplicated and fetched with one request per remote,
+        # only asking the remotes of the projects for the blobs still missing
+        for digest in [common, first_only, second_only]:
+            assert casd.has_blob(digest)
+        assert fetch_requests(casd) == {
+            "shared": [sorted([common.hash, first_only.hash, second_only.hash])],
+            "other": [[second_only.hash]],
+        }
+
+        # Remotes are not asked again for the blobs they did not have
+        casd.remove_blob(second_only)
+        artifactcache.fetch_missing_blobs_batch({first: [], second: [second_only]})
+        assert casd.has_blob(second_only)
+        assert fetch_requests(casd) == {"other": [[second_only.hash]]}
+
+        # Blobs of the first project are not fetched from the remotes of the second
+        casd.remove_blob(second_only)
+        with pytest.raises(ArtifactError):
+            artifactcache.fetch_missing_blobs_batch({first: [second_only]})
+        assert fetch_requests(casd) == {}
+
+
+def test_find_missing_blobs(tmp_path):
+    with fake_artifact_cache(tmp_path) as (artifactcache, casd):
+        project = MagicMock()
+        project.name = "project"
+        remote = FakeStorageRemote("remote", artifactcache.cas, push=True)
+        setup_remotes(artifactcache, {"project": [remote]})
+
+        present = casd.add_blob(b"present", "remote")
+        missing = casd.add_blob(b"missing")
+
+        assert artifactcache.find_missing_blobs(project, [present, missing]) == [missing]
+
+        # Blobs found on the remote are not looked up again,
+        # blobs which were missing may have been uploaded since
+        casd.cas.FindMissingBlobs.requests.clear()
+        assert artifactcache.find_missing_blobs(project, [present, missing]) == [missing]
+        (request,) = casd.cas.FindMissingBlobs.requests
+        assert [digest.hash for digest in request.blob_digests] == [missing.hash]
@@ -0,0 +1,77 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+from unittest.mock import MagicMock
+
+from buildstream._buildstats import BuildStats
+
+
+def create_element(project_name, name):
+    element = MagicMock()
+    element.name = name
+    element._get_project.return_value.name = project_name
+    return element
+
+
+def test_record_and_reload(tmp_path):
+    path = str(tmp_path.joinpath("build_stats"))
+    element = create_element("project", "element.bst")
+    other = create_element("other", "element.bst")
+
+    stats = BuildStats(path)
+    assert stats.get_duration(element) is None
+
+    stats.record(element, 10.0)
+    assert stats.get_duration(element) == 10.0
+    assert stats.get_duration(other) is None
+
+    # Durations are only persisted once saved
+    assert BuildStats(path).get_duration(element) is None
+    stats.save()
+    assert BuildStats(path).get_duration(element) == 10.0
+
+    # New durations are smoothed with the recorded ones
+    stats = BuildStats(path)
+    stats.record(element, 20.0)
+    stats.save()
+    assert BuildStats(path).get_duration(element) == 15.0
+
+
+def test_concurrent_sessions_merged(tmp_path):
+    path = str(tmp_path.joinpath("build_stats"))
+    first = create_element("project", "first.bst")
+    second = create_element("project", "second.bst")
+
+    stats1 = BuildStats(path)
+    stats2 = BuildStats(path)
+    stats1.record(first, 1.0)
+    stats2.record(second, 2.0)
+    stats1.save()
+    stats2.save()
+
+    stats = BuildStats(path)
+    assert stats.get_duration(first) == 1.0
+    assert stats.get_duration(second) == 2.0
+
+
+def test_invalid_file_ignored(tmp_path):
+    path = tmp_path.joinpath("build_stats")
+    path.write_text("not json")
+
+    stats = BuildStats(str(path))
+    element = create_element("project", "element.bst")
+    assert stats.get_duration(element) is None
+
+    stats.record(element, 3.0)
+    stats.save()
+    assert BuildStats(str(path)).get_duration(element) == 3.0
@@ -0,0 +1,56 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import os
+
+from buildstream import _cachekeyindex
+from buildstream._cachekeyindex import CacheKeyIndex
+from buildstream._protos.build.bazel.remote.execution.v2 import remote_execution_pb2
+
+
+def test_racy_files_not_fingerprinted(tmp_path):
+    path = tmp_path.joinpath("file")
+    path.write_text("content")
+
+    assert CacheKeyIndex.fingerprint(str(path)) is None
+
+
+def test_lookup(tmp_path, monkeypatch):
+    monkeypatch.setattr(_cachekeyindex, "_RACY_INTERVAL", 0)
+
+    directory = tmp_path.joinpath("files")
+    directory.mkdir()
+    path = directory.joinpath("file")
+    path.write_text("content")
+    mtime = os.stat(path).st_mtime
+
+    index_path = str(tmp_path.joinpath("index"))
+    digest = remote_execution_pb2.Digest(hash="a" * 64, size_bytes=42)
+
+    fingerprint = CacheKeyIndex.fingerprint(str(directory))
+    assert fingerprint is not None
+
+    index = CacheKeyIndex(index_path)
+    assert index.lookup("identity", fingerprint) is None
+    index.record("identity", fingerprint, digest)
+    index.save()
+
+    # The recorded digest is found by the next sessions
+    index = CacheKeyIndex(index_path)
+    assert index.lookup("identity", fingerprint) == digest
+    assert index.lookup("other", fingerprint) is None
+
+    # Modifying a file without changing its size changes the fingerprint
+    path.write_text("CONTENT")
+    os.utime(path, (mtime - 10, mtime - 10))
+    assert index.lookup("identity", CacheKeyIndex.fingerprint(str(directory))) is None
@@ -11,13 +11,20 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
+import hashlib
 import os
 import time
 from unittest.mock import MagicMock
 
-from buildstream._cas import casdprocessmanager
+import pytest
+
+from buildstream._cas import cascache as cascache_module, casdprocessmanager, casremote
+from buildstream._cas.casremote import CASRemote
 from buildstream._messenger import Messenger
+from buildstream._protos.build.bazel.remote.execution.v2 import remote_execution_pb2
+from buildstream._protos.google.bytestream import bytestream_pb2
 from tests.testutils import casd_cache
+from tests.testutils.fakecas import fake_cas_cache
 
 
 #
@@ -129,3 +136,224 @@ def test_casd_redirects_stderr_to_file_and_rotate(tmp_path, monkeypatch):
         assert len(existing_log_files) == n_max_log_files
         assert evicted_file not in existing_log_files
         assert existing_log_files[-1].read_text() == "hello\n"
+
+
+def test_contains_batch(tmp_path):
+    with fake_cas_cache(tmp_path) as (cascache, casd):
+        complete = casd.add_directory({"a": b"a", "sub/b": b"b"})
+        missing_file = casd.add_directory({"c": b"c", "sub/d": b"d"})
+        missing_subdir = casd.add_directory({"e": b"e", "sub/f": b"f"})
+        meta = casd.add_blob(b"meta")
+        missing_meta = casd.add_blob(b"missing meta")
+
+        casd.remove_blob(casd.add_blob(b"d"))
+        casd.remove_blob(casd.add_directory({"f": b"f"}))
+        casd.remove_blob(missing_meta)
+
+        entries = {
+            "complete": ([complete], [meta]),
+            "missing-file": ([missing_file], [meta]),
+            "missing-subdir": ([missing_subdir], []),
+            "missing-meta": ([complete], [missing_meta]),
+            "files-only": ([], [meta]),
+        }
+
+        for with_files in (True, False):
+            expected = {
+                key
+                for key, (directories, files) in entries.items()
+                if all(cascache.contains_directory(digest, with_files=with_files) for digest in directories)
+                and cascache.contains_files(files)
+            }
+
+            casd.cas.FindMissingBlobs.requests.clear()
+            assert cascache.contains_batch(entries, with_files=with_files) == expected
+
+            # The blobs of all entries are checked together
+            assert casd.cas.FindMissingBlobs.call_count == 1
+
+        assert cascache.contains_batch(entries, with_files=True) == {"complete", "files-only"}
+        assert cascache.contains_batch(entries, with_files=False) == {"complete", "missing-file", "files-only"}
+
+
+def test_contains_batch_cached_tree(tmp_path):
+    with fake_cas_cache(tmp_path) as (cascache, casd):
+        tree = casd.add_directory({"a": b"a", "sub/b": b"b"})
+        cascache._get_tree_blobs(tree)
+
+        # Directory protos of cached trees are still checked
+        casd.remove_blob(casd.add_directory({"b": b"b"}))
+        assert cascache.contains_batch({"tree": ([tree], [])}, with_files=False) == set()
+
+
+def test_contains_batch_deduplicates_blobs(tmp_path):
+    with fake_cas_cache(tmp_path) as (cascache, casd):
+        tree = casd.add_directory({"a": b"a", "b": b"b"})
+        meta = casd.add_blob(b"meta")
+
+        entries = {key: ([tree], [meta]) for key in range(3)}
+        assert cascache.contains_batch(entries) == {0, 1, 2}
+
+        (request,) = casd.cas.FindMissingBlobs.requests
+        assert len(request.blob_digests) == len({digest.hash for digest in request.blob_digests}) == 4
+
+
+def test_add_objects_batches_small_buffers(tmp_path, monkeypatch):
+    monkeypatch.setattr(cascache_module, "_MAX_PAYLOAD_BYTES", 100)
+
+    with fake_cas_cache(tmp_path) as (cascache, casd):
+        buffers = [b"a" * 40, b"b" * 40, b"c" * 200, b"d" * 40, b"e" * 10]
+        digests = cascache.add_objects(buffers=buffers)
+
+        # Small buffers are sent in batches which fit in a request,
+        # large buffers are captured from temporary files
+        batches = [[blob.data for blob in request.requests] for request in casd.cas.BatchUpdateBlobs.requests]
+        assert batches == [[b"a" * 40, b"b" * 40], [b"d" * 40, b"e" * 10]]
+        assert casd.local_cas.CaptureFiles.call_count == 1
+        assert len(casd.local_cas.CaptureFiles.requests[0].path) == 1
+
+        # The digests are returned in the order of the buffers
+        for buffer, digest in zip(buffers, digests):
+            with cascache.open(digest, "rb") as f:
+                assert f.read() == buffer
+
+
+def test_add_objects_captures_remote_buffers(tmp_path):
+    with fake_cas_cache(tmp_path) as (cascache, casd):
+        digests = cascache.add_objects(buffers=[b"a", b"b"], instance_name="remote")
+
+        # Objects for remotes are captured by casd, which uploads them
+        assert casd.cas.BatchUpdateBlobs.call_count == 0
+        assert casd.local_cas.CaptureFiles.call_count == 1
+        assert casd.local_cas.CaptureFiles.requests[0].instance_name == "remote"
+        assert all(casd.has_blob(digest, "remote") for digest in digests)
+
+
+def test_tree_blobs_cache(tmp_path):
+    with fake_cas_cache(tmp_path) as (cascache, casd):
+        first = casd.add_directory({"a": b"a", "sub/b": b"b"})
+        blobs = cascache._get_tree_blobs(first)
+        assert {digest.hash for digest in blobs} == {
+            first.hash,
+            casd.add_blob(b"a").hash,
+            casd.add_blob(b"b").hash,
+            casd.add_directory({"b": b"b"}).hash,
+        }
+
+        # Cached trees are not read again, even if their protos are gone
+        casd.remove_blob(first)
+        assert cascache._get_tree_blobs(first) == blobs
+
+
+def test_tree_blobs_cache_eviction(tmp_path, monkeypatch):
+    # Room for the blobs of two of the trees below
+    monkeypatch.setattr(cascache_module, "_TREE_BLOBS_CACHE_SIZE", 4)
+
+    with fake_cas_cache(tmp_path) as (cascache, casd):
+        trees = [casd.add_directory({"file": name.encode()}) for name in "abc"]
+
+        cascache._get_tree_blobs(trees[0])
+        cascache._get_tree_blobs(trees[1])
+
+        # Using the first tree makes the second one the least recently used
+        cascache._get_tree_blobs(trees[0])
+        cascache._get_tree_blobs(trees[2])
+
+        assert list(cascache._tree_blobs) == [trees[0].hash, trees[2].hash]
+        assert cascache._tree_blobs_count == 4
+
+        # Evicted trees are read again
+        casd.remove_blob(trees[1])
+        with pytest.raises(FileNotFoundError):
+            cascache._get_tree_blobs(trees[1])
+
+
+def test_tree_blobs_cache_keeps_large_tree(tmp_path, monkeypatch):
+    monkeypatch.setattr(cascache_module, "_TREE_BLOBS_CACHE_SIZE", 2)
+
+    with fake_cas_cache(tmp_path) as (cascache, casd):
+        small = casd.add_directory({"file": b"small"})
+        large = casd.add_directory({"a": b"a", "b": b"b", "c": b"c"})
+
+        cascache._get_tree_blobs(small)
+        cascache._get_tree_blobs(large)
+
+        # The most recent tree is kept even if it exceeds the size alone
+        assert list(cascache._tree_blobs) == [large.hash]
+        assert cascache._tree_blobs_count == 4
+
+
+def test_fetch_batch(tmp_path):
+    with fake_cas_cache(tmp_path) as (cascache, casd):
+        remote = CASRemote(None, cascache)
+        remote.init()
+        remote.local_cas_instance_name = "remote"
+
+        complete = casd.add_directory({"a": b"a", "sub/b": b"b"}, "remote")
+        shared = casd.add_directory({"a": b"a", "c": b"c"}, "remote")
+        missing_file = casd.add_directory({"d": b"d"}, "remote")
+        meta = casd.add_blob(b"meta", "remote")
+        casd.remove_blob(casd.add_blob(b"d", "remote"), "remote")
+
+        entries = {
+            "complete": ([complete], [meta]),
+            "shared": ([shared], [meta]),
+            "missing-file": ([missing_file], [meta]),
+            "missing-tree": ([casd.add_directory({"e": b"e"})], []),
+        }
+        casd.remove_blob(entries["missing-tree"][0][0])
+
+        assert cascache.fetch_batch(remote, entries) == {"complete", "shared"}
+        assert cascache.contains_batch(entries) == {"complete", "shared"}
+
+        # The blobs of all entries are fetched together, each of them once
+        fetched = [
+            digest.hash for request in casd.local_cas.FetchMissingBlobs.requests for digest in request.blob_digests
+        ]
+        assert len(fetched) == len(set(fetched))
+        assert casd.local_cas.FetchMissingBlobs.call_count == 1
+
+
+def test_fetch_batch_without_files(tmp_path):
+    with fake_cas_cache(tmp_path) as (cascache, casd):
+        remote = CASRemote(None, cascache)
+        remote.init()
+        remote.local_cas_instance_name = "remote"
+
+        tree = casd.add_directory({"a": b"a", "sub/b": b"b"}, "remote")
+
+        assert cascache.fetch_batch(remote, {"tree": ([tree], [])}, with_files=False) == {"tree"}
+        assert cascache.contains_directory(tree, with_files=False)
+        assert not cascache.contains_directory(tree, with_files=True)
+
+
+def test_fetch_blobs_streamed(tmp_path, monkeypatch):
+    monkeypatch.setattr(casremote, "_STREAM_THRESHOLD_BYTES", 10)
+    monkeypatch.setattr(cascache_module, "_PROGRESS_UNIT_BYTES", 1)
+
+    with fake_cas_cache(tmp_path) as (cascache, casd):
+        remote = CASRemote(None, cascache)
+        remote.init()
+        remote.local_cas_instance_name = "remote"
+
+        small = casd.add_blob(b"small", "remote")
+
+        # Large blobs are read from the remote directly
+        large_data = b"large" * 10
+        large = remote_execution_pb2.Digest(hash=hashlib.sha256(large_data).hexdigest(), size_bytes=len(large_data))
+        remote.spec = MagicMock(instance_name="main")
+        remote.bytestream = MagicMock()
+        remote.bytestream.Read.side_effect = lambda request, metadata: iter(
+            [bytestream_pb2.ReadResponse(data=large_data[request.read_offset :])]
+        )
+
+        task = MagicMock()
+        cascache.fetch_blobs(remote, [small, large], task=task)
+
+        assert not cascache.missing_blobs([small, large])
+        (request,), _ = remote.bytestream.Read.call_args
+        assert request.resource_name == "main/blobs/{}/{}".format(large.hash, large.size_bytes)
+        task.set_current_progress.assert_called_with(small.size_bytes + large.size_bytes)
+
+        # The read blob was moved into the local cache
+        assert not os.listdir(cascache.tmpdir)
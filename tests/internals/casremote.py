@@ -0,0 +1,377 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import hashlib
+import os
+from concurrent.futures import Future
+from unittest.mock import MagicMock
+
+import grpc
+import pytest
+
+from buildstream._cas import cascompression, casremote
+from buildstream._cas.cascompression import Compressor
+from buildstream._cas.casremote import BlobNotFound, _CASBatchRead, _CASBatchUpdate, _CASStream
+from buildstream._exceptions import CASRemoteError
+from buildstream._protos.build.bazel.remote.execution.v2 import remote_execution_pb2
+from buildstream._protos.build.buildgrid import local_cas_pb2
+from buildstream._protos.google.bytestream import bytestream_pb2
+from buildstream._protos.google.rpc import code_pb2
+
+
+# A fake method of buildbox-casd which records the requests in flight,
+# and answers them with the given failed responses.
+class FakeMethod:
+    def __init__(self, response_class, failures=None):
+        self.response_class = response_class
+        self.failures = failures or {}
+        self.requests = []
+        self.in_flight = []
+        self.max_in_flight = 0
+
+    def future(self, request):
+        self.requests.append(request)
+
+        response = self.response_class()
+        for digest in request.blob_digests:
+            if digest.hash in self.failures:
+                failure = response.responses.add()
+                failure.digest.CopyFrom(digest)
+                failure.status.code = self.failures[digest.hash]
+
+        future = Future()
+        self.in_flight.append(future)
+        self.max_in_flight = max(self.max_in_flight, len(self.in_flight))
+
+        # Complete the request once the caller waits for it
+        def result(timeout=None):
+            self.in_flight.remove(future)
+            future.set_result(response)
+            return Future.result(future, timeout)
+
+        future.result = result
+        return future
+
+
+def create_remote(method_name, method):
+    remote = MagicMock()
+    remote.local_cas_instance_name = "instance"
+    remote.compressor = Compressor.IDENTITY
+    remote.bytestream = None
+    remote.call_metadata = ()
+    setattr(remote.cascache.get_local_cas.return_value, method_name, method)
+    return remote
+
+
+def create_digest(name, size):
+    return remote_execution_pb2.Digest(hash=name, size_bytes=size)
+
+
+def test_batch_read_chunks_by_bytes(monkeypatch):
+    monkeypatch.setattr(casremote, "_MAX_REQUEST_BYTES", 100)
+
+    method = FakeMethod(local_cas_pb2.FetchMissingBlobsResponse)
+    batch = _CASBatchRead(create_remote("FetchMissingBlobs", method), max_in_flight=2)
+    for name, size in [("a", 60), ("b", 40), ("c", 1), ("d", 500), ("e", 10)]:
+        batch.add(create_digest(name, size))
+    batch.send()
+
+    assert [[digest.hash for digest in request.blob_digests] for request in method.requests] == [
+        ["a", "b"],
+        ["c"],
+        ["d"],
+        ["e"],
+    ]
+    assert all(request.instance_name == "instance" for request in method.requests)
+    assert method.max_in_flight == 2
+    assert not method.in_flight
+
+
+def test_batch_read_missing_blobs(monkeypatch):
+    monkeypatch.setattr(casremote, "_MAX_REQUEST_BYTES", 10)
+
+    method = FakeMethod(local_cas_pb2.FetchMissingBlobsResponse, failures={"b": code_pb2.NOT_FOUND})
+    batch = _CASBatchRead(create_remote("FetchMissingBlobs", method))
+    for name in ["a", "b", "c"]:
+        batch.add(create_digest(name, 10))
+
+    missing_blobs = []
+    batch.send(missing_blobs=missing_blobs)
+    assert [digest.hash for digest in missing_blobs] == ["b"]
+
+    batch = _CASBatchRead(create_remote("FetchMissingBlobs", method))
+    batch.add(create_digest("b", 10))
+    with pytest.raises(BlobNotFound):
+        batch.send()
+
+
+def test_batch_update_error_cancels_requests(monkeypatch):
+    monkeypatch.setattr(casremote, "_MAX_REQUEST_BYTES", 10)
+
+    method = FakeMethod(local_cas_pb2.UploadMissingBlobsResponse, failures={"a": code_pb2.RESOURCE_EXHAUSTED})
+    batch = _CASBatchUpdate(create_remote("UploadMissingBlobs", method), max_in_flight=3)
+    for name in ["a", "b", "c", "d"]:
+        batch.add(create_digest(name, 10))
+
+    with pytest.raises(CASRemoteError) as exc:
+        batch.send()
+
+    assert exc.value.reason == "cache-too-full"
+    assert len(method.requests) == 3
+    assert all(future.cancelled() for future in method.in_flight)
+
+
+def test_present_blobs():
+    remote = casremote.CASRemote(None, MagicMock())
+
+    digests = [create_digest(name, 10) for name in ["a", "b", "c"]]
+    remote.add_present_blobs(digests[:2])
+
+    assert [digest.hash for digest in remote.filter_present_blobs(iter(digests))] == ["c"]
+
+
+def test_missing_blobs():
+    remote = casremote.CASRemote(None, MagicMock())
+
+    digests = [create_digest(name, 10) for name in ["a", "b", "c"]]
+    remote.add_missing_blobs(digests[:2])
+    assert [digest.hash for digest in remote.filter_missing_blobs(iter(digests))] == ["c"]
+
+    # Uploaded blobs are no longer considered missing
+    remote.add_present_blobs(digests[:1])
+    assert [digest.hash for digest in remote.filter_missing_blobs(digests)] == ["a", "c"]
+    assert [digest.hash for digest in remote.filter_present_blobs(digests)] == ["b", "c"]
+
+
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, code):
+        super().__init__()
+        self._code = code
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._code.name
+
+
+# A fake ByteStream service, whose transfers are interrupted after
+# the given number of bytes, once per transfer.
+class FakeByteStream:
+    def __init__(self, blob, interrupt_after):
+        self.blob = blob
+        self.interrupt_after = interrupt_after
+        self.interrupted = set()
+        self.received = bytearray()
+        self.resource_names = []
+
+    def Read(self, request, metadata=None):
+        self.resource_names.append(request.resource_name)
+        end = request.read_offset + request.read_limit
+        offset = request.read_offset
+        while offset < end:
+            # Interrupt each range once, resumed reads of a range end at the same offset
+            if offset - request.read_offset >= self.interrupt_after and end not in self.interrupted:
+                self.interrupted.add(end)
+                raise FakeRpcError(grpc.StatusCode.UNAVAILABLE)
+
+            data = self.blob[offset : min(offset + 10, end)]
+            offset += len(data)
+            yield bytestream_pb2.ReadResponse(data=data)
+
+    def Write(self, requests, metadata=None):
+        for request in requests:
+            self.resource_names.append(request.resource_name)
+            assert request.write_offset == len(self.received)
+            self.received += request.data
+            if len(self.received) >= self.interrupt_after and not self.interrupted:
+                self.interrupted.add(0)
+                # Lose the data of the last request
+                del self.received[request.write_offset :]
+                raise FakeRpcError(grpc.StatusCode.UNAVAILABLE)
+
+        return bytestream_pb2.WriteResponse(committed_size=len(self.received))
+
+    def QueryWriteStatus(self, request, metadata=None):
+        return bytestream_pb2.QueryWriteStatusResponse(committed_size=len(self.received))
+
+
+# A remote whose blobs are streamed directly with the given ByteStream service
+def create_stream_remote(bytestream):
+    remote = create_remote("FetchMissingBlobs", None)
+    remote.spec.instance_name = "main"
+    remote.bytestream = bytestream
+    return remote
+
+
+def test_stream_read_resumes(tmpdir, monkeypatch):
+    monkeypatch.setattr(casremote, "_STREAM_RANGE_BYTES", 100)
+
+    blob = os.urandom(250)
+    digest = create_digest(hashlib.sha256(blob).hexdigest(), len(blob))
+    bytestream = FakeByteStream(blob, 30)
+    remote = create_stream_remote(bytestream)
+
+    progress = []
+    path = os.path.join(str(tmpdir), "blob")
+    _CASStream(remote, progress=progress.append).read(digest, path)
+
+    with open(path, "rb") as f:
+        assert f.read() == blob
+    assert sum(progress) == len(blob)
+
+    # Each of the three ranges was interrupted and resumed once
+    assert bytestream.interrupted == {100, 200, 250}
+
+    # The blob was read from the remote directly, rather than through buildbox-casd
+    assert all(name == "main/blobs/{}/250".format(digest.hash) for name in bytestream.resource_names)
+    remote.cascache.get_bytestream.assert_not_called()
+
+
+def test_stream_write_resumes(tmpdir, monkeypatch):
+    monkeypatch.setattr(casremote, "_MAX_PAYLOAD_BYTES", 10)
+
+    blob = os.urandom(95)
+    digest = create_digest(hashlib.sha256(blob).hexdigest(), len(blob))
+    bytestream = FakeByteStream(blob, 40)
+    remote = create_stream_remote(bytestream)
+
+    path = os.path.join(str(tmpdir), "blob")
+    with open(path, "wb") as f:
+        f.write(blob)
+
+    progress = []
+    _CASStream(remote, progress=progress.append).write(digest, path)
+
+    assert bytes(bytestream.received) == blob
+    assert sum(progress) == len(blob)
+    assert bytestream.interrupted == {0}
+    assert len(set(bytestream.resource_names)) == 1
+    assert bytestream.resource_names[0].startswith("main/uploads/")
+    remote.cascache.get_bytestream.assert_not_called()
+
+
+def test_stream_read_remote_cache(tmpdir):
+    blob = os.urandom(50)
+    digest = create_digest(hashlib.sha256(blob).hexdigest(), len(blob))
+    bytestream = FakeByteStream(blob, len(blob))
+
+    # The remote cache of buildbox-casd is only reachable through buildbox-casd
+    remote = create_remote("FetchMissingBlobs", None)
+    remote.cascache.get_bytestream.return_value = bytestream
+
+    path = os.path.join(str(tmpdir), "blob")
+    _CASStream(remote).read(digest, path)
+
+    with open(path, "rb") as f:
+        assert f.read() == blob
+    assert bytestream.resource_names == ["instance/blobs/{}/50".format(digest.hash)]
+
+
+def test_stream_read_missing_blob(tmpdir):
+    digest = create_digest("a", 10)
+    remote = create_stream_remote(MagicMock())
+    remote.bytestream.Read.side_effect = FakeRpcError(grpc.StatusCode.NOT_FOUND)
+
+    with pytest.raises(BlobNotFound):
+        _CASStream(remote).read(digest, os.path.join(str(tmpdir), "blob"))
+
+
+# A fake ByteStream service of a remote serving compressed blobs, whose
+# transfers are interrupted after the given number of bytes, once.
+class FakeCompressedByteStream:
+    def __init__(self, blob, interrupt_after):
+        self.blob = blob
+        self.interrupt_after = interrupt_after
+        self.interrupted = False
+        self.received = None
+        self.resource_names = []
+
+    def Read(self, request, metadata=None):
+        self.resource_names.append(request.resource_name)
+        assert not request.read_limit
+
+        data = cascompression.compress(Compressor.DEFLATE, self.blob[request.read_offset :])
+        for offset in range(0, len(data), 10):
+            if offset >= self.interrupt_after and not self.interrupted:
+                self.interrupted = True
+                raise FakeRpcError(grpc.StatusCode.UNAVAILABLE)
+            yield bytestream_pb2.ReadResponse(data=data[offset : offset + 10])
+
+    def Write(self, requests, metadata=None):
+        compressed = bytearray()
+        for request in requests:
+            self.resource_names.append(request.resource_name)
+            assert request.write_offset == len(compressed)
+            compressed += request.data
+            if len(compressed) >= self.interrupt_after and not self.interrupted:
+                self.interrupted = True
+                raise FakeRpcError(grpc.StatusCode.UNAVAILABLE)
+
+        assert request.finish_write
+        self.received = cascompression.decompress(Compressor.DEFLATE, bytes(compressed))
+        return bytestream_pb2.WriteResponse(committed_size=len(compressed))
+
+
+def create_compressed_remote(bytestream):
+    remote = create_stream_remote(bytestream)
+    remote.compressor = Compressor.DEFLATE
+    return remote
+
+
+def test_stream_read_compressed_resumes(tmpdir, monkeypatch):
+    blob = os.urandom(250)
+    digest = create_digest(hashlib.sha256(blob).hexdigest(), len(blob))
+    bytestream = FakeCompressedByteStream(blob, 100)
+    remote = create_compressed_remote(bytestream)
+
+    progress = []
+    path = os.path.join(str(tmpdir), "blob")
+    _CASStream(remote, progress=progress.append).read(digest, path)
+
+    with open(path, "rb") as f:
+        assert f.read() == blob
+    assert sum(progress) == len(blob)
+    assert bytestream.interrupted
+    assert all(
+        name == "main/compressed-blobs/deflate/{}/250".format(digest.hash) for name in bytestream.resource_names
+    )
+    remote.cascache.get_bytestream.assert_not_called()
+
+
+def test_stream_write_compressed_restarts(tmpdir, monkeypatch):
+    monkeypatch.setattr(casremote, "_MAX_PAYLOAD_BYTES", 10)
+
+    # Compressible data such that some requests carry no compressed data
+    blob = bytes(range(10)) * 50
+    digest = create_digest(hashlib.sha256(blob).hexdigest(), len(blob))
+    bytestream = FakeCompressedByteStream(blob, 5)
+    remote = create_compressed_remote(bytestream)
+
+    path = os.path.join(str(tmpdir), "blob")
+    with open(path, "wb") as f:
+        f.write(blob)
+
+    progress = []
+    _CASStream(remote, progress=progress.append).write(digest, path)
+
+    assert bytestream.received == blob
+    assert sum(progress) == len(blob)
+    assert bytestream.interrupted
+
+    # The interrupted upload was restarted with a new resource name
+    assert len(set(bytestream.resource_names)) == 2
+    assert all(name.startswith("main/uploads/") for name in bytestream.resource_names)
+    assert all(
+        name.endswith("/compressed-blobs/deflate/{}/500".format(digest.hash)) for name in bytestream.resource_names
+    )
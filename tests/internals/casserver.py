@@ -0,0 +1,260 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import hashlib
+from unittest.mock import MagicMock
+
+import pytest
+
+from buildstream._cas import cascompression
+from buildstream._cas.cascompression import Compressor
+from buildstream._cas.casserver import _ByteStreamServicer, _ContentAddressableStorageServicer
+from buildstream._protos.build.bazel.remote.execution.v2 import remote_execution_pb2
+from buildstream._protos.google.bytestream import bytestream_pb2
+from buildstream._protos.google.rpc import code_pb2
+
+
+# The data of the test blob, large enough to be transferred in several
+# chunks, and compressible
+DATA = b"".join(hashlib.sha256(str(i % 64).encode()).digest() for i in range(4096))
+DIGEST = remote_execution_pb2.Digest(hash=hashlib.sha256(DATA).hexdigest(), size_bytes=len(DATA))
+
+CHUNK_SIZE = 1024
+
+# A compressor which no server supports
+UNSUPPORTED_COMPRESSOR = max(Compressor.Value.values()) + 1
+
+
+class Aborted(Exception):
+    pass
+
+
+# The services of buildbox-casd used by the servicers, serving the
+# blobs of a dictionary uncompressed
+class FakeCASD:
+    def __init__(self):
+        self.blobs = {}
+        self.read_requests = []
+        self.write_requests = []
+        self.batch_read_requests = []
+        self.batch_update_requests = []
+
+        self.bytestream = MagicMock()
+        self.bytestream.Read.side_effect = self._read
+        self.bytestream.Write.side_effect = self._write
+        self.cas = MagicMock()
+        self.cas.BatchReadBlobs.side_effect = self._batch_read_blobs
+        self.cas.BatchUpdateBlobs.side_effect = self._batch_update_blobs
+
+    def get_bytestream(self):
+        return self.bytestream
+
+    def get_cas(self):
+        return self.cas
+
+    def _read(self, request):
+        self.read_requests.append(request)
+        data = self.blobs[request.resource_name.split("/")[-2]][request.read_offset :]
+        for offset in range(0, len(data), CHUNK_SIZE):
+            yield bytestream_pb2.ReadResponse(data=data[offset : offset + CHUNK_SIZE])
+
+    def _write(self, requests):
+        data = b""
+        for request in requests:
+            self.write_requests.append(request)
+            assert request.write_offset == len(data)
+            data += request.data
+        self.blobs[hashlib.sha256(data).hexdigest()] = data
+        return bytestream_pb2.WriteResponse(committed_size=len(data))
+
+    def _batch_read_blobs(self, request):
+        self.batch_read_requests.append(request)
+        response = remote_execution_pb2.BatchReadBlobsResponse()
+        for digest in request.digests:
+            blob_response = response.responses.add(digest=digest)
+            if digest.hash in self.blobs:
+                blob_response.data = self.blobs[digest.hash]
+                blob_response.status.code = code_pb2.OK
+            else:
+                blob_response.status.code = code_pb2.NOT_FOUND
+        return response
+
+    def _batch_update_blobs(self, request):
+        self.batch_update_requests.append(request)
+        response = remote_execution_pb2.BatchUpdateBlobsResponse()
+        for blob_request in request.requests:
+            self.blobs[blob_request.digest.hash] = blob_request.data
+            response.responses.add(digest=blob_request.digest).status.code = code_pb2.OK
+        return response
+
+
+def create_context():
+    context = MagicMock()
+    context.abort.side_effect = Aborted
+    return context
+
+
+def resource_name(compressor, *, upload=False):
+    prefix = "instance/uploads/uuid" if upload else "instance"
+    return "{}/compressed-blobs/{}/{}/{}".format(
+        prefix, cascompression.compressor_name(compressor), DIGEST.hash, DIGEST.size_bytes
+    )
+
+
+@pytest.fixture(params=cascompression.supported_compressors(), ids=cascompression.compressor_name)
+def compressor(request):
+    return request.param
+
+
+def test_read_compressed(compressor):
+    casd = FakeCASD()
+    casd.blobs[DIGEST.hash] = DATA
+    servicer = _ByteStreamServicer(casd, enable_push=False)
+
+    request = bytestream_pb2.ReadRequest(resource_name=resource_name(compressor))
+    responses = list(servicer.Read(request, create_context()))
+
+    # The blob is read uncompressed from buildbox-casd and streamed compressed
+    compressed = b"".join(response.data for response in responses)
+    assert len(compressed) < len(DATA)
+    assert cascompression.decompress(compressor, compressed) == DATA
+
+    (casd_request,) = casd.read_requests
+    assert casd_request.resource_name == "instance/blobs/{}/{}".format(DIGEST.hash, DIGEST.size_bytes)
+
+
+def test_read_compressed_with_limit(compressor):
+    casd = FakeCASD()
+    casd.blobs[DIGEST.hash] = DATA
+    servicer = _ByteStreamServicer(casd, enable_push=False)
+
+    request = bytestream_pb2.ReadRequest(resource_name=resource_name(compressor), read_limit=10)
+    with pytest.raises(Aborted):
+        list(servicer.Read(request, create_context()))
+    assert not casd.read_requests
+
+
+def test_write_compressed(compressor):
+    casd = FakeCASD()
+    servicer = _ByteStreamServicer(casd, enable_push=True)
+
+    compressed = cascompression.compress(compressor, DATA)
+    chunks = [compressed[offset : offset + CHUNK_SIZE] for offset in range(0, len(compressed), CHUNK_SIZE)]
+    assert len(chunks) > 1
+
+    def requests():
+        offset = 0
+        for index, chunk in enumerate(chunks):
+            yield bytestream_pb2.WriteRequest(
+                resource_name=resource_name(compressor, upload=True) if index == 0 else "",
+                write_offset=offset,
+                data=chunk,
+                finish_write=index == len(chunks) - 1,
+            )
+            offset += len(chunk)
+
+    response = servicer.Write(requests(), create_context())
+
+    # The blob is decompressed on the fly and written uncompressed to buildbox-casd
+    assert response.committed_size == len(compressed)
+    assert casd.blobs[DIGEST.hash] == DATA
+    assert casd.write_requests[0].resource_name == "instance/uploads/uuid/blobs/{}/{}".format(
+        DIGEST.hash, DIGEST.size_bytes
+    )
+    assert casd.write_requests[-1].finish_write
+
+
+def test_write_compressed_corrupt(compressor):
+    casd = FakeCASD()
+    servicer = _ByteStreamServicer(casd, enable_push=True)
+
+    request = bytestream_pb2.WriteRequest(
+        resource_name=resource_name(compressor, upload=True), data=b"\xff" * 100, finish_write=True
+    )
+    with pytest.raises(Aborted):
+        servicer.Write(iter([request]), create_context())
+    assert DIGEST.hash not in casd.blobs
+
+
+def test_batch_read_compressed(compressor):
+    casd = FakeCASD()
+    casd.blobs[DIGEST.hash] = DATA
+    servicer = _ContentAddressableStorageServicer(casd, enable_push=False)
+
+    missing = remote_execution_pb2.Digest(hash="0" * 64, size_bytes=1)
+    request = remote_execution_pb2.BatchReadBlobsRequest(
+        digests=[DIGEST, missing], acceptable_compressors=[UNSUPPORTED_COMPRESSOR, compressor]
+    )
+    response = servicer.BatchReadBlobs(request, create_context())
+
+    # buildbox-casd is only asked for uncompressed blobs
+    (casd_request,) = casd.batch_read_requests
+    assert not casd_request.acceptable_compressors
+
+    found, not_found = response.responses
+    assert found.compressor == compressor
+    assert cascompression.decompress(compressor, found.data) == DATA
+    assert not_found.status.code == code_pb2.NOT_FOUND
+    assert not_found.compressor == Compressor.IDENTITY
+
+
+def test_batch_read_uncompressed():
+    casd = FakeCASD()
+    casd.blobs[DIGEST.hash] = DATA
+    servicer = _ContentAddressableStorageServicer(casd, enable_push=False)
+
+    request = remote_execution_pb2.BatchReadBlobsRequest(digests=[DIGEST])
+    (response,) = servicer.BatchReadBlobs(request, create_context()).responses
+    assert response.compressor == Compressor.IDENTITY
+    assert response.data == DATA
+
+
+def test_batch_update_compressed(compressor):
+    casd = FakeCASD()
+    servicer = _ContentAddressableStorageServicer(casd, enable_push=True)
+
+    other_data = b"uncompressed"
+    other_digest = remote_execution_pb2.Digest(hash=hashlib.sha256(other_data).hexdigest(), size_bytes=len(other_data))
+
+    request = remote_execution_pb2.BatchUpdateBlobsRequest()
+    request.requests.add(digest=DIGEST, data=cascompression.compress(compressor, DATA), compressor=compressor)
+    request.requests.add(digest=other_digest, data=other_data)
+    servicer.BatchUpdateBlobs(request, create_context())
+
+    # Blobs are decompressed before being written to buildbox-casd
+    (casd_request,) = casd.batch_update_requests
+    assert all(blob_request.compressor == Compressor.IDENTITY for blob_request in casd_request.requests)
+    assert casd.blobs[DIGEST.hash] == DATA
+    assert casd.blobs[other_digest.hash] == other_data
+
+
+def test_batch_update_compressed_corrupt(compressor):
+    casd = FakeCASD()
+    servicer = _ContentAddressableStorageServicer(casd, enable_push=True)
+
+    request = remote_execution_pb2.BatchUpdateBlobsRequest()
+    request.requests.add(digest=DIGEST, data=b"\xff" * 100, compressor=compressor)
+    with pytest.raises(Aborted):
+        servicer.BatchUpdateBlobs(request, create_context())
+    assert not casd.batch_update_requests
+
+
+def test_batch_update_unsupported_compressor():
+    casd = FakeCASD()
+    servicer = _ContentAddressableStorageServicer(casd, enable_push=True)
+
+    request = remote_execution_pb2.BatchUpdateBlobsRequest()
+    request.requests.add(digest=DIGEST, data=DATA, compressor=UNSUPPORTED_COMPRESSOR)
+    with pytest.raises(Aborted):
+        servicer.BatchUpdateBlobs(request, create_context())
+    assert not casd.batch_update_requests
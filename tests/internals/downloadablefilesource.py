@@ -0,0 +1,286 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+# Pylint doesn't play well with fixtures and dependency injection from pytest
+# pylint: disable=redefined-outer-name
+
+import hashlib
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from buildstream import _downloader, downloadablefilesource
+from buildstream._downloader import Downloader, HTTPConnectionPool
+from buildstream.downloadablefilesource import _download_file, _PartialDownload, _UrlOpenerCreator
+
+
+ETAG = '"v1"'
+LAST_MODIFIED = "Mon, 05 Oct 2026 10:00:00 GMT"
+
+
+# An HTTP server supporting range requests and persistent connections,
+# which drops the connection half way through the first `drops` range
+# requests, and right after the headers of the next `stalls` range
+# requests. Range requests are answered with the whole file if the
+# server does not `honor_ranges`.
+#
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+    def do_GET(self):
+        data = self.server.data
+        start, end = 0, len(data)
+        self.server.ranges.append(self.headers.get("Range"))
+        self.server.if_ranges.append(self.headers.get("If-Range"))
+
+        match = re.match(r"bytes=(\d+)-(\d+)$", self.headers.get("Range", ""))
+        if match and self.server.honor_ranges and self._if_range_matches():
+            start, end = int(match.group(1)), int(match.group(2)) + 1
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, end - 1, len(data)))
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", self.server.etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+
+        with self.server.lock:
+            drop = start > 0 and self.server.drops > 0
+            if drop:
+                self.server.drops -= 1
+            stall = start > 0 and not drop and self.server.stalls > 0
+            if stall:
+                self.server.stalls -= 1
+        if drop:
+            end = start + (end - start) // 2
+            self.close_connection = True
+        elif stall:
+            end = start
+            self.close_connection = True
+        self.wfile.write(data[start:end])
+
+    # Weak ETags never match If-Range headers
+    def _if_range_matches(self):
+        if_range = self.headers.get("If-Range")
+        if if_range is None or if_range == LAST_MODIFIED:
+            return True
+        return if_range == self.server.etag and not if_range.startswith("W/")
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeRequestHandler)
+    httpd.data = os.urandom(100000)
+    httpd.drops = 0
+    httpd.stalls = 0
+    httpd.connections = 0
+    httpd.lock = threading.Lock()
+    httpd.ranges = []
+    httpd.if_ranges = []
+    httpd.etag = ETAG
+    httpd.honor_ranges = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+@pytest.fixture(autouse=True)
+def segmented(monkeypatch):
+    monkeypatch.setattr(downloadablefilesource, "_SEGMENTED_DOWNLOAD_THRESHOLD", 1000)
+
+
+@pytest.fixture(autouse=True)
+def connection_pool(monkeypatch):
+    pool = HTTPConnectionPool(2)
+    monkeypatch.setattr(_downloader, "_connection_pool", pool)
+    yield pool
+    pool.close()
+
+
+def download_args(server, tmpdir):
+    url = "http://127.0.0.1:{}/file.tar".format(server.server_address[1])
+    directory = str(tmpdir.ensure("download", dir=True))
+    partial_directory = str(tmpdir.ensure("mirror", dir=True))
+    return (_UrlOpenerCreator(None), url, None, directory, False, partial_directory)
+
+
+def download(server, tmpdir):
+    return _download_file(*download_args(server, tmpdir))
+
+
+def test_segmented_download_retries(server, tmpdir):
+    server.drops = 2
+
+    local_file, etag, sha256, error, _ = download(server, tmpdir)
+
+    assert error is None
+    assert etag == ETAG
+    assert sha256 == hashlib.sha256(server.data).hexdigest()
+    with open(local_file, "rb") as f:
+        assert f.read() == server.data
+
+    # Every segment was requested separately, the dropped ones twice
+    assert len(server.ranges) == 1 + 3 + 2
+    assert not os.path.exists(os.path.join(str(tmpdir), "mirror", "download.partial.json"))
+
+
+def test_segmented_download_resumes(server, tmpdir):
+    url = "http://127.0.0.1:{}/file.tar".format(server.server_address[1])
+    length = len(server.data)
+
+    # Leave a partial download of the first half of each segment behind
+    partial = _PartialDownload(str(tmpdir.ensure("mirror", dir=True)))
+    partial.start(url, ETAG, length)
+    with open(partial.path, "r+b") as f:
+        for index, (start, _, end) in enumerate(partial.segments):
+            half = (end - start) // 2
+            f.seek(start)
+            f.write(server.data[start : start + half])
+            partial.advance(index, half)
+    partial.save()
+
+    local_file, _, sha256, error, _ = download(server, tmpdir)
+
+    assert error is None
+    assert sha256 == hashlib.sha256(server.data).hexdigest()
+    with open(local_file, "rb") as f:
+        assert f.read() == server.data
+
+    # Only the missing second halves of the segments were requested
+    assert sorted(server.ranges[1:]) == [
+        "bytes=12500-24999",
+        "bytes=37500-49999",
+        "bytes=62500-74999",
+        "bytes=87500-99999",
+    ]
+
+
+def test_segmented_download_kept_after_stalls(server, tmpdir):
+    server.stalls = 100
+
+    local_file, _, _, error, _ = download(server, tmpdir)
+
+    # The connections kept closing without progress, the partial download is kept
+    assert local_file is None
+    assert "Connection closed" in error
+    assert os.path.exists(os.path.join(str(tmpdir), "mirror", "download.partial.json"))
+
+    # The next download resumes it, only requesting the missing segments
+    server.stalls = 0
+    del server.ranges[:]
+    local_file, _, sha256, error, _ = download(server, tmpdir)
+
+    assert error is None
+    assert sha256 == hashlib.sha256(server.data).hexdigest()
+    assert sorted(server.ranges[1:]) == ["bytes=25000-49999", "bytes=50000-74999", "bytes=75000-99999"]
+
+
+def test_segmented_download_weak_etag(server, tmpdir):
+    server.etag = 'W/"v1"'
+
+    local_file, etag, sha256, error, _ = download(server, tmpdir)
+
+    assert error is None
+    assert etag == server.etag
+    assert sha256 == hashlib.sha256(server.data).hexdigest()
+    with open(local_file, "rb") as f:
+        assert f.read() == server.data
+
+    # Weak ETags are not allowed in If-Range headers
+    assert server.if_ranges[1:] == [LAST_MODIFIED] * 3
+
+
+def test_range_requests_not_honored(server, tmpdir):
+    server.honor_ranges = False
+
+    local_file, etag, sha256, error, _ = download(server, tmpdir)
+
+    # The whole file is downloaded again instead
+    assert error is None
+    assert etag == ETAG
+    assert sha256 == hashlib.sha256(server.data).hexdigest()
+    with open(local_file, "rb") as f:
+        assert f.read() == server.data
+    assert server.ranges[-1] is None
+    assert not os.path.exists(os.path.join(str(tmpdir), "mirror", "download.partial"))
+
+
+def test_connections_reused(server, tmpdir, monkeypatch):
+    monkeypatch.setattr(downloadablefilesource, "_SEGMENTED_DOWNLOAD_THRESHOLD", len(server.data) + 1)
+
+    for _ in range(2):
+        local_file, _, sha256, error, _ = download(server, tmpdir)
+        assert error is None
+        assert sha256 == hashlib.sha256(server.data).hexdigest()
+        os.unlink(local_file)
+
+    assert server.connections == 1
+
+
+def test_connections_capped(server):
+    url = "http://127.0.0.1:{}/file.tar".format(server.server_address[1])
+    opener = _downloader.build_opener()
+    opened = threading.Event()
+
+    def open_third():
+        with opener.open(url) as response:
+            response.read()
+        opened.set()
+
+    first = opener.open(url)
+    second = opener.open(url)
+    thread = threading.Thread(target=open_third)
+    thread.start()
+
+    # The third request waits for either connection to be released
+    assert not opened.wait(0.5)
+    first.read()
+    assert opened.wait(10)
+
+    second.close()
+    thread.join()
+    assert server.connections == 2
+
+
+def test_downloader(server, tmpdir, monkeypatch):
+    monkeypatch.setattr(downloadablefilesource, "_SEGMENTED_DOWNLOAD_THRESHOLD", len(server.data) + 1)
+
+    downloader = Downloader(2)
+    try:
+        for _ in range(2):
+            local_file, etag, sha256, error, latency = downloader.run(_download_file, download_args(server, tmpdir))
+            assert error is None
+            assert latency >= 0
+            assert etag == ETAG
+            assert sha256 == hashlib.sha256(server.data).hexdigest()
+            os.unlink(local_file)
+    finally:
+        downloader.release_resources()
+
+    assert server.connections == 1
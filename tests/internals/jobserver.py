@@ -0,0 +1,63 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import os
+import pytest
+
+from buildstream._scheduler.jobserver import JobServer, JOBSERVER_SANDBOX_PATH
+
+
+@pytest.mark.parametrize(
+    "makeflags,parallel",
+    [
+        (None, False),
+        ("", False),
+        ("-j1", False),
+        ("-j", True),
+        ("-j8", True),
+        ("--jobs=8", True),
+        ("-j8 -j1", False),
+        ("-k -j 4", True),
+        ("-j 1", False),
+        ("--jobs 1", False),
+        ("--jobs 4", True),
+        ("-j2 -j 1", False),
+        ("-j -k", True),
+        ("-j1 -j", True),
+    ],
+)
+def test_makeflags(makeflags, parallel):
+    result = JobServer.get_makeflags(makeflags)
+    if parallel:
+        assert result == "{} --jobserver-auth=fifo:{}".format(makeflags, JOBSERVER_SANDBOX_PATH)
+    else:
+        assert result is None
+
+
+def test_tokens(tmpdir):
+    jobserver = JobServer(str(tmpdir), 8, 2)
+    try:
+        fd = os.open(jobserver.path, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            # Take some tokens without giving them back
+            assert os.read(fd, 2) == b"++"
+
+            # Resetting the jobserver recovers all the tokens
+            jobserver.reset()
+            assert os.read(fd, 4096) == b"++++++"
+        finally:
+            os.close(fd)
+    finally:
+        jobserver.close()
+
+    assert not os.path.exists(jobserver.path)
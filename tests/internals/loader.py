@@ -19,6 +19,9 @@ from buildstream.exceptions import LoadErrorReason
 from buildstream._exceptions import LoadError
 from buildstream._project import Project
 from buildstream._loader import LoadElement
+from buildstream._loader import prefetcher
+from buildstream._loader.loadcache import LoadCache
+from buildstream._loader.prefetcher import LoadPrefetcher
 
 from tests.testutils import dummy_context
 
@@ -111,3 +114,33 @@ def test_invalid_directory_load(datafiles):
         loader.load(["element.bst"])
 
     assert exc.value.reason == LoadErrorReason.LOADING_DIRECTORY
+
+
+def test_prefetch_dependencies(tmpdir, monkeypatch):
+    basedir = str(tmpdir.join("elements"))
+    os.makedirs(basedir)
+
+    # A chain of elements, each depending on the next one
+    for index in range(8):
+        with open(os.path.join(basedir, "element{}.bst".format(index)), "w", encoding="utf-8") as f:
+            f.write("kind: stack\n")
+            if index < 7:
+                f.write("depends:\n- element{}.bst\n".format(index + 1))
+
+    # Start the workers right away, regardless of cache misses
+    monkeypatch.setattr(prefetcher, "_PREFETCH_THRESHOLD", 0)
+
+    cache = LoadCache(str(tmpdir.join("load_cache")))
+    load_prefetcher = LoadPrefetcher(cache, 2)
+    try:
+        # Only the first element is requested, the others must be
+        # discovered by following the dependencies
+        load_prefetcher.prefetch(basedir, ["element0.bst"])
+        for index in range(8):
+            fullpath = os.path.join(basedir, "element{}.bst".format(index))
+            load_prefetcher.wait(fullpath)
+
+            with open(fullpath, encoding="utf-8") as f:
+                assert cache.lookup(f.read()) is not None
+    finally:
+        load_prefetcher.shutdown()
@@ -0,0 +1,150 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+
+# Pylint doesn't play well with fixtures and dependency injection from pytest
+# pylint: disable=redefined-outer-name
+
+from collections import namedtuple
+
+import pytest
+
+from buildstream._scheduler import loadmonitor
+from buildstream._scheduler.loadmonitor import LoadMonitor, _read_pressure
+from buildstream._scheduler.resources import Resources, ResourceType
+
+
+VirtualMemory = namedtuple("VirtualMemory", ["total", "available"])
+
+
+# The simulated load of the host
+class HostLoad:
+    def __init__(self):
+        self.pressure = {"cpu": 50.0, "memory": 0.0}
+        self.available_memory = 0.5
+
+    def read_pressure(self, resource):
+        return self.pressure.get(resource)
+
+    def virtual_memory(self):
+        return VirtualMemory(total=1000, available=int(1000 * self.available_memory))
+
+    def overload(self):
+        self.pressure["cpu"] = 90.0
+
+    def idle(self):
+        self.pressure["cpu"] = 10.0
+
+
+@pytest.fixture
+def host(monkeypatch):
+    host = HostLoad()
+    monkeypatch.setattr(loadmonitor, "_read_pressure", host.read_pressure)
+    monkeypatch.setattr(loadmonitor.psutil, "virtual_memory", host.virtual_memory)
+    monkeypatch.setattr(loadmonitor, "_ADJUST_INTERVAL", 0)
+    return host
+
+
+# Reserve all the build resources available, as the build queue would
+def start_builds(resources):
+    started = 0
+    while resources.reserve([ResourceType.PROCESS, ResourceType.BUILD]):
+        started += 1
+    return started
+
+
+def test_read_pressure(tmp_path, monkeypatch):
+    monkeypatch.setattr(loadmonitor, "_PRESSURE_DIR", str(tmp_path))
+
+    tmp_path.joinpath("cpu").write_text(
+        "some avg10=12.50 avg60=3.00 avg300=1.00 total=123456\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=0\n"
+    )
+    tmp_path.joinpath("memory").write_text("some avg60=3.00 total=1\n")
+    tmp_path.joinpath("io").write_text("some avg10=invalid\n")
+
+    assert _read_pressure("cpu") == 12.5
+    assert _read_pressure("memory") is None
+    assert _read_pressure("io") is None
+    assert _read_pressure("missing") is None
+
+
+def test_limit_follows_load(host):
+    resources = Resources(4, 1, 1)
+    monitor = LoadMonitor(2, 4)
+
+    # Start with the minimum number of builders
+    assert not monitor.update(resources)
+    assert start_builds(resources) == 2
+
+    # Grow while all builders are busy and the host is idle
+    host.idle()
+    assert monitor.update(resources)
+    assert start_builds(resources) == 1
+    assert monitor.update(resources)
+    assert start_builds(resources) == 1
+
+    # Shrink while the host is overloaded, running builds are not affected
+    host.overload()
+    assert not monitor.update(resources)
+    resources.release([ResourceType.PROCESS, ResourceType.BUILD])
+    assert start_builds(resources) == 0
+    resources.release([ResourceType.PROCESS, ResourceType.BUILD])
+    assert start_builds(resources) == 1
+
+    # Lack of memory overloads the host regardless of pressure
+    host.idle()
+    host.available_memory = 0.05
+    assert not monitor.update(resources)
+    assert monitor._builders == 2
+
+
+def test_no_growth_with_idle_builders(host):
+    resources = Resources(4, 1, 1)
+    monitor = LoadMonitor(2, 4)
+    monitor.update(resources)
+
+    host.idle()
+    resources.reserve([ResourceType.PROCESS, ResourceType.BUILD])
+    assert not monitor.update(resources)
+    assert monitor._builders == 2
+
+
+def test_limit_clamped(host):
+    resources = Resources(3, 1, 1)
+    monitor = LoadMonitor(2, 3)
+    monitor.update(resources)
+
+    host.overload()
+    for _ in range(3):
+        assert not monitor.update(resources)
+    assert start_builds(resources) == 2
+
+    host.idle()
+    for _ in range(3):
+        monitor.update(resources)
+    assert start_builds(resources) == 1
+    assert monitor._builders == 3
+
+
+def test_only_builds_limited(host):
+    resources = Resources(4, 1, 1)
+    monitor = LoadMonitor(1, 4)
+    monitor.update(resources)
+
+    assert start_builds(resources) == 1
+
+    # Cache queries are only limited by the configured maximum
+    cache_queries = 0
+    while resources.reserve([ResourceType.PROCESS, ResourceType.CACHE]):
+        cache_queries += 1
+    assert cache_queries == 3
@@ -0,0 +1,94 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import os
+
+from buildstream import _mirrorhealth
+from buildstream._mirrorhealth import MirrorHealth
+
+
+def rank(health, hosts):
+    return health.rank(hosts, lambda host: host)
+
+
+def test_failing_mirrors_last(tmpdir, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(_mirrorhealth.time, "time", lambda: now)
+
+    path = os.path.join(str(tmpdir), "mirror_health")
+    health = MirrorHealth(path)
+    assert rank(health, ["a", "b", "c"]) == ["a", "b", "c"]
+
+    health.record_failure("a")
+    health.record_success("b")
+    health.save()
+
+    # The records persist between sessions
+    health = MirrorHealth(path)
+    assert rank(health, ["a", "b", "c"]) == ["b", "c", "a"]
+
+    # The failing mirror is tried in order again after backing off,
+    # for longer after consecutive failures
+    now += 60
+    assert rank(health, ["a", "b", "c"]) == ["a", "b", "c"]
+    health.record_failure("a")
+    now += 60
+    assert rank(health, ["a", "b", "c"]) == ["b", "c", "a"]
+    now += 60
+    assert rank(health, ["a", "b", "c"]) == ["a", "b", "c"]
+
+    # A success resets the failures
+    health.record_success("a")
+    health.record_failure("a")
+    now += 60
+    assert rank(health, ["a", "b", "c"]) == ["a", "b", "c"]
+
+
+def test_successes_keep_order(tmpdir):
+    health = MirrorHealth(os.path.join(str(tmpdir), "mirror_health"))
+
+    # Mirrors are not reordered for fetches being slower, as fetch
+    # durations mostly depend on the sizes of the sources
+    for host in ["a", "b", "c"]:
+        health.record_success(host)
+    assert rank(health, ["c", "a", "b"]) == ["c", "a", "b"]
+
+
+def test_slow_mirrors_last(tmpdir, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(_mirrorhealth.time, "time", lambda: now)
+
+    path = os.path.join(str(tmpdir), "mirror_health")
+    health = MirrorHealth(path)
+
+    # Small differences of latency do not reorder mirrors
+    health.record_latency("a", 0.15)
+    health.record_latency("b", 0.1)
+    health.record_latency("c", 1.0)
+    health.record_latency("d", 0.5)
+    assert rank(health, ["a", "b", "c", "d", "e"]) == ["a", "b", "e", "d", "c"]
+
+    # The latency is averaged and persists between sessions
+    health.record_latency("c", 0.1)
+    health.save()
+    health = MirrorHealth(path)
+    assert rank(health, ["a", "b", "c", "d", "e"]) == ["a", "b", "e", "d", "c"]
+    for _ in range(6):
+        health.record_latency("c", 0.1)
+    assert rank(health, ["a", "b", "c", "d", "e"]) == ["a", "b", "c", "e", "d"]
+
+    # Failing mirrors come after slow ones, and their latency
+    # does not count as the fastest
+    health.record_failure("b")
+    health.record_success("d")
+    assert rank(health, ["a", "b", "c", "d", "e"]) == ["a", "c", "e", "d", "b"]
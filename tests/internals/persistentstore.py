@@ -0,0 +1,74 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+from buildstream._persistentstore import PersistentStore
+
+
+# A store of versioned entries, where higher versions win and
+# negative versions expire
+class VersionStore(PersistentStore):
+    def get(self, key):
+        with self._lock:
+            return self._get_entry(key)
+
+    def set(self, key, entry):
+        with self._lock:
+            self._set_entry(key, entry)
+
+    def _is_newer(self, entry, existing):
+        return existing < entry
+
+    def _is_expired(self, entry):
+        return entry < 0
+
+
+def test_save_and_merge(tmp_path):
+    path = str(tmp_path.joinpath("store"))
+
+    first = VersionStore(path, 1)
+    second = VersionStore(path, 1)
+    first.set("a", 2)
+    first.set("b", 1)
+    first.set("c", -1)
+    second.set("a", 1)
+    second.set("b", 2)
+    first.save()
+    second.save()
+
+    store = VersionStore(path, 1)
+    assert store.get("a") == 2
+    assert store.get("b") == 2
+    assert store.get("c") is None
+
+    # Stores of other versions are discarded
+    assert VersionStore(path, 2).get("a") is None
+
+
+def test_invalid_file_ignored(tmp_path):
+    path = tmp_path.joinpath("store")
+    path.write_text("not json")
+
+    store = VersionStore(str(path), 1)
+    assert store.get("a") is None
+    store.set("a", 1)
+    store.save()
+    assert VersionStore(str(path), 1).get("a") == 1
+
+
+def test_save_failure_ignored(tmp_path):
+    path = tmp_path.joinpath("file")
+    path.write_text("")
+
+    store = VersionStore(str(path.joinpath("store")), 1)
+    store.set("a", 1)
+    store.save()
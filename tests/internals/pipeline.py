@@ -0,0 +1,140 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import itertools
+from unittest.mock import MagicMock
+
+from buildstream import _pipeline
+from buildstream._buildstats import BuildStats
+from buildstream._scheduler.queues import queue as queue_module
+from buildstream._scheduler.queues.queue import Queue, QueueStatus
+from buildstream._scheduler.resources import Resources, ResourceType
+
+
+_ids = itertools.count()
+
+
+# The parts of Element involved in prioritizing and queueing elements
+class FakeElement:
+    def __init__(self, name, dependencies=(), *, cached=False):
+        self.name = name
+        self.normal_name = name
+        self._unique_id = next(_ids)
+        self._deps = list(dependencies)
+        self._cached = cached
+        self._priority = 0
+        self._depth = 0
+
+    def __repr__(self):
+        return self.name
+
+    def _get_project(self):
+        project = MagicMock()
+        project.name = "project"
+        return project
+
+    def _get_display_key(self):
+        return MagicMock(brief="key")
+
+    def _dependencies(self, scope, *, recurse=True):
+        return iter(self._deps)
+
+    def _can_query_cache(self):
+        return True
+
+    def _cached_success(self):
+        return self._cached
+
+    def _set_priority(self, priority):
+        self._priority = priority
+
+    def _set_depth(self, depth):
+        self._depth = depth
+
+
+class ReadyQueue(Queue):
+    action_name = "Ready"
+    complete_name = "Done"
+    resources = [ResourceType.PROCESS]
+
+    def get_process_func(self):
+        return lambda element: None
+
+    def status(self, element):
+        return QueueStatus.READY
+
+
+def create_context(tmp_path, durations):
+    context = MagicMock()
+    context.buildstats = BuildStats(str(tmp_path.joinpath("build_stats")))
+    for element, duration in durations.items():
+        context.buildstats.record(element, duration)
+    return context
+
+
+# The order in which a queue runs the elements
+def queue_order(elements, monkeypatch):
+    monkeypatch.setattr(queue_module, "ElementJob", lambda *args, element, **kwargs: element)
+
+    scheduler = MagicMock()
+    scheduler.resources = Resources(len(elements), 1, 1)
+
+    queue = ReadyQueue(scheduler)
+    queue.enqueue(elements)
+    return queue.harvest_jobs()
+
+
+def test_critical_path_first(tmp_path, monkeypatch):
+    compiler = FakeElement("compiler")
+    app = FakeElement("app", [compiler])
+    lib = FakeElement("lib")
+    docs = FakeElement("docs")
+    cached = FakeElement("cached", cached=True)
+    tool = FakeElement("tool", [cached])
+    elements = [docs, lib, cached, tool, compiler, app]
+
+    context = create_context(tmp_path, {compiler: 10.0, app: 100.0, lib: 50.0, docs: 5.0, cached: 1000.0, tool: 20.0})
+    _pipeline.prioritize(context, elements)
+
+    # The compiler is on the longest path, and cached elements take no time
+    assert queue_order(elements, monkeypatch) == [compiler, app, lib, cached, tool, docs]
+
+
+def test_more_dependents_first(tmp_path, monkeypatch):
+    shared = FakeElement("shared")
+    single = FakeElement("single")
+    first = FakeElement("first", [shared])
+    second = FakeElement("second", [shared])
+    other = FakeElement("other", [single])
+    elements = [single, shared, first, second, other]
+
+    # Without recorded durations, all elements take the same time
+    _pipeline.prioritize(create_context(tmp_path, {}), elements)
+
+    assert queue_order(elements, monkeypatch)[:2] == [shared, single]
+
+
+def test_depth_breaks_ties(tmp_path, monkeypatch):
+    first = FakeElement("first")
+    second = FakeElement("second")
+    third = FakeElement("third")
+    elements = [first, second, third]
+
+    _pipeline.prioritize(create_context(tmp_path, {}), elements)
+    assert first._priority == second._priority == third._priority
+
+    third._set_depth(0)
+    first._set_depth(1)
+    second._set_depth(2)
+
+    assert queue_order(elements, monkeypatch) == [third, first, second]
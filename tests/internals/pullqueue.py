@@ -0,0 +1,59 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+from unittest.mock import MagicMock
+
+from buildstream._scheduler.jobs import ElementJob, JobStatus
+from buildstream._scheduler.queues.pullqueue import PullQueue, _PullBatchJob
+from buildstream._scheduler.resources import Resources
+
+
+def create_queue(num_fetchers):
+    scheduler = MagicMock()
+    scheduler.resources = Resources(1, num_fetchers, 1)
+    scheduler.context.sched_network_retries = 0
+    return PullQueue(scheduler)
+
+
+def create_element(name):
+    element = MagicMock()
+    element._pull_pending.return_value = True
+    element._priority = 0
+    element._depth = 0
+    element.normal_name = name
+    element._get_project.return_value.name = "project"
+    element._get_display_key.return_value.brief = "key"
+    return element
+
+
+def test_pull_batch_job():
+    queue = create_queue(2)
+    elements = [create_element(name) for name in ("a", "b", "c")]
+    queue.enqueue(elements)
+
+    # The ready elements are first pulled together by a single job
+    (batch_job,) = queue.harvest_jobs()
+    assert isinstance(batch_job, _PullBatchJob)
+    assert batch_job._elements == elements
+
+    # No further batch is started while the batch job is running
+    queue.enqueue([create_element("d")])
+    (job,) = queue.harvest_jobs()
+    assert isinstance(job, ElementJob)
+    assert job.get_element().normal_name == "d"
+
+    # The elements of the batch then get their own jobs
+    batch_job.parent_complete(JobStatus.OK, None)
+    jobs = queue.harvest_jobs()
+    assert [job.get_element() for job in jobs] == elements[:1]
+    assert all(isinstance(job, ElementJob) for job in jobs)
@@ -0,0 +1,73 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import os
+import pytest
+
+from buildstream._refstore import open_ref_store
+
+
+@pytest.mark.parametrize("indexed", [False, True], ids=["files", "database"])
+def test_refs(tmpdir, indexed):
+    store = open_ref_store(os.path.join(str(tmpdir), "refs"), indexed=indexed)
+
+    store.store(["project/element/key1", "project/element/key2"], b"artifact")
+    store.link("project/element/key1", "project/other/key3")
+
+    assert store.contains("project/element/key2")
+    assert store.load("project/other/key3", touch=True) == b"artifact"
+    assert store.load("project/missing/key") is None
+
+    refs = sorted(ref for _, ref in store.list_refs_mtimes("project/element/*"))
+    assert refs == ["project/element/key1", "project/element/key2"]
+
+    store.remove("project/element/key1")
+    assert not store.contains("project/element/key1")
+    with pytest.raises(FileNotFoundError):
+        store.remove("project/element/key1")
+
+    store.close()
+
+
+@pytest.mark.parametrize("indexed", [False, True], ids=["files", "database"])
+def test_link_missing_ref(tmpdir, indexed):
+    store = open_ref_store(os.path.join(str(tmpdir), "refs"), indexed=indexed)
+
+    with pytest.raises(FileNotFoundError):
+        store.link("project/element/missing", "project/element/new")
+    assert not store.contains("project/element/new")
+
+    store.close()
+
+
+def test_migration(tmpdir):
+    basedir = os.path.join(str(tmpdir), "refs")
+
+    store = open_ref_store(basedir, indexed=False)
+    store.store(["project/element/key1", "project/element/key2"], b"artifact")
+
+    # Refs are moved into the database
+    store = open_ref_store(basedir, indexed=True)
+    refs = sorted(ref for _, ref in store.list_refs_mtimes())
+    assert refs == ["project/element/key1", "project/element/key2"]
+    assert not os.listdir(basedir)
+
+    store.store(["project/element/key3"], b"other")
+    store.close()
+
+    # Refs are moved back to files
+    store = open_ref_store(basedir, indexed=False)
+    refs = sorted(ref for _, ref in store.list_refs_mtimes())
+    assert refs == ["project/element/key1", "project/element/key2", "project/element/key3"]
+    assert store.load("project/element/key3") == b"other"
+    assert not os.path.exists(basedir + ".db")
@@ -0,0 +1,60 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import os
+from types import SimpleNamespace
+
+from buildstream import _remotequerycache
+from buildstream._remotequerycache import RemoteQueryCache
+
+
+def create_remote(url, instance_name=None):
+    return SimpleNamespace(spec=SimpleNamespace(url=url, instance_name=instance_name))
+
+
+def test_answers_persist_until_expired(tmpdir, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(_remotequerycache.time, "time", lambda: now)
+
+    path = os.path.join(str(tmpdir), "remote_query_cache")
+    remote = create_remote("https://cache.example.com")
+    other_remote = create_remote("https://cache.example.com", "other")
+
+    cache = RemoteQueryCache(path, 60)
+    cache.record(remote, "project/element/key", True)
+    cache.record(remote, "project/missing/key", False)
+    cache.save()
+
+    cache = RemoteQueryCache(path, 60)
+    assert cache.lookup(remote, "project/element/key") is True
+    assert cache.lookup(remote, "project/missing/key") is False
+    assert cache.lookup(other_remote, "project/element/key") is None
+
+    # A pushed artifact replaces the previous answer
+    cache.record(remote, "project/missing/key", True)
+    assert cache.lookup(remote, "project/missing/key") is True
+
+    now += 60
+    assert cache.lookup(remote, "project/element/key") is None
+
+
+def test_disabled(tmpdir):
+    path = os.path.join(str(tmpdir), "remote_query_cache")
+    remote = create_remote("https://cache.example.com")
+
+    cache = RemoteQueryCache(path, 0)
+    cache.record(remote, "project/element/key", True)
+    cache.save()
+
+    assert cache.lookup(remote, "project/element/key") is None
+    assert not os.path.exists(path)
@@ -18,6 +18,8 @@ import pprint
 import shutil
 import glob
 import hashlib
+import io
+import tarfile
 from pathlib import Path
 from typing import List, Optional
 
@@ -28,6 +30,7 @@ from buildstream.storage._casbaseddirectory import CasBasedDirectory
 from buildstream.storage._filebaseddirectory import FileBasedDirectory
 
 from tests.testutils import casd_cache
+from tests.testutils.fakecas import fake_cas_cache
 
 DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "storage")
 
@@ -337,3 +340,120 @@ def utime_recursively(directory, time):
 def clear_gitkeeps(directory):
     for f in glob.glob(os.path.join(directory, "**", ".gitkeep"), recursive=True):
         os.remove(f)
+
+
+@pytest.mark.parametrize("backend", [FileBasedDirectory, CasBasedDirectory])
+@pytest.mark.datafiles(DATA_DIR)
+def test_import_tar(tmpdir, datafiles, backend):
+    tar_path = os.path.join(str(tmpdir), "archive.tar")
+    with tarfile.open(tar_path, "w") as tar:
+        tar.add(os.path.join(str(datafiles), "merge-link"), arcname=".")
+
+        # Add a large executable file, and a hard link to it
+        large_path = os.path.join(str(tmpdir), "large")
+        with open(large_path, "wb") as f:
+            f.write(b"x" * 2 * 1024 * 1024)
+        os.chmod(large_path, 0o755)
+        tar.add(large_path, arcname="subdirectory/large")
+        info = tar.gettarinfo(large_path, arcname="hardlink")
+        info.type = tarfile.LNKTYPE
+        info.linkname = "subdirectory/large"
+        tar.addfile(info)
+
+    with setup_backend(backend, str(tmpdir)) as c, tarfile.open(tar_path) as tar:
+        c._import_tar(tar, tar.getmembers())
+
+        assert set(c) == {"link", "root-file", "subdirectory", "hardlink"}
+        assert set(c.open_directory("subdirectory")) == {"subdir-file", "large"}
+        assert c.readlink("link") == "root-file"
+
+        digest = hashlib.sha256(b"x" * 2 * 1024 * 1024).hexdigest()
+        for path in ["subdirectory/large", "hardlink"]:
+            assert c.file_digest(path) == digest
+            assert c.stat(path).executable
+        assert not c.stat("root-file").executable
+
+
+def add_tar_symlink(tar, name, target):
+    info = tarfile.TarInfo(name)
+    info.type = tarfile.SYMTYPE
+    info.linkname = target
+    tar.addfile(info)
+
+
+def add_tar_file(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+@pytest.mark.parametrize("backend", [FileBasedDirectory, CasBasedDirectory])
+def test_import_tar_symlinked_directory(tmpdir, backend):
+    tar_path = os.path.join(str(tmpdir), "archive.tar")
+    with tarfile.open(tar_path, "w") as tar:
+        add_tar_file(tar, "usr/lib/libbar.so", b"bar")
+        add_tar_symlink(tar, "lib", "usr/lib")
+        add_tar_file(tar, "lib/libfoo.so", b"foo")
+
+    with setup_backend(backend, str(tmpdir)) as c, tarfile.open(tar_path) as tar:
+        c._import_tar(tar, tar.getmembers())
+
+        # Members below the symlink are imported into its target
+        assert c.readlink("lib") == "usr/lib"
+        assert set(c.open_directory("usr/lib")) == {"libbar.so", "libfoo.so"}
+        assert c.file_digest("usr/lib/libfoo.so") == hashlib.sha256(b"foo").hexdigest()
+
+
+def test_import_tar_symlinked_directory_confined(tmpdir):
+    tar_path = os.path.join(str(tmpdir), "archive.tar")
+    with tarfile.open(tar_path, "w") as tar:
+        add_tar_symlink(tar, "absolute", "/usr/lib")
+        add_tar_symlink(tar, "sub/relative", "../../../usr/share")
+        add_tar_symlink(tar, "loop", "loop")
+        add_tar_file(tar, "absolute/libfoo.so", b"foo")
+        add_tar_file(tar, "sub/relative/data", b"data")
+        add_tar_file(tar, "loop/file", b"file")
+
+    with fake_cas_cache(os.path.join(str(tmpdir), "cas")) as (cas_cache, _), tarfile.open(tar_path) as tar:
+        c = CasBasedDirectory(cas_cache)
+        c._import_tar(tar, tar.getmembers()[:-1])
+
+        # Symlinks pointing outside resolve relative to the directory
+        assert set(c.open_directory("usr/lib")) == {"libfoo.so"}
+        assert set(c.open_directory("usr/share")) == {"data"}
+
+        with pytest.raises(DirectoryError):
+            c._import_tar(tar, [tar.getmember("loop/file")])
+
+
+def test_serialize_single_add_objects(tmpdir):
+    with fake_cas_cache(os.path.join(str(tmpdir), "cas")) as (cas_cache, casd):
+        c = CasBasedDirectory(cas_cache)
+        for path in ["a/b/c", "a/d", "e"]:
+            c.open_directory(path, create=True)
+
+        calls = []
+        add_objects = cas_cache.add_objects
+
+        def record_add_objects(**kwargs):
+            calls.append(kwargs)
+            return add_objects(**kwargs)
+
+        cas_cache.add_objects = record_add_objects
+
+        # The protos of all directories are written together, the
+        # identical empty directories only once
+        digest = c._get_digest()
+        assert len(calls) == 1
+        assert len(calls[0]["buffers"]) == 4
+        assert cas_cache.contains_directory(digest, with_files=True)
+
+        # Unmodified directories are not written again
+        assert c._get_digest() == digest
+        assert len(calls) == 1
+
+        # Only the new and modified directories are written again
+        c.open_directory("a/b/c").open_directory("f", create=True)
+        assert c._get_digest() != digest
+        assert len(calls) == 2
+        assert len(calls[1]["buffers"]) == 5
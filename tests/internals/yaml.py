@@ -11,7 +11,9 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 #
+import hashlib
 import os
+import time
 from io import StringIO
 
 import pytest
@@ -19,6 +21,7 @@ import pytest
 from buildstream import _yaml, Node, ProvenanceInformation, SequenceNode
 from buildstream.exceptions import LoadErrorReason
 from buildstream._exceptions import LoadError
+from buildstream._loader.loadcache import LoadCache
 
 
 DATA_DIR = os.path.join(
@@ -57,6 +60,67 @@ def test_basic_provenance(datafiles):
     assert_provenance(filename, 1, 0, loaded)
 
 
+@pytest.mark.datafiles(os.path.join(DATA_DIR))
+def test_load_cached(datafiles):
+
+    filename = os.path.join(datafiles, "basics.yaml")
+    cache_path = os.path.join(str(datafiles), "load_cache")
+
+    # Populate the cache and persist it
+    cache = LoadCache(cache_path)
+    parsed = _yaml.load(filename, shortname=None, cache=cache)
+    cache.save()
+    assert os.path.exists(cache_path)
+
+    # Load through a fresh cache, which can only be satisfied from disk
+    cache = LoadCache(cache_path)
+    with open(filename, encoding="utf-8") as f:
+        assert cache.lookup(f.read()) is not None
+
+    loaded = _yaml.load(filename, shortname=None, cache=cache)
+    assert loaded.strip_node_info() == parsed.strip_node_info()
+    assert_provenance(filename, 1, 0, loaded)
+    assert_provenance(filename, 5, 2, loaded.get_sequence("moods").scalar_at(1))
+
+
+def test_load_cache_entries(tmp_path):
+    cache_path = str(tmp_path.joinpath("load_cache"))
+
+    cache = LoadCache(cache_path)
+    cache.store("first", ("first",))
+    cache.store("old", ("old",))
+    cache.save()
+
+    def entry_path(contents):
+        key = hashlib.sha256(contents.encode("utf-8")).hexdigest()
+        return os.path.join(cache_path, key[:2], key[2:])
+
+    # Saving again only writes the new entries
+    first_stat = os.stat(entry_path("first"))
+    cache = LoadCache(cache_path)
+    assert cache.lookup("first") == ("first",)
+    cache.store("second", ("second",))
+    cache.save()
+    assert os.stat(entry_path("first")).st_ino == first_stat.st_ino
+    assert LoadCache(cache_path).lookup("second") == ("second",)
+
+    # Entries which were not used for a long time are dropped, entries which
+    # are used again are marked as such
+    long_ago = time.time() - 60 * 24 * 60 * 60
+    for path in [entry_path("first"), entry_path("old"), os.path.join(cache_path, "expiry-stamp")]:
+        os.utime(path, (long_ago, long_ago))
+
+    cache = LoadCache(cache_path)
+    assert cache.lookup("first") == ("first",)
+    cache.save()
+
+    cache = LoadCache(cache_path)
+    assert cache.lookup("first") == ("first",)
+    assert cache.lookup("second") == ("second",)
+    assert cache.lookup("old") is None
+    assert cache.misses == 1
+
+
 @pytest.mark.datafiles(os.path.join(DATA_DIR))
 def test_member_provenance(datafiles):
 
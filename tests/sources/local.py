@@ -18,7 +18,8 @@
 import os
 import pytest
 
-from buildstream import _yaml
+from buildstream import _cachekeyindex, _yaml
+from buildstream._cachekeyindex import CacheKeyIndex
 from buildstream.exceptions import ErrorDomain, LoadErrorReason
 from buildstream._testing import cli  # pylint: disable=unused-import
 from buildstream._testing._utils.site import HAVE_SANDBOX
@@ -57,6 +58,55 @@ def test_non_regular_file_or_directory(cli, datafiles):
             result.assert_main_error(ErrorDomain.LOAD, LoadErrorReason.PROJ_PATH_INVALID_KIND)
 
 
+@pytest.mark.datafiles(os.path.join(DATA_DIR, "basic"))
+def test_key_follows_modified_file(cli, datafiles, monkeypatch):
+    project = str(datafiles)
+    localfile = os.path.join(project, "file.txt")
+
+    # Record fingerprints of files regardless of their age
+    monkeypatch.setattr(_cachekeyindex, "_RACY_INTERVAL", 0)
+
+    # Record whether the cache key index had a digest for the fingerprints
+    lookups = []
+    original_lookup = CacheKeyIndex.lookup
+
+    def lookup(self, identity, fingerprint):
+        digest = original_lookup(self, identity, fingerprint)
+        lookups.append(digest is not None)
+        return digest
+
+    monkeypatch.setattr(CacheKeyIndex, "lookup", lookup)
+
+    original_key = cli.get_element_key(project, "target.bst")
+    assert lookups and not any(lookups)
+
+    lookups.clear()
+    assert cli.get_element_key(project, "target.bst") == original_key
+    assert lookups and all(lookups)
+
+    # Modify the file without changing its size, with a distinct
+    # timestamp regardless of the granularity of the filesystem
+    with open(localfile, "r", encoding="utf-8") as f:
+        content = f.read()
+    mtime = os.stat(localfile).st_mtime
+    with open(localfile, "w", encoding="utf-8") as f:
+        f.write(content.swapcase())
+    os.utime(localfile, (mtime - 10, mtime - 10))
+
+    lookups.clear()
+    assert cli.get_element_key(project, "target.bst") != original_key
+    assert lookups and not any(lookups)
+
+    # Restoring the content restores the key
+    with open(localfile, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.utime(localfile, (mtime - 20, mtime - 20))
+
+    lookups.clear()
+    assert cli.get_element_key(project, "target.bst") == original_key
+    assert lookups and not any(lookups)
+
+
 @pytest.mark.datafiles(os.path.join(DATA_DIR, "basic"))
 def test_invalid_absolute_path(cli, datafiles):
     project = str(datafiles)
@@ -19,7 +19,7 @@ import os
 import stat
 import pytest
 
-from buildstream import utils
+from buildstream import _yaml, utils
 from buildstream._testing import ErrorDomain
 from buildstream._testing import generate_project
 from buildstream._testing import cli  # pylint: disable=unused-import
@@ -165,6 +165,34 @@ def test_executable(cli, tmpdir, datafiles):
     assert mode & (stat.S_IEXEC | stat.S_IXGRP | stat.S_IXOTH)
 
 
+# Test that a file downloaded by a source is reused by sources of
+# other urls with the same ref, without downloading it again.
+@pytest.mark.datafiles(os.path.join(DATA_DIR, "single-file"))
+def test_reuse_download(cli, tmpdir, datafiles):
+    project = str(datafiles)
+    generate_project(project, {"aliases": {"tmpdir": "file:///" + str(tmpdir)}})
+
+    # The url of this element does not exist
+    element = {
+        "kind": "import",
+        "sources": [
+            {
+                "kind": "remote",
+                "url": "tmpdir:/missing/file",
+                "ref": "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
+            }
+        ],
+    }
+    _yaml.roundtrip_dump(element, os.path.join(project, "other.bst"))
+
+    result = cli.run(project=project, args=["source", "fetch", "target.bst"])
+    result.assert_success()
+
+    result = cli.run(project=project, args=["source", "fetch", "other.bst"])
+    result.assert_success()
+    assert cli.get_element_state(project, "other.bst") == "buildable"
+
+
 @pytest.mark.parametrize("server_type", ("FTP", "HTTP"))
 @pytest.mark.datafiles(os.path.join(DATA_DIR, "single-file"))
 def test_use_netrc(cli, datafiles, server_type, tmpdir):
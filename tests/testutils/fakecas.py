@@ -0,0 +1,285 @@
+#
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+#
+import collections
+import os
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+import grpc
+
+from buildstream import utils
+from buildstream._cas import CASCache
+from buildstream._protos.build.bazel.remote.execution.v2 import remote_execution_pb2
+from buildstream._protos.build.buildgrid import local_cas_pb2
+from buildstream._protos.google.rpc import code_pb2
+
+
+# A gRPC error, as raised by the stubs of buildbox-casd
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, code, details=""):
+        super().__init__()
+        self._code = code
+        self._details = details
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._details
+
+
+# A method of the fake buildbox-casd, which counts its calls and
+# supports the `future()` calls of batched transfers.
+class FakeMethod:
+    def __init__(self, implementation):
+        self.implementation = implementation
+        self.requests = []
+
+    @property
+    def call_count(self):
+        return len(self.requests)
+
+    def __call__(self, request):
+        self.requests.append(request)
+        return self.implementation(request)
+
+    def future(self, request):
+        future = Future()
+        try:
+            future.set_result(self(request))
+        except FakeRpcError as e:
+            future.set_exception(e)
+        return future
+
+
+# FakeCASD()
+#
+# An in-process stand-in for buildbox-casd, implementing the requests
+# which CASCache sends to it for the local cache and for remotes.
+#
+# The local cache is the `cas/objects` directory of the CASCache, as
+# with buildbox-casd, and every other instance name is a remote whose
+# blobs are kept in memory.
+#
+# Args:
+#    casdir (str): The `cas` directory of the CASCache
+#
+class FakeCASD:
+    def __init__(self, casdir):
+        self.casdir = casdir
+        self.remotes = collections.defaultdict(dict)
+
+        self.cas = _Stub(
+            FindMissingBlobs=self._find_missing_blobs,
+            BatchUpdateBlobs=self._batch_update_blobs,
+        )
+        self.local_cas = _Stub(
+            FetchTree=self._fetch_tree,
+            FetchMissingBlobs=self._fetch_missing_blobs,
+            UploadMissingBlobs=self._upload_missing_blobs,
+            CaptureFiles=self._capture_files,
+        )
+
+    def get_cas(self):
+        return self.cas
+
+    def get_local_cas(self):
+        return self.local_cas
+
+    # add_blob()
+    #
+    # Add a blob to the local cache, or to a remote.
+    #
+    # Args:
+    #    data (bytes): The content of the blob
+    #    instance_name (str): The remote to add the blob to, or "" for the local cache
+    #
+    # Returns:
+    #    (Digest): The digest of the blob
+    #
+    def add_blob(self, data, instance_name=""):
+        digest = utils._message_digest(data)
+        if instance_name:
+            self.remotes[instance_name][digest.hash] = data
+        else:
+            path = self._objpath(digest)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        return digest
+
+    # add_directory()
+    #
+    # Add a directory tree to the local cache, or to a remote.
+    #
+    # Args:
+    #    files (dict): The content of the files, by path relative to the root
+    #    instance_name (str): The remote to add the tree to, or "" for the local cache
+    #
+    # Returns:
+    #    (Digest): The digest of the root directory
+    #
+    def add_directory(self, files, instance_name=""):
+        directory = remote_execution_pb2.Directory()
+        subdirectories = collections.defaultdict(dict)
+        for path, data in sorted(files.items()):
+            name, _, rest = path.partition("/")
+            if rest:
+                subdirectories[name][rest] = data
+            else:
+                filenode = directory.files.add(name=name)
+                filenode.digest.CopyFrom(self.add_blob(data, instance_name))
+
+        for name, subdirectory in sorted(subdirectories.items()):
+            dirnode = directory.directories.add(name=name)
+            dirnode.digest.CopyFrom(self.add_directory(subdirectory, instance_name))
+
+        return self.add_blob(directory.SerializeToString(), instance_name)
+
+    # has_blob()
+    #
+    # Returns whether a blob is in the local cache, or on a remote.
+    #
+    def has_blob(self, digest, instance_name=""):
+        return self._read_blob(digest, instance_name) is not None
+
+    # remove_blob()
+    #
+    # Remove a blob from the local cache, or from a remote.
+    #
+    def remove_blob(self, digest, instance_name=""):
+        if instance_name:
+            del self.remotes[instance_name][digest.hash]
+        else:
+            os.unlink(self._objpath(digest))
+
+    def _objpath(self, digest):
+        return os.path.join(self.casdir, "objects", digest.hash[:2], digest.hash[2:])
+
+    def _read_blob(self, digest, instance_name):
+        if instance_name:
+            return self.remotes[instance_name].get(digest.hash)
+        try:
+            with open(self._objpath(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _find_missing_blobs(self, request):
+        response = remote_execution_pb2.FindMissingBlobsResponse()
+        for digest in request.blob_digests:
+            if not self.has_blob(digest, request.instance_name):
+                response.missing_blob_digests.add().CopyFrom(digest)
+        return response
+
+    def _batch_update_blobs(self, request):
+        response = remote_execution_pb2.BatchUpdateBlobsResponse()
+        for blob_request in request.requests:
+            digest = self.add_blob(blob_request.data, request.instance_name)
+            blob_response = response.responses.add()
+            blob_response.digest.CopyFrom(digest)
+            blob_response.status.code = code_pb2.OK
+        return response
+
+    def _capture_files(self, request):
+        response = local_cas_pb2.CaptureFilesResponse()
+        for path in request.path:
+            with open(path, "rb") as f:
+                digest = self.add_blob(f.read(), request.instance_name)
+            if request.move_files:
+                os.unlink(path)
+            blob_response = response.responses.add()
+            blob_response.digest.CopyFrom(digest)
+            blob_response.status.code = code_pb2.OK
+        return response
+
+    def _fetch_tree(self, request):
+        pending = [request.root_digest]
+        while pending:
+            digest = pending.pop()
+            data = self._read_blob(digest, request.instance_name)
+            if data is None:
+                raise FakeRpcError(grpc.StatusCode.NOT_FOUND, "Directory {} not found".format(digest.hash))
+            if request.instance_name:
+                self.add_blob(data)
+
+            directory = remote_execution_pb2.Directory()
+            directory.ParseFromString(data)
+            pending.extend(dirnode.digest for dirnode in directory.directories)
+
+            if request.fetch_file_blobs:
+                for filenode in directory.files:
+                    file_data = self._read_blob(filenode.digest, request.instance_name)
+                    if file_data is None:
+                        raise FakeRpcError(grpc.StatusCode.NOT_FOUND, "File {} not found".format(filenode.digest.hash))
+                    if request.instance_name:
+                        self.add_blob(file_data)
+
+        return local_cas_pb2.FetchTreeResponse()
+
+    def _fetch_missing_blobs(self, request):
+        response = local_cas_pb2.FetchMissingBlobsResponse()
+        for digest in request.blob_digests:
+            blob_response = response.responses.add()
+            blob_response.digest.CopyFrom(digest)
+            data = self._read_blob(digest, request.instance_name)
+            if data is None:
+                blob_response.status.code = code_pb2.NOT_FOUND
+            else:
+                self.add_blob(data)
+                blob_response.status.code = code_pb2.OK
+        return response
+
+    def _upload_missing_blobs(self, request):
+        response = local_cas_pb2.UploadMissingBlobsResponse()
+        for digest in request.blob_digests:
+            blob_response = response.responses.add()
+            blob_response.digest.CopyFrom(digest)
+            data = self._read_blob(digest, "")
+            if data is None:
+                blob_response.status.code = code_pb2.NOT_FOUND
+            else:
+                self.add_blob(data, request.instance_name)
+                blob_response.status.code = code_pb2.OK
+        return response
+
+
+class _Stub:
+    def __init__(self, **methods):
+        for name, implementation in methods.items():
+            setattr(self, name, FakeMethod(implementation))
+
+
+# fake_cas_cache()
+#
+# Create a CASCache backed by a FakeCASD.
+#
+# Args:
+#    path (str): The root directory of the CASCache
+#
+# Yields:
+#    (CASCache, FakeCASD): The CASCache and its fake buildbox-casd
+#
+@contextmanager
+def fake_cas_cache(path):
+    cascache = CASCache(str(path), casd=None)
+    casd = FakeCASD(cascache.casdir)
+
+    # Attach the fake after construction, such that no
+    # cache usage monitor is started for it
+    cascache._casd = casd
+    try:
+        yield cascache, casd
+    finally:
+        cascache.release_resources()